@@ -1,17 +1,20 @@
-import sys, os, subprocess, time, json, platform, traceback, io
+import sys, os, subprocess, time, json, platform, traceback, io, tempfile, bisect, math, threading, mmap
+import collections, random, copy
+import concurrent.futures
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
                              QHBoxLayout, QPushButton, QListWidget, QGridLayout, 
-                             QLabel, QFileDialog, QFrame, QScrollArea, 
+                             QLabel, QFileDialog, QFrame, QScrollBar, QListView, 
                              QSlider, QInputDialog, QMenu, QColorDialog, 
                              QAbstractItemView, QDialog, QListWidgetItem,
                              QMessageBox, QTabWidget, QLineEdit, QTextEdit,
                              QComboBox, QCheckBox, QGroupBox, QProgressBar,
-                             QStackedWidget, QRadioButton,
+                             QStackedWidget, QRadioButton, QProgressDialog,
                              QButtonGroup, QTextBrowser,
                              QSpinBox)
 from PyQt6.QtMultimedia import QMediaPlayer, QAudioOutput
 from PyQt6.QtMultimediaWidgets import QVideoWidget
-from PyQt6.QtCore import QUrl, Qt, QTimer, QThread, pyqtSignal, QBuffer, QPoint, QRect
+from PyQt6.QtCore import QUrl, Qt, QTimer, QThread, QObject, pyqtSignal, QBuffer, QPoint, QRect, QLine
+from PyQt6.QtCore import QAbstractListModel, QModelIndex, QSortFilterProxyModel
 from PyQt6.QtGui import QPainter, QColor, QPen, QFont, QIcon, QPixmap, QImage
 # ========== IMPORTS ADICIONALES ==========
 try:
@@ -24,6 +27,12 @@ try:
 except ImportError:
     HAS_REPORTLAB = True
 
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
 def get_ffmpeg_path():
     """Extrae ffmpeg a disco y retorna ruta ejecutable - 100% SEGURO"""
     import tempfile
@@ -282,7 +291,8 @@ class LanguageManager:
     
     def save_settings(self):
         """Guarda el idioma en la configuración"""
-        config = {"language": self.current_lang}
+        config = leer_config()
+        config["language"] = self.current_lang
         with open(ARCHIVO_CONFIG, 'w') as f:
             json.dump(config, f, indent=2)
     
@@ -315,8 +325,13 @@ LANG = LanguageManager()
 class TagManager:
     def __init__(self):
         self.tags = []
+        self.por_id = {}
         self.load_tags()
     
+    def indexar(self):
+        """Reconstruye el índice id -> etiqueta"""
+        self.por_id = {tag["id"]: tag for tag in self.tags}
+    
     def load_tags(self):
         """Carga etiquetas desde archivo"""
         if os.path.exists(ARCHIVO_TAGS):
@@ -325,6 +340,7 @@ class TagManager:
                     self.tags = json.load(f)
             except:
                 self.tags = []
+            self.indexar()
         else:
             # Etiquetas por defecto
             self.tags = [
@@ -343,6 +359,7 @@ class TagManager:
     
     def save_tags(self):
         """Guarda etiquetas en archivo"""
+        self.indexar()
         with open(ARCHIVO_TAGS, 'w') as f:
             json.dump(self.tags, f, indent=2)
     
@@ -364,10 +381,7 @@ class TagManager:
     
     def get_tag_by_id(self, tag_id):
         """Busca etiqueta por ID"""
-        for tag in self.tags:
-            if tag["id"] == tag_id:
-                return tag
-        return None
+        return self.por_id.get(tag_id)
 
 # Instancia global del gestor de etiquetas
 TAG_MANAGER = TagManager()
@@ -610,6 +624,41 @@ class SettingsDialog(QDialog):
         path_group.setLayout(path_layout)
         general_layout.addWidget(path_group)
         
+        # Caché de renders
+        cache_group = QGroupBox("Caché de Renders")
+        cache_layout = QHBoxLayout()
+        cache_layout.addWidget(QLabel("Límite (GB, 0 = desactivada):"))
+        self.spin_cache = QSpinBox()
+        self.spin_cache.setRange(0, 1000)
+        self.spin_cache.setValue(int(RENDER_CACHE.limite_bytes / 1024 ** 3))
+        cache_layout.addWidget(self.spin_cache)
+        self.label_cache = QLabel(f"En uso: {RENDER_CACHE.tamano_total() / 1024 ** 2:.0f} MB")
+        if RENDER_CACHE.exceso_bytes:
+            self.label_cache.setText(self.label_cache.text() + " (por encima del límite: segmentos en uso por una exportación)")
+        cache_layout.addWidget(self.label_cache)
+        self.btn_vaciar_cache = QPushButton("🗑️ Vaciar")
+        self.btn_vaciar_cache.clicked.connect(self.vaciar_cache)
+        cache_layout.addWidget(self.btn_vaciar_cache)
+        cache_group.setLayout(cache_layout)
+        general_layout.addWidget(cache_group)
+        
+        # Ajuste de los clips a los cambios de plano
+        escena_group = QGroupBox("Cambios de Plano")
+        escena_layout = QHBoxLayout()
+        config = leer_config()
+        self.check_escena = QCheckBox("Ajustar inicio/fin de los clips al corte más cercano")
+        self.check_escena.setChecked(config.get("ajuste_escena", False))
+        escena_layout.addWidget(self.check_escena)
+        escena_layout.addWidget(QLabel("Tolerancia:"))
+        self.spin_tolerancia_escena = QSpinBox()
+        self.spin_tolerancia_escena.setRange(40, 3000)
+        self.spin_tolerancia_escena.setSingleStep(40)
+        self.spin_tolerancia_escena.setSuffix(" ms")
+        self.spin_tolerancia_escena.setValue(config.get("tolerancia_escena_ms", TOLERANCIA_ESCENA_MS))
+        escena_layout.addWidget(self.spin_tolerancia_escena)
+        escena_group.setLayout(escena_layout)
+        general_layout.addWidget(escena_group)
+        
         general_layout.addStretch()
         tabs.addTab(general_tab, "General")
         
@@ -820,17 +869,27 @@ class SettingsDialog(QDialog):
                 # Eliminar de la lista
                 self.tags_list.takeItem(current)
     
+    def vaciar_cache(self):
+        """Borra todos los segmentos de la caché de renders"""
+        RENDER_CACHE.vaciar()
+        self.label_cache.setText(f"En uso: {RENDER_CACHE.tamano_total() / 1024 ** 2:.0f} MB")
+
     def save_settings(self):
         """Guarda la configuración"""
         try:
             # Guardar configuración general
-            config = {
+            config = leer_config()
+            config.update({
                 "language": LANG.current_lang,
                 "teams": {
                     "local": self.local_name.text() or "Equipo Local",
                     "away": self.away_name.text() or "Equipo Visitante"
-                }
-            }
+                },
+                "render_cache_gb": self.spin_cache.value(),
+                "ajuste_escena": self.check_escena.isChecked(),
+                "tolerancia_escena_ms": self.spin_tolerancia_escena.value()
+            })
+            RENDER_CACHE.establecer_limite(self.spin_cache.value())
             
             with open(ARCHIVO_CONFIG, 'w') as f:
                 json.dump(config, f, indent=2)
@@ -849,6 +908,27 @@ class SettingsDialog(QDialog):
 
 # ========== CLASES AUXILIARES ==========
 class ClickableTimeline(QFrame):
+    """
+    Vista de ancho fijo sobre el partido: una escala (ms por píxel) y un
+    desplazamiento (ms en el borde izquierdo). Solo se pinta lo visible.
+    """
+    ALTO_BASE = 75
+    ALTO_TIRA = 40
+    ALTO_ONDA = 30
+    # Posiciones del deslizador de zoom (escala logarítmica: partido entero -> frames)
+    NIVELES_ZOOM = 1000
+    # Con el zoom máximo cada frame ocupa estos píxeles
+    PX_POR_FRAME_MAX = 24
+    # Intervalos posibles entre marcas de la escala (ms)
+    INTERVALOS_ESCALA = [10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 15000, 30000,
+                         60000, 120000, 300000, 600000, 900000, 1800000]
+    # Con menos píxeles por clip visible, los clips se agregan por columnas
+    PX_MIN_POR_CLIP = 6
+
+    vista_cambiada = pyqtSignal()
+    # Clic sobre la pista de clips (ms del clic, tolerancia en ms)
+    clic_en_clips = pyqtSignal(float, float)
+
     def __init__(self, player, parent=None):
         super().__init__(parent)
         self.player = player
@@ -856,82 +936,444 @@ class ClickableTimeline(QFrame):
         self.segmentos = []
         self.duration = 1
         self.position = 0
-        self.setFixedHeight(75)
+        self.filmstrip = None
+        self.miniaturas = {}
+        self.envolvente = None
+        self.picos = []
+        self.pico_actual = -1
+        self.frame_ms = 1000 / 30
+        # None: el partido entero cabe en el ancho del widget
+        self.ms_por_px = None
+        self.inicio_ms = 0.0
+        # Capa estática (escala, clips, marcas, franjas) ya pintada; el cabezal va encima
+        self.capa = None
+        self.arrays = None
+        self.colores = {}
+        self.fuente = QFont("Arial", 8)
+        # (ini, fin) de los clips bajo el cabezal, recuadrados encima de la capa
+        self.resaltados = []
+        self.setFixedHeight(self.ALTO_BASE)
 
         # **AGREGA ESTO:** No aceptar foco con el tab
         self.setFocusPolicy(Qt.FocusPolicy.NoFocus)
 
-    def paintEvent(self, event):
-        painter = QPainter(self)
-        w, h = self.width(), self.height()
-        
-        # Fondo
-        painter.fillRect(self.rect(), QColor("#1e272e"))
-        if self.duration <= 0: 
+    def set_filmstrip(self, tira):
+        """Muestra (o quita, con None) la franja de miniaturas sobre las pistas"""
+        if self.filmstrip is not None and self.filmstrip is not tira:
+            self.filmstrip.cerrar()
+        self.filmstrip = tira
+        self.miniaturas = {}
+        self.actualizar_alto()
+
+    def set_envolvente(self, envolvente):
+        """Muestra (o quita, con None) la franja de volumen del audio"""
+        self.envolvente = envolvente
+        self.actualizar_alto()
+
+    def invalidar(self):
+        """Cambiaron los clips, las marcas o las franjas: se rehace la capa estática"""
+        self.arrays = None
+        self.redibujar()
+
+    def redibujar(self):
+        """Cambió la vista (zoom, desplazamiento, tamaño): se repinta la capa estática"""
+        self.capa = None
+        self.update()
+
+    def alto_franjas(self):
+        """Alto ocupado por las franjas de miniaturas y de audio, encima de las pistas"""
+        return ((self.ALTO_TIRA if self.filmstrip is not None else 0)
+                + (self.ALTO_ONDA if self.envolvente is not None else 0))
+
+    def set_resaltados(self, intervalos):
+        if intervalos != self.resaltados:
+            self.resaltados = intervalos
+            self.update()
+
+    def mover_cabezal(self, ms):
+        """Mueve el cabezal repintando solo las franjas de la posición vieja y la nueva"""
+        if ms == self.position:
             return
-        
-        px_por_ms = w / self.duration
-        espacio_minimo_texto = 60
-        
-        # Escala de tiempo
-        ms_por_marca = 60000 
-        if (px_por_ms * 60000) < espacio_minimo_texto: 
-            ms_por_marca = 300000
-        if (px_por_ms * 300000) < espacio_minimo_texto: 
-            ms_por_marca = 600000
-        if (px_por_ms * 60000) > 250: 
-            ms_por_marca = 10000 
+        x_viejo = self.x_de(self.position)
+        self.position = ms
+        if self.capa is None:
+            self.update()
+            return
+        for x in (x_viejo, self.x_de(ms)):
+            if -8 <= x <= self.width() + 8:
+                self.update(QRect(int(x) - 6, 0, 13, self.height()))
+
+    def color(self, texto):
+        if texto not in self.colores:
+            self.colores[texto] = QColor(texto)
+        return self.colores[texto]
+
+    def datos_lod(self):
+        """Inicio, fin y color de cada clip (y tiempo y color de cada marca) como arrays de NumPy"""
+        if self.arrays is None:
+            indices = {}
+            self.arrays = {
+                "ini": np.array([seg[0] for seg in self.segmentos], dtype=np.float64),
+                "fin": np.array([seg[1] for seg in self.segmentos], dtype=np.float64),
+                "color": np.array([indices.setdefault(seg[2], len(indices)) for seg in self.segmentos], dtype=np.int64),
+                "marca": np.array([m[0] for m in self.marks], dtype=np.float64),
+                "color_marca": np.array([indices.setdefault(m[1], len(indices)) for m in self.marks], dtype=np.int64),
+            }
+            self.arrays["colores"] = list(indices)
+        return self.arrays
+
+    def actualizar_alto(self):
+        alto = self.ALTO_BASE
+        if self.filmstrip is not None:
+            alto += self.ALTO_TIRA
+        if self.envolvente is not None:
+            alto += self.ALTO_ONDA
+        self.setFixedHeight(alto)
+        self.redibujar()
+
+    # --- Escala y desplazamiento ---
+
+    def escala_completa(self):
+        return max(1, self.duration) / max(1, self.width())
+
+    def escala_minima(self):
+        return min(self.frame_ms / self.PX_POR_FRAME_MAX, self.escala_completa())
+
+    def escala(self):
+        """Milisegundos por píxel de la vista actual"""
+        if self.ms_por_px is None:
+            return self.escala_completa()
+        return self.ms_por_px
+
+    def ms_visibles(self):
+        return self.width() * self.escala()
+
+    def x_de(self, ms):
+        return (ms - self.inicio_ms) / self.escala()
+
+    def ms_de(self, x):
+        return self.inicio_ms + x * self.escala()
+
+    def limitar(self):
+        self.inicio_ms = max(0.0, min(self.inicio_ms, self.duration - self.ms_visibles()))
+
+    def set_escala(self, ms_por_px, ancla_ms=None):
+        """Cambia el zoom manteniendo ancla_ms (por defecto el cabezal o el centro) en el mismo píxel"""
+        completa = self.escala_completa()
+        ms_por_px = max(self.escala_minima(), min(ms_por_px, completa))
+        if ancla_ms is None:
+            visible = self.inicio_ms <= self.position <= self.inicio_ms + self.ms_visibles()
+            ancla_ms = self.position if visible else self.inicio_ms + self.ms_visibles() / 2
+        x = self.x_de(ancla_ms)
+        self.ms_por_px = None if ms_por_px >= completa else ms_por_px
+        self.inicio_ms = ancla_ms - x * self.escala()
+        self.limitar()
+        self.redibujar()
+        self.vista_cambiada.emit()
+
+    def nivel_zoom(self):
+        """Posición del deslizador que corresponde a la escala actual"""
+        completa, minima = self.escala_completa(), self.escala_minima()
+        if self.ms_por_px is None or completa <= minima:
+            return 0
+        return int(round(self.NIVELES_ZOOM * math.log(completa / self.ms_por_px) / math.log(completa / minima)))
+
+    def set_nivel_zoom(self, nivel):
+        completa, minima = self.escala_completa(), self.escala_minima()
+        self.set_escala(completa * (minima / completa) ** (nivel / self.NIVELES_ZOOM))
+
+    def desplazar_a(self, ms):
+        """Pone ms en el borde izquierdo de la vista"""
+        self.inicio_ms = float(ms)
+        self.limitar()
+        self.redibujar()
+        self.vista_cambiada.emit()
+
+    def seguir(self, ms):
+        """Si ms sale de la vista, pasa página para que quede cerca del borde izquierdo"""
+        visibles = self.ms_visibles()
+        if not (self.inicio_ms <= ms <= self.inicio_ms + visibles * 0.95):
+            self.desplazar_a(ms - visibles * 0.05)
+
+    def set_duracion(self, duracion):
+        self.duration = duracion
+        self.ms_por_px = None
+        self.inicio_ms = 0.0
+        self.redibujar()
+        self.vista_cambiada.emit()
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        if self.ms_por_px is not None and self.ms_por_px >= self.escala_completa():
+            self.ms_por_px = None
+        self.limitar()
+        self.vista_cambiada.emit()
+
+    def wheelEvent(self, event):
+        """Rueda: desplaza la vista; Ctrl + rueda: zoom alrededor del puntero"""
+        pasos = event.angleDelta().y() / 120
+        if event.modifiers() & Qt.KeyboardModifier.ControlModifier:
+            ancla = self.ms_de(event.position().x())
+            self.set_escala(self.escala() * (0.8 ** pasos), ancla)
+        else:
+            self.desplazar_a(self.inicio_ms - pasos * self.ms_visibles() / 10)
+        event.accept()
 
-        # Dibujar escala
-        painter.setPen(QPen(QColor("#7f8c8d"), 1))
-        for i in range(0, self.duration, ms_por_marca):
-            x = int(i * px_por_ms)
-            painter.drawLine(x, h-25, x, h-10)
-            minutos = i // 60000
-            segundos = (i % 60000) // 1000
-            txt = f"{minutos}m" if segundos == 0 else f"{minutos}:{segundos:02d}"
-            painter.drawText(x + 3, h - 30, txt)
-
-        # Dibujar segmentos (cortes completos)
-        for inicio, fin, color, nombre in self.segmentos:
-            x_ini = int(inicio * px_por_ms)
-            x_fin = int(fin * px_por_ms)
-            painter.setBrush(QColor(color))
+    # --- Pintado ---
+
+    def miniatura(self, i):
+        """Miniatura i escalada a la franja; solo se guardan las ya extraídas"""
+        if i not in self.miniaturas:
+            imagen = self.filmstrip.imagen(i)
+            if imagen is None:
+                return None
+            self.miniaturas[i] = QPixmap.fromImage(imagen).scaledToHeight(
+                self.ALTO_TIRA, Qt.TransformationMode.SmoothTransformation
+            )
+        return self.miniaturas[i]
+
+    def pintar_filmstrip(self, painter, zona):
+        """Una miniatura por hueco visible, tomando el frame del centro del hueco"""
+        tira = self.filmstrip
+        ancho = max(1, int(self.ALTO_TIRA * tira.ancho / tira.alto))
+        escala = self.escala()
+        # Huecos alineados al partido (no a la vista) para que no bailen al desplazar
+        desplazamiento = self.inicio_ms / escala
+        n = int((desplazamiento + zona.left()) // ancho)
+        x = n * ancho - desplazamiento
+        while x <= zona.right():
+            i = tira.indice((n * ancho + ancho / 2) * escala)
+            pixmap = self.miniatura(i)
+            if pixmap is not None:
+                painter.drawPixmap(int(x), 0, pixmap)
+            x += ancho
+            n += 1
+
+    def pintar_envolvente(self, painter, zona):
+        """Onda de volumen: el máximo de cada columna de píxeles, centrado en la franja"""
+        env = self.envolvente
+        x0, x1 = max(0, zona.left()), zona.right() + 1
+        if x1 <= x0 or not len(env):
+            return
+        # Índices de la envolvente en el borde de cada columna; reduceat da el
+        # máximo de cada tramo (la última entrada sobra: llega hasta el final)
+        bordes = (self.inicio_ms + np.arange(x0, x1 + 1) * self.escala()) / ENVOLVENTE_PASO_MS
+        indices = np.clip(bordes.astype(np.int64), 0, len(env) - 1)
+        niveles = np.maximum.reduceat(env, indices)[:-1]
+        alturas = np.clip((niveles - ENVOLVENTE_PISO_DB) / -ENVOLVENTE_PISO_DB, 0, 1) * (self.ALTO_ONDA - 4) / 2
+        centro = self.ALTO_ONDA // 2
+        painter.setPen(QPen(QColor("#5dade2"), 1))
+        painter.drawLines([QLine(x, int(centro - a), x, int(centro + a))
+                           for x, a in zip(range(x0, x1), alturas.tolist()) if a >= 0.5])
+        
+        # Candidatos del detector de picos (el actual, resaltado)
+        for n, (ms, _) in enumerate(self.picos):
+            x = int(self.x_de(ms))
+            if not 0 <= x <= self.width():
+                continue
+            actual = n == self.pico_actual
+            painter.setPen(QPen(QColor("#f1c40f" if actual else "#e67e22"), 3 if actual else 2))
+            painter.drawLine(x, 1, x, self.ALTO_ONDA - 2)
+
+    def intervalo_escala(self, espacio_minimo):
+        """Intervalo más pequeño entre marcas que deja al menos espacio_minimo píxeles"""
+        for intervalo in self.INTERVALOS_ESCALA:
+            if intervalo / self.escala() >= espacio_minimo:
+                return intervalo
+        return self.INTERVALOS_ESCALA[-1]
+
+    @staticmethod
+    def texto_marca(ms, intervalo):
+        minutos, resto = divmod(int(ms), 60000)
+        segundos, milis = divmod(resto, 1000)
+        if intervalo < 1000:
+            return f"{minutos}:{segundos:02d}.{milis:03d}"
+        return f"{minutos}m" if segundos == 0 else f"{minutos}:{segundos:02d}"
+
+    def pintar_clips(self, painter, indices, h):
+        """Clips uno a uno, con su nombre si cabe"""
+        w = self.width()
+        painter.setFont(self.fuente)
+        for i in indices:
+            inicio, fin, color, nombre = self.segmentos[i]
+            x_ini = int(max(-10, self.x_de(inicio)))
+            x_fin = int(min(w + 10, self.x_de(fin)))
+            painter.setBrush(self.color(color))
             painter.setPen(Qt.PenStyle.NoPen)
             painter.drawRect(x_ini, 5, x_fin - x_ini, h - 35)
             
             # Nombre del segmento si hay espacio
             if (x_fin - x_ini) > 50:
                 painter.setPen(QColor("white"))
-                painter.setFont(QFont("Arial", 8))
-                painter.drawText(x_ini + 5, 20, nombre[:15])
+                painter.drawText(max(0, x_ini) + 5, 20, nombre[:15])
 
-        # Marcas individuales
-        for pos_ms, color in self.marks:
-            x = int(pos_ms * px_por_ms)
-            painter.setPen(QPen(QColor(color), 4))
+    def pintar_marcas(self, painter, indices, h):
+        for i in indices:
+            pos_ms, color = self.marks[i]
+            x = int(self.x_de(pos_ms))
+            painter.setPen(QPen(self.color(color), 4))
             painter.drawLine(x, 5, x, h - 35)
 
-        # Cabezal de reproducción
-        x_head = int(self.position * px_por_ms)
-        painter.setPen(QPen(QColor("#2ecc71"), 3))
-        painter.drawLine(x_head, 0, x_head, h)
+    def pintar_densidad(self, painter, datos, visibles, marcas, h):
+        """
+        Demasiados clips para el ancho: cada columna de píxeles es una barra del
+        color que más clips tiene en ella, más alta cuantos más clips la cubren.
+        El coste depende del ancho y del número de colores, no del de clips.
+        """
+        w = self.width()
+        escala = self.escala()
+        n_colores = len(datos["colores"])
+        x0 = np.clip(((datos["ini"][visibles] - self.inicio_ms) / escala).astype(np.int64), 0, w - 1)
+        x1 = np.clip(((datos["fin"][visibles] - self.inicio_ms) / escala).astype(np.int64), 0, w - 1)
+        colores = datos["color"][visibles]
+        # Suma de diferencias: +1 en la primera columna de cada clip, -1 tras la última
+        cobertura = np.zeros((n_colores, w + 1), dtype=np.int32)
+        np.add.at(cobertura, (colores, x0), 1)
+        np.add.at(cobertura, (colores, x1 + 1), -1)
+        cobertura = np.cumsum(cobertura, axis=1)[:, :w]
+        total = cobertura.sum(axis=0)
+        dominante = cobertura.argmax(axis=0)
+        
+        alto_pista = h - 35
+        alturas = ((alto_pista - 4) * (0.35 + 0.65 * total / max(1, total.max()))).astype(np.int64)
+        ocupadas = total > 0
+        base = 5 + alto_pista
+        for c in np.unique(dominante[ocupadas]).tolist():
+            xs = np.flatnonzero(ocupadas & (dominante == c))
+            painter.setPen(QPen(self.color(datos["colores"][c]), 1))
+            painter.drawLines([QLine(x, base - a, x, base - 1)
+                               for x, a in zip(xs.tolist(), alturas[xs].tolist())])
+        
+        # Marcas: una muesca corta arriba por columna y color, sin tapar las barras
+        xs = ((datos["marca"][marcas] - self.inicio_ms) / escala).astype(np.int64)
+        pares = np.unique(xs * n_colores + datos["color_marca"][marcas])
+        for c in np.unique(pares % n_colores).tolist():
+            painter.setPen(QPen(self.color(datos["colores"][c]), 2))
+            painter.drawLines([QLine(x, 1, x, 6) for x in (pares[pares % n_colores == c] // n_colores).tolist()])
+
+    def pintar_capa(self, painter):
+        """Todo lo que no se mueve con el cabezal"""
+        w, h = self.width(), self.height()
+        
+        # Fondo
+        painter.fillRect(self.rect(), QColor("#1e272e"))
+        if self.duration <= 0: 
+            return
+        
+        desde_ms = self.ms_de(-2)
+        hasta_ms = self.ms_de(w + 2)
+        
+        # Franjas de miniaturas y de audio arriba; el resto se dibuja debajo
+        y_pistas = 0
+        if self.filmstrip is not None:
+            self.pintar_filmstrip(painter, self.rect())
+            y_pistas = self.ALTO_TIRA
+            painter.translate(0, self.ALTO_TIRA)
+        if self.envolvente is not None:
+            self.pintar_envolvente(painter, self.rect())
+            y_pistas += self.ALTO_ONDA
+            painter.translate(0, self.ALTO_ONDA)
+        h -= y_pistas
+        
+        # Rejilla de frames cuando el zoom llega a verlos
+        if self.frame_ms / self.escala() >= 6:
+            painter.setPen(QPen(QColor("#34495e"), 1))
+            n = int(max(0, desde_ms) // self.frame_ms)
+            while n * self.frame_ms <= hasta_ms:
+                x = int(self.x_de(n * self.frame_ms))
+                painter.drawLine(x, h - 18, x, h - 10)
+                n += 1
+        
+        # Escala de tiempo (solo las marcas visibles)
+        intervalo = self.intervalo_escala(60)
+        if intervalo < 1000:
+            intervalo = self.intervalo_escala(90)  # Las etiquetas con milisegundos son más largas
+        painter.setPen(QPen(QColor("#7f8c8d"), 1))
+        marca = max(0, int(desde_ms // intervalo) * intervalo)
+        while marca <= min(hasta_ms, self.duration):
+            x = int(self.x_de(marca))
+            painter.drawLine(x, h-25, x, h-10)
+            painter.drawText(x + 3, h - 30, self.texto_marca(marca, intervalo))
+            marca += intervalo
+
+        # Clips y marcas visibles: uno a uno si tienen sitio, si no por columnas
+        if not HAS_NUMPY:
+            self.pintar_clips(painter, [i for i, seg in enumerate(self.segmentos)
+                                        if seg[1] >= desde_ms and seg[0] <= hasta_ms], h)
+            self.pintar_marcas(painter, [i for i, m in enumerate(self.marks)
+                                         if desde_ms <= m[0] <= hasta_ms], h)
+            return
+        datos = self.datos_lod()
+        visibles = np.flatnonzero((datos["fin"] >= desde_ms) & (datos["ini"] <= hasta_ms))
+        marcas = np.flatnonzero((datos["marca"] >= desde_ms) & (datos["marca"] <= hasta_ms))
+        if (len(visibles) + len(marcas)) * self.PX_MIN_POR_CLIP > w:
+            self.pintar_densidad(painter, datos, visibles, marcas, h)
+        else:
+            self.pintar_clips(painter, visibles.tolist(), h)
+            self.pintar_marcas(painter, marcas.tolist(), h)
+
+    def paintEvent(self, event):
+        # La capa estática se rehace solo si cambió algo; si no, se copia la zona sucia
+        dpr = self.devicePixelRatioF()
+        if self.capa is None or self.capa.size() != self.size() * dpr:
+            self.capa = QPixmap(self.size() * dpr)
+            self.capa.setDevicePixelRatio(dpr)
+            capa_painter = QPainter(self.capa)
+            self.pintar_capa(capa_painter)
+            capa_painter.end()
+        
+        painter = QPainter(self)
+        painter.drawPixmap(0, 0, self.capa)
+        if self.duration <= 0:
+            return
+        
+        # Clips bajo el cabezal
+        if self.resaltados:
+            y = self.alto_franjas() + 5
+            alto = self.height() - self.alto_franjas() - 35
+            painter.setPen(QPen(QColor("white"), 2))
+            painter.setBrush(Qt.BrushStyle.NoBrush)
+            for inicio, fin in self.resaltados:
+                x_ini = int(max(-10, self.x_de(inicio)))
+                x_fin = int(min(self.width() + 10, self.x_de(fin)))
+                painter.drawRect(x_ini, y, max(1, x_fin - x_ini), alto)
         
-        # Círculo en el cabezal
-        painter.setBrush(QColor("#2ecc71"))
-        painter.drawEllipse(x_head - 4, h - 40, 8, 8)
+        # Cabezal de reproducción
+        x_head = int(self.x_de(self.position))
+        if -8 <= x_head <= self.width() + 8:
+            painter.setPen(QPen(QColor("#2ecc71"), 3))
+            painter.drawLine(x_head, 0, x_head, self.height())
+            
+            # Círculo en el cabezal
+            painter.setBrush(QColor("#2ecc71"))
+            painter.drawEllipse(x_head - 4, self.height() - 40, 8, 8)
 
     def mousePressEvent(self, event):
         if self.duration > 0:
-            pos = int(event.position().x() / (self.width() / self.duration))
+            ms = self.ms_de(event.position().x())
+            pos = int(max(0, min(self.duration, ms)))
             self.player.setPosition(pos)
             self.player.play()
+            
+            y = event.position().y() - self.alto_franjas()
+            if 5 <= y <= self.ALTO_BASE - 30:
+                self.clic_en_clips.emit(ms, 3 * self.escala())
+
+            # Devolver foco a la ventana principal (atajos de teclado)
+            self.window().setFocus()
+
+# Modos de rotulado de los clips exportados
+ETIQUETAS_NINGUNA = "ninguna"
+ETIQUETAS_SUAVES = "suaves"
+ETIQUETAS_INCRUSTADAS = "incrustadas"
 
-              # **AGREGA ESTO:** Devolver foco a la ventana principal
-            if self.parent():
-                main_window = self.parent().parent()  # timeline -> scroll -> main
-                if hasattr(main_window, 'setFocus'):
-                    main_window.setFocus()
+def crear_combo_etiquetas():
+    """Combo con los modos de rotulado; por defecto, etiquetas suaves"""
+    combo = QComboBox()
+    combo.addItem("Subtítulos y capítulos (rápido)", ETIQUETAS_SUAVES)
+    combo.addItem("Incrustado en el video (re-codifica)", ETIQUETAS_INCRUSTADAS)
+    combo.addItem("Sin marca de tiempo", ETIQUETAS_NINGUNA)
+    return combo
 
 class PlaylistDialog(QDialog):
     def __init__(self, clips, video_path, parent=None):
@@ -977,9 +1419,9 @@ class PlaylistDialog(QDialog):
         btns.addWidget(self.filter_combo)
         
         # Opción de timestamp
-        self.timestamp_checkbox = QCheckBox("Agregar minutero (timestamp)")
-        self.timestamp_checkbox.setChecked(True)
-        btns.addWidget(self.timestamp_checkbox)
+        btns.addWidget(QLabel("Minutero:"))
+        self.etiquetas_combo = crear_combo_etiquetas()
+        btns.addWidget(self.etiquetas_combo)
         
         self.layout.addLayout(btns)
         
@@ -993,6 +1435,22 @@ class PlaylistDialog(QDialog):
         """)
         self.btn_render.clicked.connect(self.finalizar)
         self.layout.addWidget(self.btn_render)
+        
+        # Progreso de la generación en segundo plano
+        self.worker = None
+        self.nombre = ""
+        self.texto_clips = ""
+        progreso = QHBoxLayout()
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setVisible(False)
+        self.btn_cancelar = QPushButton("⏹ Cancelar")
+        self.btn_cancelar.setVisible(False)
+        self.btn_cancelar.clicked.connect(self.cancelar_generacion)
+        progreso.addWidget(self.progress_bar)
+        progreso.addWidget(self.btn_cancelar)
+        self.layout.addLayout(progreso)
+        self.status_label = QLabel("")
+        self.layout.addWidget(self.status_label)
     
     def mover_arriba(self):
         curr = self.list_w.currentRow()
@@ -1049,249 +1507,3008 @@ class PlaylistDialog(QDialog):
                 QMessageBox.warning(self, "Sin clips", "No hay clips seleccionados.")
                 return
             
-            # Crear archivo de lista para FFmpeg
-            list_file = os.path.join(CARPETA_CORTES, f"lista_{int(time.time())}.txt")
-            temp_files = []
-            
-            # Procesar cada clip
-            for idx, c in enumerate(clips_finales):
-                clip_duration = (c['fin'] - c['ini']) / 1000  # en segundos
-                
-                if self.timestamp_checkbox.isChecked():
-                    # Crear clip temporal con timestamp
-                    temp_clip = os.path.join(CARPETA_CORTES, f"temp_{int(time.time())}_{idx}.mp4")
-                    temp_files.append(temp_clip)
-                    
-                    # Comando para agregar timestamp
-                    timestamp_text = f"{c['tiempo']} - {c['nombre']}"
-                    ffmpeg_path = get_ffmpeg_path()
-                    cmd = [
-                        ffmpeg_path, "-i", self.video_path,
-                        "-ss", str(c['ini']/1000),
-                        "-t", str(clip_duration),
-                        "-vf", f"drawtext=text='{timestamp_text}':fontcolor=white:fontsize=24:box=1:boxcolor=black@0.5:boxborderw=5:x=10:y=10",
-                        "-c:a", "copy",
-                        "-y", temp_clip
-                    ]
-                    
-                    try:
-                        result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
-                        if result.returncode != 0:
-                            QMessageBox.warning(self, "Advertencia", 
-                                              f"No se pudo agregar timestamp al clip {idx+1}. Se continuará sin timestamp.")
-                            temp_files[-1] = None
-                    except Exception as e:
-                        QMessageBox.warning(self, "Advertencia", 
-                                          f"Error al procesar clip {idx+1}: {str(e)}")
-                        temp_files[-1] = None
-                else:
-                    # Sin timestamp
-                    temp_files.append(None)
-            
-            # Crear archivo de lista concatenada
-            with open(list_file, "w") as f:
-                for idx, c in enumerate(clips_finales):
-                    if temp_files[idx] and os.path.exists(temp_files[idx]):
-                        f.write(f"file '{temp_files[idx]}'\n")
-                    else:
-                        # Usar el original
-                        f.write(f"file '{self.video_path}'\n")
-                        f.write(f"inpoint {c['ini']/1000}\n")
-                        f.write(f"outpoint {c['fin']/1000}\n")
-            
-            # Ruta de salida
+            # La playlist se genera en segundo plano con el mismo pipeline que
+            # la exportación: clips en paralelo, caché de segmentos y unión final
             out = os.path.join(CARPETA_CORTES, f"{nombre}.mp4")
-            
-            # Ejecutar FFmpeg para concatenar
-            try:
-                ffmpeg_path = get_ffmpeg_path()
-                result = subprocess.run([
-                    ffmpeg_path, "-f", "concat", "-safe", "0",
-                    "-i", list_file, "-c", "copy", "-y", out
-                ], capture_output=True, text=True)
-                
-                if result.returncode == 0:
-                    QMessageBox.information(
-                        self, "Playlist Completada",
-                        f"Playlist '{nombre}' generada exitosamente.\n"
-                        f"Archivo de salida: {out}"
-                    )
-                else:
-                    QMessageBox.warning(
-                        self, "Advertencia",
-                        f"Playlist generada con advertencias:\n{result.stderr}"
-                    )
-                
-                # Limpiar archivos temporales
-                for temp_file in temp_files:
-                    if temp_file and os.path.exists(temp_file):
-                        os.remove(temp_file)
-                
-                if os.path.exists(list_file):
-                    os.remove(list_file)
-                
-                self.accept()
-                
-            except Exception as e:
-                QMessageBox.critical(
-                    self, "Error FFmpeg",
-                    f"No se pudo generar la playlist:\n{str(e)}"
-                )
+            etiquetas = self.etiquetas_combo.currentData()
+            self.nombre = nombre
+            self.worker = ExportWorker(self.video_path, clips_finales, out, "copy",
+                                       etiquetas == ETIQUETAS_INCRUSTADAS, None,
+                                       etiquetas == ETIQUETAS_SUAVES)
+            self.worker.progress.connect(self.progress_bar.setValue)
+            self.worker.clip_listo.connect(self.clip_listo)
+            self.worker.telemetria.connect(
+                lambda t: self.status_label.setText(f"{self.texto_clips} {t.texto()}")
+            )
+            self.worker.finished.connect(self.playlist_completada)
+            self.worker.error.connect(self.playlist_error)
+            self.worker.cancelled.connect(self.playlist_cancelada)
+            
+            self.texto_clips = f"Clips 0/{len(clips_finales)} ·"
+            self.set_generando(True)
+            self.status_label.setText("Generando playlist...")
+            self.worker.start()
+    
+    def set_generando(self, generando):
+        """Bloquea la edición de la lista mientras se genera la playlist"""
+        self.btn_render.setEnabled(not generando)
+        self.list_w.setEnabled(not generando)
+        self.etiquetas_combo.setEnabled(not generando)
+        self.filter_combo.setEnabled(not generando)
+        self.progress_bar.setVisible(generando)
+        self.btn_cancelar.setVisible(generando)
+        self.btn_cancelar.setEnabled(True)
+        if not generando:
+            self.progress_bar.setValue(0)
+    
+    def generando(self):
+        return self.worker is not None and self.worker.isRunning()
+    
+    def clip_listo(self, hechos, total):
+        self.texto_clips = f"Clips {hechos}/{total} ·"
+        self.status_label.setText(f"Generando playlist... {self.texto_clips}")
+    
+    def cancelar_generacion(self):
+        """Mata los FFmpeg en curso; el worker borra temporales y la salida parcial"""
+        if self.generando():
+            self.btn_cancelar.setEnabled(False)
+            self.status_label.setText("Cancelando...")
+            self.worker.cancelar()
+    
+    def playlist_completada(self, out):
+        self.set_generando(False)
+        self.status_label.setText(f"Playlist '{self.nombre}' generada")
+        if self.parent():
+            self.parent().statusBar().showMessage(f"🎬 Playlist lista: {out}", 8000)
+        QMessageBox.information(
+            self, "Playlist Completada",
+            f"Playlist '{self.nombre}' generada exitosamente.\n"
+            f"Archivo de salida: {out}"
+        )
+        self.accept()
+    
+    def playlist_error(self, detalle):
+        self.set_generando(False)
+        self.status_label.setText("Error - Listo para reintentar")
+        QMessageBox.critical(
+            self, "Error FFmpeg",
+            f"No se pudo generar la playlist:\n{detalle}"
+        )
+    
+    def playlist_cancelada(self):
+        self.set_generando(False)
+        self.status_label.setText("Generación cancelada")
+    
+    def reject(self):
+        """Cerrar durante la generación la cancela (previa confirmación)"""
+        if self.generando():
+            reply = QMessageBox.question(
+                self, "Playlist en curso",
+                "La playlist se está generando.\n¿Cancelar la generación y cerrar?",
+                QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No
+            )
+            if reply != QMessageBox.StandardButton.Yes:
+                return
+            self.worker.cancelar()
+            self.worker.wait()
+        super().reject()
+    
+    def closeEvent(self, event):
+        if self.generando():
+            event.ignore()
+            self.reject()
+        else:
+            super().closeEvent(event)
 
 class ExportWorker(QThread):
     progress = pyqtSignal(int)
     finished = pyqtSignal(str)
     error = pyqtSignal(str)
+    telemetria = pyqtSignal(object)
+    clip_listo = pyqtSignal(int, int)
+    cancelled = pyqtSignal()
 
-    def __init__(self, video_path, clips, output_path, codec="copy", add_timestamp=False):
+    def __init__(self, video_path, clips, output_path, codec="copy", add_timestamp=False, fusion=None,
+                 etiquetas_suaves=False):
         super().__init__()
         self.video_path = video_path
-        self.clips = clips
         self.output_path = output_path
         self.codec = codec
         self.add_timestamp = add_timestamp
+        self.etiquetas_suaves = etiquetas_suaves
+        self.procesos = []
+        self.fallo = False
+        self.cancelado = False
+        self.indice = None
+        self.capitulos = None
+        # Claves fijadas en RENDER_CACHE por esta exportación (se sueltan al terminar)
+        self.fijadas = []
+        
+        # fusion: dict con tolerancia_ms, pre_ms y post_ms; cada tramo fusionado
+        # se corta una sola vez y sus clips quedan como capítulos
+        self.fusion = fusion
+        if fusion:
+            indice = MEDIA_INDEX.obtener(video_path)
+            clips = fusionar_intervalos(clips, duracion_ms=indice.duracion_ms if indice else None, **fusion)
+        self.clips = clips
+        self.segmentos = [None] * len(clips)
+
+    def recodifica(self):
+        """True si la exportación re-codifica todo el video"""
+        return self.add_timestamp or self.codec not in ("copy", "smartcut")
+
+    def codec_video(self):
+        # Con copia directa o smart-cut el texto obliga a re-codificar: H.264
+        return self.codec if self.codec not in ("copy", "smartcut") else "libx264"
+
+    def tiene_audio(self):
+        return bool(self.indice.acodec) if self.indice else True
+
+    def clave_clip(self, clip):
+        """Clave del segmento de un clip en RENDER_CACHE, o None si no se renderiza aparte"""
+        if self.recodifica():
+            texto = titulo_clip(clip) if self.add_timestamp else ""
+            codec = self.codec_video()
+            ajustes = {"modo": "recodificar", "codec": codec, "args": ARGS_CODEC.get(codec, []),
+                       "texto": texto, "audio": self.tiene_audio()}
+        elif self.codec == "smartcut":
+            ajustes = {"modo": "smartcut"}
+        else:
+            return None
+        return RenderCache.clave(self.indice.huella if self.indice else MEDIA_INDEX.huella(self.video_path),
+                                 clip['ini'], clip['fin'], ajustes)
+
+    def clave_exportacion(self):
+        """Clave de la exportación completa (re-codificada en una pasada) en RENDER_CACHE"""
+        codec = self.codec_video()
+        ajustes = {"modo": "exportacion", "codec": codec, "args": ARGS_CODEC.get(codec, []),
+                   "texto": self.add_timestamp, "audio": self.tiene_audio(),
+                   "tramos": [[clip['ini'], clip['fin'], titulo_clip(clip)] for clip in self.clips],
+                   "capitulos": self.capitulos, "subtitulos": self.etiquetas_suaves,
+                   "formato": os.path.splitext(self.output_path)[1].lower()}
+        return RenderCache.clave(self.indice.huella if self.indice else MEDIA_INDEX.huella(self.video_path),
+                                 self.clips[0]['ini'], self.clips[-1]['fin'], ajustes)
+
+    def comandos_clip(self, idx, clip):
+        """Comandos del tramo por clip: (comandos, salida, temporales)"""
+        ffmpeg_path = get_ffmpeg_path()
+        if self.recodifica():
+            temp_clip = os.path.join(CARPETA_CORTES, f"export_temp_{int(time.time())}_{idx}.mkv")
+            cmd = construir_cmd_exportacion_unica(
+                ffmpeg_path, self.video_path, [clip], temp_clip,
+                self.codec_video(), self.add_timestamp, self.tiene_audio()
+            )
+            return [cmd], temp_clip, []
+        
+        # Corte preciso: solo se re-codifican los GOP de los bordes
+        temp_clip = os.path.join(CARPETA_CORTES, f"export_temp_{int(time.time())}_{idx}.ts")
+        comandos, temporales = construir_cmds_smart_cut(
+            ffmpeg_path, self.video_path, self.indice, clip['ini'], clip['fin'], temp_clip
+        )
+        return comandos, temp_clip, temporales
+
+    def procesar_clip(self, idx, clip, trabajo, hilos, al_progresar):
+        """Ejecuta los comandos de un clip en un hilo del pool y lo guarda en la caché"""
+        comandos, salida, temporales, clave = trabajo
+        duracion = clip['fin'] - clip['ini']
+        try:
+            for paso, cmd in enumerate(comandos):
+                if self.fallo:
+                    return
+                cmd = con_hilos(cmd, hilos)
+                codigo, detalle = ejecutar_ffmpeg_progreso(
+                    cmd, duracion,
+                    lambda t, paso=paso: al_progresar(idx, (paso + t.fraccion) / len(comandos), t),
+                    self.registrar_proceso, f"Exportación: clip {idx+1}"
+                )
+                if codigo != 0:
+                    raise RuntimeError(f"Error al procesar clip {idx+1}: {detalle}")
+            self.segmentos[idx] = RENDER_CACHE.guardar(clave, salida, fijar=True)
+            # Sin caché activa devuelve la propia salida y no fija nada
+            if self.segmentos[idx] != salida:
+                self.fijadas.append(clave)
+            al_progresar(idx, 1.0)
+        finally:
+            for temporal in temporales:
+                if os.path.exists(temporal):
+                    try:
+                        os.remove(temporal)
+                    except:
+                        pass
+
+    def publicar_progreso(self, telemetria, inicio=0, fin=100):
+        """Lleva la telemetría de un FFmpeg a la barra de progreso (tramo inicio-fin)"""
+        self.progress.emit(inicio + int(telemetria.fraccion * (fin - inicio)))
+        self.telemetria.emit(telemetria)
+
+    def registrar_proceso(self, proceso):
+        """Anota un FFmpeg recién lanzado; si ya se canceló, lo termina en el acto"""
+        self.procesos.append(proceso)
+        if self.fallo:
+            self.detener_procesos()
+
+    def detener_procesos(self):
+        """Termina los FFmpeg que sigan en marcha"""
+        for proceso in list(self.procesos):
+            if proceso.poll() is None:
+                try:
+                    proceso.kill()
+                except:
+                    pass
+
+    def cancelar(self):
+        """Cancela la exportación: mata los FFmpeg en curso y descarta lo parcial"""
+        self.cancelado = True
+        self.fallo = True
+        self.detener_procesos()
+
+    def terminar(self, codigo, detalle):
+        """Emite el resultado del FFmpeg final (completado, cancelado o error)"""
+        if self.cancelado:
+            self.cancelled.emit()
+        elif codigo == 0:
+            self.progress.emit(100)
+            self.finished.emit(self.output_path)
+        else:
+            self.error.emit(f"Error FFmpeg: {detalle}")
+
+    def exportar_en_una_pasada(self, metadatos=None, subtitulos=None, clave=None):
+        """
+        Re-codifica todos los clips con un solo FFmpeg, sin archivos por clip.
+        Con clave, el resultado se guarda entero en RENDER_CACHE.
+        """
+        cmd = construir_cmd_exportacion_unica(
+            get_ffmpeg_path(), self.video_path, self.clips, self.output_path,
+            self.codec_video(), self.add_timestamp, self.tiene_audio(), metadatos, subtitulos
+        )
+        codigo, detalle = ejecutar_ffmpeg_progreso(
+            cmd, sum(max(1, clip['fin'] - clip['ini']) for clip in self.clips),
+            self.publicar_progreso, self.registrar_proceso,
+            "Exportación: " + os.path.basename(self.output_path)
+        )
+        if codigo == 0 and clave and not self.cancelado:
+            try:
+                RENDER_CACHE.guardar(clave, self.output_path, mover=False)
+            except OSError:
+                pass
+        self.terminar(codigo, detalle)
 
     def run(self):
+        temp_files = []
+        list_file = os.path.join(CARPETA_CORTES, f"export_list_{int(time.time())}.txt")
         try:
-            temp_files = []
-            
             # Crear carpeta de exportación si no existe
             export_dir = os.path.dirname(self.output_path)
             if not os.path.exists(export_dir):
                 os.makedirs(export_dir, exist_ok=True)
             
-            # Procesar cada clip
-            for idx, clip in enumerate(self.clips):
-                self.progress.emit(int((idx / len(self.clips)) * 50))
-                
-                clip_duration = (clip['fin'] - clip['ini']) / 1000  # en segundos
-                
-                if self.add_timestamp:
-                    # Crear clip temporal con timestamp
-                    temp_clip = os.path.join(CARPETA_CORTES, f"export_temp_{int(time.time())}_{idx}.mp4")
-                    temp_files.append(temp_clip)
-                    
-                    # Texto del timestamp
-                    timestamp_text = f"{clip['tiempo']} - {clip.get('nombre', 'Clip')}"
-                    
-                    # Comando para agregar timestamp
-                    ffmpeg_path = get_ffmpeg_path()
-                    cmd = [
-                        ffmpeg_path, "-i", self.video_path,
-                        "-ss", str(clip['ini']/1000),
-                        "-t", str(clip_duration),
-                        "-vf", f"drawtext=text='{timestamp_text}':fontcolor=white:fontsize=24:box=1:boxcolor=black@0.5:boxborderw=5:x=10:y=10",
-                        "-c:a", "copy"
-                    ]
-                    
-                    if self.codec == "copy":
-                        cmd.extend(["-c:v", "copy"])
-                    else:
-                        cmd.extend(["-c:v", "libx264", "-preset", "medium", "-crf", "23"])
-                    
-                    cmd.extend(["-y", temp_clip])
-                    
-                    result = subprocess.run(cmd, capture_output=True, text=True)
-                    if result.returncode != 0:
-                        self.error.emit(f"Error al procesar clip {idx+1}: {result.stderr}")
-                        return
+            self.indice = MEDIA_INDEX.obtener(self.video_path)
+            if self.indice is None:
+                try:
+                    self.indice = MEDIA_INDEX.escanear(self.video_path)
+                except Exception:
+                    self.indice = None
+            
+            # Capítulos por clip (tramos fusionados o etiquetas suaves) y,
+            # con etiquetas suaves, los rótulos como pista de subtítulos
+            metadatos = subtitulos = None
+            if self.fusion or self.etiquetas_suaves:
+                inicios = None
+                if not self.recodifica() and self.codec == "copy":
+                    inicios = [alinear_a_keyframe(self.video_path, c['ini']) for c in self.clips]
+                self.capitulos = calcular_capitulos(self.clips, inicios)
+                metadatos, subtitulos = escribir_etiquetas(
+                    os.path.join(CARPETA_CORTES, f"export_etiquetas_{int(time.time())}"),
+                    self.capitulos, self.output_path, self.etiquetas_suaves
+                )
+                temp_files += [metadatos, subtitulos]
+            
+            # La misma exportación ya hecha antes sale entera de la caché
+            clave_exportacion = None
+            if self.recodifica() and RENDER_CACHE.activa():
+                clave_exportacion = self.clave_exportacion()
+                en_cache = RENDER_CACHE.obtener(clave_exportacion, fijar=True)
+                if en_cache:
+                    self.fijadas.append(clave_exportacion)
+                    enlazar_o_copiar(en_cache, self.output_path)
+                    self.terminar(0, "")
+                    return
+            
+            # Los segmentos ya renderizados en otra exportación se reutilizan;
+            # solo se renderizan los que faltan. Quedan fijados en la caché
+            # hasta el final: otro render no puede expulsarlos a mitad
+            trabajos = {}
+            claves = [self.clave_clip(clip) for clip in self.clips]
+            for idx, clave in enumerate(claves):
+                if clave is None:
+                    continue
+                self.segmentos[idx] = RENDER_CACHE.obtener(clave, fijar=True)
+                if self.segmentos[idx]:
+                    self.fijadas.append(clave)
                 else:
-                    # Sin timestamp
-                    temp_files.append(None)
+                    trabajos[idx] = None
+            
+            # Si faltan la mayoría de los segmentos, una sola pasada (sin
+            # archivos por clip) es lo más rápido; se guarda como exportación
+            # completa en lugar de por segmentos
+            if self.recodifica() and 2 * len(trabajos) > len(self.clips):
+                self.exportar_en_una_pasada(metadatos, subtitulos, clave_exportacion)
+                return
+            for idx in trabajos:
+                trabajos[idx] = self.comandos_clip(idx, self.clips[idx]) + (claves[idx],)
+                temp_files.append(trabajos[idx][1])
+            pendientes = sorted(trabajos)
+            
+            # Progreso ponderado por la duración de cada clip: 0-90 para los
+            # tramos por clip y 90-100 para la concatenación final
+            duraciones = [max(1, clip['fin'] - clip['ini']) for clip in self.clips]
+            total_tramos = sum(duraciones[i] for i in pendientes) or 1
+            fracciones = {i: 0.0 for i in pendientes}
+            tamanos = {}
+            cerrojo = threading.Lock()
+            
+            # Telemetría del conjunto: medios procesados por segundo entre todos los FFmpeg
+            total = FFmpegTelemetry(total_tramos, "Exportación")
+            
+            def al_progresar(idx, hecho, telemetria=None):
+                with cerrojo:
+                    fracciones[idx] = max(fracciones[idx], hecho)
+                    total.out_time_ms = sum(fracciones[i] * duraciones[i] for i in pendientes)
+                    if telemetria:
+                        tamanos[idx] = telemetria.bytes
+                        total.fps = telemetria.fps
+                    total.bytes = sum(tamanos.values())
+                    if total.transcurrido() > 0:
+                        total.velocidad = total.out_time_ms / 1000.0 / total.transcurrido()
+                    self.publicar_progreso(total, 0, 90)
+            
+            if pendientes:
+                # Varios FFmpeg a la vez, repartiendo los núcleos entre ellos
+                nucleos = os.cpu_count() or 2
+                paralelos = max(1, min(len(pendientes), nucleos // 2))
+                hilos = max(1, nucleos // paralelos)
+                with concurrent.futures.ThreadPoolExecutor(max_workers=paralelos) as pool:
+                    futuros = [
+                        pool.submit(self.procesar_clip, i, self.clips[i], trabajos[i], hilos, al_progresar)
+                        for i in pendientes
+                    ]
+                    hechos = len(self.clips) - len(pendientes)
+                    self.clip_listo.emit(hechos, len(self.clips))
+                    for futuro in concurrent.futures.as_completed(futuros):
+                        if futuro.exception() and not self.fallo:
+                            self.fallo = True
+                            self.detener_procesos()
+                            self.error.emit(str(futuro.exception()))
+                        elif not self.fallo:
+                            hechos += 1
+                            self.clip_listo.emit(hechos, len(self.clips))
+                if self.cancelado:
+                    self.cancelled.emit()
+                if self.fallo:
+                    return
             
-            self.progress.emit(60)
+            self.progress.emit(90)
             
-            # Crear archivo de lista para concatenación
-            list_file = os.path.join(CARPETA_CORTES, f"export_list_{int(time.time())}.txt")
+            # Crear archivo de lista para concatenación, en el orden original
             with open(list_file, "w") as f:
                 for idx, clip in enumerate(self.clips):
-                    if temp_files[idx] and os.path.exists(temp_files[idx]):
-                        f.write(f"file '{temp_files[idx]}'\n")
+                    if self.segmentos[idx] and os.path.exists(self.segmentos[idx]):
+                        f.write(f"file '{self.segmentos[idx]}'\n")
+                    elif claves[idx] is not None:
+                        # El tramo de la fuente no lleva el texto ni los
+                        # parámetros del resto: mezclarlo daría un archivo roto
+                        raise RuntimeError(f"Falta el segmento renderizado del clip {idx+1}")
                     else:
+                        inpoint = clip['ini']
+                        if self.codec == "copy":
+                            inpoint = alinear_a_keyframe(self.video_path, inpoint)
                         f.write(f"file '{self.video_path}'\n")
-                        f.write(f"inpoint {clip['ini']/1000}\n")
+                        f.write(f"inpoint {inpoint/1000}\n")
                         f.write(f"outpoint {clip['fin']/1000}\n")
             
-            self.progress.emit(75)
-            
             # Concatenar clips
             ffmpeg_path = get_ffmpeg_path()
-            if self.codec == "copy":
-                cmd = [ffmpeg_path, "-f", "concat", "-safe", "0", 
-                       "-i", list_file, "-c", "copy", "-y", self.output_path]
-            else:
-                cmd = [ffmpeg_path, "-f", "concat", "-safe", "0", 
-                       "-i", list_file, "-c:v", "libx264", "-preset", "medium",
-                       "-crf", "23", "-c:a", "aac", "-b:a", "128k", "-y", self.output_path]
+            cmd = construir_cmd_concat(ffmpeg_path, list_file, self.output_path, metadatos, subtitulos)
             
-            result = subprocess.run(cmd, capture_output=True, text=True)
-            
-            self.progress.emit(100)
-            
-            if result.returncode == 0:
-                self.finished.emit(self.output_path)
+            codigo, detalle = ejecutar_ffmpeg_progreso(
+                cmd, sum(duraciones),
+                lambda t: self.publicar_progreso(t, 90, 100),
+                self.registrar_proceso, "Exportación: " + os.path.basename(self.output_path)
+            )
+            self.terminar(codigo, detalle)
+                
+        except Exception as e:
+            if self.cancelado:
+                self.cancelled.emit()
             else:
-                self.error.emit(f"Error FFmpeg: {result.stderr}")
-            
-            # Limpiar archivos temporales
-            for temp_file in temp_files:
+                self.error.emit(str(e))
+        finally:
+            RENDER_CACHE.soltar(self.fijadas)
+            # Limpiar archivos temporales (y la salida a medias si se canceló)
+            if self.cancelado:
+                temp_files.append(self.output_path)
+            for temp_file in temp_files + [list_file]:
                 if temp_file and os.path.exists(temp_file):
                     try:
                         os.remove(temp_file)
                     except:
                         pass
-            
-            if os.path.exists(list_file):
-                try:
-                    os.remove(list_file)
-                except:
-                    pass
-                
-        except Exception as e:
-            self.error.emit(str(e))
 
-# ========== DIÁLOGO PARA AGREGAR/EDITAR BOTONES ==========
-class AddButtonDialog(QDialog):
-    """Diálogo para agregar un nuevo botón"""
+# ========== ÍNDICE DE INTERVALOS DE CLIPS ==========
+class _NodoIntervalo:
+    __slots__ = ("ini", "fin", "clave", "valor", "prioridad", "max_fin", "izq", "der")
+
+    def __init__(self, ini, fin, clave, valor):
+        self.ini = ini
+        self.fin = fin
+        self.clave = clave
+        self.valor = valor
+        self.prioridad = random.random()
+        self.max_fin = fin
+        self.izq = None
+        self.der = None
+
+class IntervalIndex:
+    """
+    Treap de intervalos [ini, fin) ordenado por (ini, clave). Cada nodo guarda
+    el fin máximo de su subárbol, así las consultas descartan ramas enteras:
+    inserción y borrado en O(log n), consultas en O(log n + k).
+    """
+    def __init__(self):
+        self.raiz = None
+        self.nodos = {}
+
+    def __len__(self):
+        return len(self.nodos)
+
+    def __contains__(self, clave):
+        return clave in self.nodos
+
+    @staticmethod
+    def _actualizar(nodo):
+        nodo.max_fin = nodo.fin
+        if nodo.izq is not None and nodo.izq.max_fin > nodo.max_fin:
+            nodo.max_fin = nodo.izq.max_fin
+        if nodo.der is not None and nodo.der.max_fin > nodo.max_fin:
+            nodo.max_fin = nodo.der.max_fin
+
+    def _partir(self, nodo, orden, incluir):
+        """Divide en (claves < orden, resto); con incluir, la igual va a la izquierda"""
+        if nodo is None:
+            return None, None
+        propio = (nodo.ini, nodo.clave)
+        if propio < orden or (incluir and propio == orden):
+            nodo.der, derecha = self._partir(nodo.der, orden, incluir)
+            self._actualizar(nodo)
+            return nodo, derecha
+        izquierda, nodo.izq = self._partir(nodo.izq, orden, incluir)
+        self._actualizar(nodo)
+        return izquierda, nodo
+
+    def _unir(self, a, b):
+        """Une dos treaps donde todas las claves de a son menores que las de b"""
+        if a is None:
+            return b
+        if b is None:
+            return a
+        if a.prioridad > b.prioridad:
+            a.der = self._unir(a.der, b)
+            self._actualizar(a)
+            return a
+        b.izq = self._unir(a, b.izq)
+        self._actualizar(b)
+        return b
+
+    def insertar(self, ini, fin, clave, valor):
+        """Añade el intervalo (o lo reemplaza si la clave ya estaba)"""
+        if clave in self.nodos:
+            self.eliminar(clave)
+        nodo = _NodoIntervalo(ini, fin, clave, valor)
+        self.nodos[clave] = nodo
+        izquierda, derecha = self._partir(self.raiz, (ini, clave), False)
+        self.raiz = self._unir(self._unir(izquierda, nodo), derecha)
+
+    def eliminar(self, clave):
+        nodo = self.nodos.pop(clave, None)
+        if nodo is None:
+            return
+        izquierda, resto = self._partir(self.raiz, (nodo.ini, clave), False)
+        _, derecha = self._partir(resto, (nodo.ini, clave), True)
+        self.raiz = self._unir(izquierda, derecha)
+
+    def limpiar(self):
+        self.raiz = None
+        self.nodos = {}
+
+    def en(self, ms):
+        """Valores de los intervalos que contienen ms"""
+        return self.solapados(ms, ms + 1e-6)
+
+    def solapados(self, ini, fin):
+        """Valores de los intervalos que se solapan con [ini, fin), por orden de inicio"""
+        resultado = []
+        # Recorrido en orden iterativo; una rama sin fin > ini no tiene nada que aportar
+        pendientes = []
+        nodo = self.raiz
+        while nodo is not None or pendientes:
+            while nodo is not None and nodo.max_fin > ini:
+                pendientes.append(nodo)
+                nodo = nodo.izq
+            if not pendientes:
+                break
+            nodo = pendientes.pop()
+            if nodo.ini >= fin:
+                break  # El resto empieza aún más tarde
+            if nodo.fin > ini:
+                resultado.append(nodo.valor)
+            nodo = nodo.der
+        return resultado
+
+    def valores(self):
+        """Todos los valores por orden de inicio"""
+        resultado = []
+        pendientes = []
+        nodo = self.raiz
+        while nodo is not None or pendientes:
+            while nodo is not None:
+                pendientes.append(nodo)
+                nodo = nodo.izq
+            nodo = pendientes.pop()
+            resultado.append(nodo.valor)
+            nodo = nodo.der
+        return resultado
+
+# ========== ALMACÉN DE CLIPS ==========
+def formatear_tiempo(ms):
+    """Formatea milisegundos a HH:MM:SS o MM:SS"""
+    s = int(ms // 1000)
+    horas = s // 3600
+    minutos = (s % 3600) // 60
+    segundos = s % 60
+    
+    if horas > 0:
+        return f"{horas:02d}:{minutos:02d}:{segundos:02d}"
+    return f"{minutos:02d}:{segundos:02d}"
+
+class TablaInterna:
+    """Valores repetidos guardados una sola vez; quien los usa guarda solo su índice"""
+    __slots__ = ("valores", "indices")
+
+    def __init__(self, valores=()):
+        self.valores = []
+        self.indices = {}
+        for valor in valores:
+            self.id_de(valor)
+
+    def id_de(self, valor):
+        """Índice del valor (lo añade a la tabla si es nuevo)"""
+        indice = self.indices.get(valor)
+        if indice is None:
+            indice = self.indices[valor] = len(self.valores)
+            self.valores.append(valor)
+        return indice
+
+    def __getitem__(self, indice):
+        return self.valores[indice]
+
+    def __len__(self):
+        return len(self.valores)
+
+# Tablas compartidas por todos los clips cargados (categorías, colores y
+# combinaciones de etiquetas, estas como tuplas; la 0 es "sin etiquetas")
+TABLA_CATEGORIAS = TablaInterna()
+TABLA_COLORES = TablaInterna()
+TABLA_ETIQUETAS = TablaInterna([()])
+
+# Columnas de cada fila en el formato compacto del archivo de proyecto
+COLUMNAS_CLIP = ("id", "ini", "fin", "categoria", "color", "tags", "numero", "nombre", "notas")
+
+class ClipRecord:
+    """
+    Un clip del proyecto con campos fijos (el dict solo existe al guardar o
+    exportar). Categoría, color y etiquetas son índices en las tablas
+    compartidas; el tiempo se deriva de ini y el nombre solo se guarda si no
+    es el automático ("<categoría> <número>").
+    """
+    __slots__ = ("id", "ini", "fin", "_categoria", "_color", "_tags", "_nombre", "numero", "notas", "extra")
+
+    CAMPOS = ("id", "ini", "fin", "nom", "categoria", "nombre", "tiempo", "color", "numero", "tags", "notas")
+
+    def __init__(self, datos):
+        self.id = datos.get("id", 0)
+        self.ini = datos["ini"]
+        self.fin = datos["fin"]
+        self.categoria = datos.get("categoria") or datos.get("nom", "")
+        self.numero = datos.get("numero", 1)
+        self.nombre = datos.get("nombre", "Clip")
+        self.color = datos.get("color", "#3498db")
+        self.tags = datos.get("tags") or ()
+        self.notas = datos.get("notas") or ""
+        # Claves desconocidas de versiones futuras o de otras herramientas: se conservan
+        self.extra = {k: v for k, v in datos.items() if k not in self.CAMPOS} or None
+
+    @classmethod
+    def desde_fila(cls, fila, categorias, colores, etiquetas):
+        """Clip desde una fila del formato compacto (los índices ya traducidos a las tablas globales)"""
+        clip = cls.__new__(cls)
+        clip.id, clip.ini, clip.fin = fila[0], fila[1], fila[2]
+        clip._categoria = categorias[fila[3]]
+        clip._color = colores[fila[4]]
+        clip._tags = etiquetas[fila[5]]
+        clip.numero = fila[6]
+        clip._nombre = fila[7]
+        clip.notas = fila[8] or ""
+        clip.extra = fila[9] if len(fila) > 9 else None
+        return clip
+
+    # --- Campos internados y derivados ---
+
+    @property
+    def categoria(self):
+        return TABLA_CATEGORIAS[self._categoria]
+
+    @categoria.setter
+    def categoria(self, valor):
+        self._categoria = TABLA_CATEGORIAS.id_de(valor)
+
+    @property
+    def color(self):
+        return TABLA_COLORES[self._color]
+
+    @color.setter
+    def color(self, valor):
+        self._color = TABLA_COLORES.id_de(valor)
+
+    @property
+    def tags(self):
+        return TABLA_ETIQUETAS[self._tags]
+
+    @tags.setter
+    def tags(self, valor):
+        self._tags = TABLA_ETIQUETAS.id_de(tuple(valor))
+
+    def nombre_auto(self):
+        return f"{self.categoria.replace(' RIVAL', '').replace('_', ' ')} {self.numero}"
+
+    @property
+    def nombre(self):
+        return self._nombre if self._nombre is not None else self.nombre_auto()
+
+    @nombre.setter
+    def nombre(self, valor):
+        self._nombre = None if valor == self.nombre_auto() else valor
+
+    @property
+    def tiempo(self):
+        return formatear_tiempo(self.ini)
+
+    # --- Serialización ---
+
+    def to_dict(self):
+        datos = dict(self.extra) if self.extra else {}
+        datos.update({
+            "id": self.id,
+            "ini": self.ini,
+            "fin": self.fin,
+            "nom": self.categoria,
+            "tiempo": self.tiempo,
+            "nombre": self.nombre,
+            "color": self.color,
+            "categoria": self.categoria,
+            "numero": self.numero,
+            "tags": list(self.tags),
+            "notas": self.notas
+        })
+        return datos
+
+    def duracion(self):
+        return self.fin - self.ini
+
+    def texto(self):
+        return f"[{self.tiempo}] {self.nombre}"
+
+    def tooltip(self):
+        texto = f"{self.nombre}\nTiempo: {self.tiempo}\nDuración: {self.duracion() / 1000:.1f}s"
+        tag_names = [tag["name"] for tag in map(TAG_MANAGER.get_tag_by_id, self.tags) if tag]
+        if tag_names:
+            texto += f"\nEtiquetas: {', '.join(tag_names)}"
+        if self.notas:
+            texto += f"\nNotas: {self.notas[:50]}..."
+        return texto
+
+def clips_a_compacto(clips):
+    """
+    Clips en el formato compacto del archivo: tablas propias de categorías,
+    colores y etiquetas y una lista por clip con los índices (ver COLUMNAS_CLIP)
+    """
+    categorias, colores, etiquetas = TablaInterna(), TablaInterna(), TablaInterna([()])
+    filas = []
+    for clip in clips:
+        fila = [clip.id, clip.ini, clip.fin,
+                categorias.id_de(clip.categoria), colores.id_de(clip.color), etiquetas.id_de(clip.tags),
+                clip.numero, clip._nombre, clip.notas or None]
+        if clip.extra:
+            fila.append(clip.extra)
+        filas.append(fila)
+    return {
+        "columnas": list(COLUMNAS_CLIP),
+        "categorias": categorias.valores,
+        "colores": colores.valores,
+        "etiquetas": [list(t) for t in etiquetas.valores],
+        "filas": filas
+    }
+
+def clips_de_proyecto(proyecto):
+    """ClipRecords de un proyecto cargado, en formato compacto o en el antiguo (lista de dicts en 'cortes')"""
+    compacto = proyecto.get("clips")
+    if compacto is None:
+        clips = [ClipRecord(corte) for corte in proyecto.get("cortes", [])]
+        # Los proyectos antiguos no guardaban id: el diario de ediciones los necesita
+        siguiente = max((clip.id for clip in clips), default=0) + 1
+        for clip in clips:
+            if not clip.id:
+                clip.id = siguiente
+                siguiente += 1
+        return clips
+    categorias = [TABLA_CATEGORIAS.id_de(c) for c in compacto.get("categorias", [])]
+    colores = [TABLA_COLORES.id_de(c) for c in compacto.get("colores", [])]
+    etiquetas = [TABLA_ETIQUETAS.id_de(tuple(t)) for t in compacto.get("etiquetas", [])]
+    return [ClipRecord.desde_fila(fila, categorias, colores, etiquetas) for fila in compacto.get("filas", [])]
+
+def total_clips_proyecto(proyecto):
+    """Número de clips de un proyecto sin construirlos"""
+    compacto = proyecto.get("clips")
+    if compacto is None:
+        return len(proyecto.get("cortes", []))
+    return len(compacto.get("filas", []))
+
+def medir_memoria_clips(cantidades=(10000, 100000)):
+    """Compara memoria y tamaño en disco de clips como dicts y como ClipRecord (opción --bench-memoria)"""
+    import tracemalloc
+    
+    categorias = ["SALIDA", "SALIDA RIVAL", "ATAQUE", "ATAQUE RIVAL", "DEFENSA", "DEFENSA RIVAL",
+                  "CORNER", "CORNER RIVAL", "TIRO_LIBRE", "TIRO_LIBRE RIVAL", "PENAL", "GOL"]
+    colores = ["#e74c3c", "#3498db", "#2ecc71", "#f39c12", "#9b59b6", "#1abc9c"]
+    etiquetas = [[], [], [1], [4, 5], [2, 3], [6]]
+    
+    def generar(n):
+        numeros = collections.Counter()
+        for i in range(n):
+            nom = categorias[i % len(categorias)]
+            numeros[nom] += 1
+            ini = i * 4000
+            yield {
+                "id": i + 1, "ini": ini, "fin": ini + 8000, "nom": nom,
+                "tiempo": formatear_tiempo(ini),
+                "nombre": f"{nom.replace(' RIVAL', '').replace('_', ' ')} {numeros[nom]}",
+                "color": colores[i % len(colores)], "categoria": nom, "numero": numeros[nom],
+                "tags": list(etiquetas[i % len(etiquetas)]), "notas": ""
+            }
+    
+    def medir(construir):
+        tracemalloc.start()
+        datos = construir()
+        actual, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return datos, actual
+    
+    print(f"{'clips':>8} {'dicts (MB)':>11} {'ClipRecord (MB)':>16} {'JSON antiguo (MB)':>18} {'JSON compacto (MB)':>19}")
+    for n in cantidades:
+        # Los dicts se generan decodificando JSON, como al abrir un proyecto antiguo
+        texto = json.dumps(list(generar(n)), indent=2, ensure_ascii=False)
+        compacto = json.dumps(clips_a_compacto(map(ClipRecord, json.loads(texto))),
+                              ensure_ascii=False, separators=(",", ":"))
+        dicts, mem_dicts = medir(lambda: json.loads(texto))
+        registros, mem_registros = medir(lambda: clips_de_proyecto({"clips": json.loads(compacto)}))
+        print(f"{n:>8} {mem_dicts / 2**20:>11.1f} {mem_registros / 2**20:>16.1f} "
+              f"{len(texto.encode()) / 2**20:>18.1f} {len(compacto.encode()) / 2**20:>19.1f}")
+        del dicts, registros
+
+class ClipStore(QAbstractListModel):
+    """
+    Todos los clips del proyecto: modelo Qt (una fila por clip, en orden de
+    alta) más el índice temporal. Las listas de cada categoría son vistas
+    filtradas sobre él; texto, color y tooltip se calculan solo al pintarse.
+    """
+    ROL_CLIP = Qt.ItemDataRole.UserRole
+    ROL_CATEGORIA = Qt.ItemDataRole.UserRole + 1
+
+    conteos_cambiados = pyqtSignal()
+
     def __init__(self, parent=None):
         super().__init__(parent)
-        self.setWindowTitle("Agregar Nuevo Botón")
-        self.resize(400, 500)  # Aumentado para incluir duración
-        self.button_data = None
-        self.setup_ui()
+        self.registros = []
+        # id -> fila en registros (set_resaltados la consulta en cada tic del cabezal)
+        self.filas = {}
+        self.indice = IntervalIndex()
+        self.conteos = collections.Counter()
+        self.siguiente_id = 1
+        self.resaltados = set()
+        self.colores = {}
+        self.fuente_resaltada = QFont()
+        self.fuente_resaltada.setBold(True)
+
+    # --- QAbstractListModel ---
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.registros)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        clip = self.registros[index.row()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            return clip.texto()
+        if role == Qt.ItemDataRole.ForegroundRole:
+            if clip.color not in self.colores:
+                self.colores[clip.color] = QColor(clip.color)
+            return self.colores[clip.color]
+        if role == Qt.ItemDataRole.ToolTipRole:
+            return clip.tooltip()
+        if role == Qt.ItemDataRole.FontRole and clip.id in self.resaltados:
+            return self.fuente_resaltada
+        if role == self.ROL_CLIP:
+            return clip
+        if role == self.ROL_CATEGORIA:
+            return clip.categoria
+        return None
+
+    # --- Altas, cambios y bajas ---
+
+    def _registrar(self, clip, fila):
+        if not clip.id:
+            clip.id = self.siguiente_id
+        self.siguiente_id = max(self.siguiente_id, clip.id + 1)
+        self.filas[clip.id] = fila
+        self.indice.insertar(clip.ini, clip.fin, clip.id, clip)
+        self.conteos[clip.categoria] += 1
+
+    def agregar(self, clip):
+        """Añade un clip (le asigna id si no tiene)"""
+        fila = len(self.registros)
+        self.beginInsertRows(QModelIndex(), fila, fila)
+        self.registros.append(clip)
+        self._registrar(clip, fila)
+        self.endInsertRows()
+        self.conteos_cambiados.emit()
+        return clip
+
+    def agregar_varios(self, clips):
+        """Añade muchos clips con una sola notificación a las vistas"""
+        if not clips:
+            return
+        fila = len(self.registros)
+        self.beginInsertRows(QModelIndex(), fila, fila + len(clips) - 1)
+        self.registros.extend(clips)
+        for i, clip in enumerate(clips, fila):
+            self._registrar(clip, i)
+        self.endInsertRows()
+        self.conteos_cambiados.emit()
+
+    def fila(self, clip):
+        return self.filas[clip.id]
+
+    def actualizar(self, clip):
+        """Avisa de que el clip cambió (tiempos, nombre, etiquetas...)"""
+        self.indice.insertar(clip.ini, clip.fin, clip.id, clip)
+        index = self.index(self.fila(clip))
+        self.dataChanged.emit(index, index)
+
+    def eliminar(self, clip):
+        fila = self.fila(clip)
+        self.beginRemoveRows(QModelIndex(), fila, fila)
+        del self.registros[fila]
+        del self.filas[clip.id]
+        for i in range(fila, len(self.registros)):
+            self.filas[self.registros[i].id] = i
+        self.indice.eliminar(clip.id)
+        self.conteos[clip.categoria] -= 1
+        self.resaltados.discard(clip.id)
+        self.endRemoveRows()
+        self.conteos_cambiados.emit()
+
+    def limpiar(self):
+        self.reemplazar([])
+
+    def reemplazar(self, clips):
+        """Sustituye todos los clips (al abrir un proyecto) con un único reset de las vistas"""
+        self.beginResetModel()
+        self.registros = []
+        self.filas = {}
+        self.indice.limpiar()
+        self.conteos = collections.Counter()
+        self.resaltados = set()
+        self.registros.extend(clips)
+        # Los clips sin id (proyectos antiguos) no deben chocar con ids posteriores
+        self.siguiente_id = max((clip.id for clip in self.registros), default=0) + 1
+        for fila, clip in enumerate(self.registros):
+            self._registrar(clip, fila)
+        self.endResetModel()
+        self.conteos_cambiados.emit()
+
+    def set_resaltados(self, ids):
+        """Pone en negrita los clips indicados (los que están bajo el cabezal)"""
+        cambiados = self.resaltados ^ ids
+        self.resaltados = ids
+        for clip_id in cambiados:
+            fila = self.filas.get(clip_id)
+            if fila is not None:
+                index = self.index(fila)
+                self.dataChanged.emit(index, index, [Qt.ItemDataRole.FontRole])
+
+    # --- Consultas ---
+
+    def __len__(self):
+        return len(self.registros)
+
+    def conteo(self, categoria):
+        return self.conteos[categoria]
+
+    def en(self, ms):
+        return self.indice.en(ms)
+
+    def solapados(self, ini, fin):
+        return self.indice.solapados(ini, fin)
+
+    def cronologico(self):
+        return self.indice.valores()
+
+    def a_dicts(self):
+        """Clips como dicts, en el orden de alta (para exportar y renderizar)"""
+        return [clip.to_dict() for clip in self.registros]
+
+    def a_compacto(self):
+        """Clips en el formato compacto del archivo de proyecto"""
+        return clips_a_compacto(self.registros)
+
+class CategoriaProxyModel(QSortFilterProxyModel):
+    """Vista de un ClipStore limitada a los clips de una categoría"""
+    def __init__(self, categoria, parent=None):
+        super().__init__(parent)
+        self.categoria = categoria
+
+    def filterAcceptsRow(self, fila, padre):
+        return self.sourceModel().registros[fila].categoria == self.categoria
+
+# ========== ÍNDICE DE MEDIOS (METADATOS Y KEYFRAMES) ==========
+def get_ffprobe_path():
+    """Busca ffprobe junto a ffmpeg o en el sistema (puede no estar disponible)"""
+    import shutil
     
-    def setup_ui(self):
-        layout = QVBoxLayout(self)
-        
-        # Nombre del botón
-        layout.addWidget(QLabel("Nombre del botón:"))
-        self.nombre_input = QLineEdit()
-        self.nombre_input.setPlaceholderText("Ej: SALIDA, GOL, FALTA")
-        layout.addWidget(self.nombre_input)
-        
-        # Tecla de acceso
-        layout.addWidget(QLabel("Tecla de acceso rápido:"))
-        self.tecla_input = QLineEdit()
-        self.tecla_input.setMaxLength(1)
-        self.tecla_input.setPlaceholderText("Una letra o número")
-        layout.addWidget(self.tecla_input)
+    nombre = "ffprobe.exe" if platform.system() == "Windows" else "ffprobe"
+    ffmpeg_path = get_ffmpeg_path()
+    if ffmpeg_path:
+        candidato = os.path.join(os.path.dirname(ffmpeg_path), nombre)
+        if os.path.exists(candidato):
+            return candidato
+    if getattr(sys, 'frozen', False):
+        candidato = os.path.join(sys._MEIPASS, nombre)
+        if os.path.exists(candidato):
+            return candidato
+    return shutil.which("ffprobe")
+
+def huella_video(video_path, bloque=1024 * 1024):
+    """Huella rápida de un video: tamaño, mtime y hash del primer y último MB"""
+    import hashlib
+    
+    st = os.stat(video_path)
+    h = hashlib.sha1(f"{st.st_size}:{st.st_mtime_ns}".encode())
+    with open(video_path, 'rb') as f:
+        h.update(f.read(bloque))
+        if st.st_size > bloque:
+            f.seek(max(bloque, st.st_size - bloque))
+            h.update(f.read(bloque))
+    return h.hexdigest()
+
+def _fraccion(texto):
+    """Convierte '30000/1001' en float (0 si no es válido)"""
+    try:
+        num, _, den = str(texto).partition("/")
+        return float(num) / float(den or 1)
+    except (ValueError, ZeroDivisionError):
+        return 0.0
+
+# Se sube cuando cambia cómo se calculan los datos: los sidecars de otra versión se regeneran
+# (2: tiempos relativos al inicio del stream, como el reproductor y -ss;
+#  3: cabeceras del video, para re-codificar los bordes del smart-cut igual que la fuente)
+VERSION_INDICE_MEDIOS = 3
+
+class MediaIndex:
+    """Metadatos y lista de keyframes de un video, consultables en O(log n)"""
+    def __init__(self, datos):
+        self.version = datos.get("version", 1)
+        self.huella = datos.get("huella", "")
+        self.duracion_ms = datos.get("duracion_ms", 0)
+        self.fps = datos.get("fps", 0) or 30.0
+        self.time_base = datos.get("time_base", "")
+        self.vcodec = datos.get("vcodec", "")
+        self.acodec = datos.get("acodec", "")
+        self.ancho = datos.get("ancho", 0)
+        self.alto = datos.get("alto", 0)
+        self.pix_fmt = datos.get("pix_fmt", "")
+        # Campos de las cabeceras SPS/PPS del primer keyframe (perfil, nivel, refs, entropía)
+        self.cabeceras = datos.get("cabeceras") or {}
+        self.keyframes = datos.get("keyframes", [])
+        # Solo se guardan los tiempos de cada frame si el video es VFR
+        self.frame_times = datos.get("frame_times") or None
+        self.vfr = bool(self.frame_times)
+        # Cambios de plano (ms); None mientras no se hayan detectado
+        self.cortes_escena = datos.get("cortes_escena")
+
+    def to_dict(self):
+        return {
+            "version": self.version,
+            "huella": self.huella,
+            "duracion_ms": self.duracion_ms,
+            "fps": self.fps,
+            "time_base": self.time_base,
+            "vcodec": self.vcodec,
+            "acodec": self.acodec,
+            "ancho": self.ancho,
+            "alto": self.alto,
+            "pix_fmt": self.pix_fmt,
+            "cabeceras": self.cabeceras,
+            "keyframes": self.keyframes,
+            "frame_times": self.frame_times or [],
+            "cortes_escena": self.cortes_escena
+        }
+
+    def frame_ms(self):
+        """Duración nominal de un frame en milisegundos"""
+        return 1000.0 / self.fps
+
+    def keyframe_antes(self, ms):
+        """Último keyframe en o antes de ms"""
+        i = bisect.bisect_right(self.keyframes, ms + 0.5) - 1
+        return self.keyframes[i] if i >= 0 else 0
+
+    def keyframe_despues(self, ms):
+        """Primer keyframe en o después de ms (None si no hay)"""
+        i = bisect.bisect_left(self.keyframes, ms - 0.5)
+        return self.keyframes[i] if i < len(self.keyframes) else None
+
+    def corte_cercano(self, ms, tolerancia_ms):
+        """Cambio de plano más cercano a ms, o None si no hay ninguno dentro de la tolerancia"""
+        cortes = self.cortes_escena
+        if not cortes:
+            return None
+        i = bisect.bisect_left(cortes, ms)
+        candidatos = [cortes[j] for j in (i - 1, i) if 0 <= j < len(cortes)]
+        mejor = min(candidatos, key=lambda c: abs(c - ms))
+        return mejor if abs(mejor - ms) <= tolerancia_ms else None
+
+    def indice_frame(self, ms):
+        """Índice del frame que se muestra en ms"""
+        if self.frame_times:
+            return max(0, bisect.bisect_right(self.frame_times, ms + 0.001) - 1)
+        return int((ms + 0.001) / self.frame_ms())
+
+    def tiempo_frame(self, indice):
+        """Tiempo de inicio (ms) del frame con ese índice"""
+        if self.frame_times:
+            return self.frame_times[max(0, min(indice, len(self.frame_times) - 1))]
+        return max(0, indice) * self.frame_ms()
+
+    def frame_siguiente(self, ms):
+        """Tiempo del frame siguiente al que se muestra en ms"""
+        return self.tiempo_frame(self.indice_frame(ms) + 1)
+
+    def frame_anterior(self, ms):
+        """Tiempo del frame anterior al que se muestra en ms"""
+        return self.tiempo_frame(self.indice_frame(ms) - 1)
+
+# Campos de cabecera que se guardan en el índice, por códec
+CAMPOS_CABECERAS = {
+    "h264": ("profile_idc", "level_idc", "max_num_ref_frames",
+             "entropy_coding_mode_flag", "transform_8x8_mode_flag"),
+    "hevc": ("general_profile_idc", "general_level_idc")
+}
+
+# Sensibilidad del filtro scene de FFmpeg (0-1) para los cambios de plano
+UMBRAL_ESCENA = 0.3
+TOLERANCIA_ESCENA_MS = 400
+
+class MediaIndexManager:
+    """Escanea cada video una sola vez y guarda el índice junto a la base de datos"""
+    def __init__(self):
+        self.carpeta = os.path.join(CARPETA_DB, "media_index")
+        os.makedirs(self.carpeta, exist_ok=True)
+        self.memoria = {}
+        self.huellas = {}
+
+    def _ruta_sidecar(self, huella):
+        return os.path.join(self.carpeta, f"{huella}.json")
+
+    def huella(self, video_path):
+        """huella_video() con memoria por ruta, tamaño y mtime"""
+        st = os.stat(video_path)
+        clave = (video_path, st.st_size, st.st_mtime_ns)
+        if clave not in self.huellas:
+            self.huellas[clave] = huella_video(video_path)
+        return self.huellas[clave]
+
+    def obtener(self, video_path):
+        """Devuelve el índice si ya existe (memoria o disco); no escanea"""
+        if not video_path or not os.path.exists(video_path):
+            return None
+        try:
+            huella = self.huella(video_path)
+        except OSError:
+            return None
+        if huella in self.memoria:
+            return self.memoria[huella]
         
-        # Tipo de corte
-        layout.addWidget(QLabel("Tipo de corte:"))
-        self.tipo_combo = QComboBox()
-        self.tipo_combo.addItems(["manual", "auto"])
-        self.tipo_combo.currentTextChanged.connect(self.toggle_duracion)
-        layout.addWidget(self.tipo_combo)
+        sidecar = self._ruta_sidecar(huella)
+        if os.path.exists(sidecar):
+            try:
+                with open(sidecar, 'r') as f:
+                    indice = MediaIndex(json.load(f))
+                if indice.version == VERSION_INDICE_MEDIOS:
+                    self.memoria[huella] = indice
+                    return indice
+            except:
+                pass
+        return None
+
+    def escanear(self, video_path):
+        """Escanea el video con ffprobe (bloqueante) y guarda el sidecar"""
+        indice = self.obtener(video_path)
+        if indice:
+            return indice
         
-        # Duración para cortes automáticos
-        self.duracion_label = QLabel("Duración automática (segundos):")
-        self.duracion_spin = QSpinBox()
-        self.duracion_spin.setRange(1, 60)
-        self.duracion_spin.setValue(10)
-        self.duracion_spin.setSuffix(" seg")
-        self.duracion_layout = QHBoxLayout()
-        self.duracion_layout.addWidget(self.duracion_label)
-        self.duracion_layout.addWidget(self.duracion_spin)
+        huella = self.huella(video_path)
+        ffprobe_path = get_ffprobe_path()
+        if ffprobe_path:
+            datos = self._escanear_ffprobe(ffprobe_path, video_path)
+        else:
+            datos = self._escanear_ffmpeg(get_ffmpeg_path(), video_path)
+        if datos.get("vcodec") in CAMPOS_CABECERAS:
+            datos["cabeceras"] = self._leer_cabeceras(get_ffmpeg_path(), video_path, datos["vcodec"])
+        datos["huella"] = huella
+        datos["version"] = VERSION_INDICE_MEDIOS
+        
+        indice = MediaIndex(datos)
+        self.memoria[huella] = indice
+        self.guardar(indice)
+        return indice
+
+    def guardar(self, indice):
+        """Reescribe el sidecar del índice"""
+        sidecar = self._ruta_sidecar(indice.huella)
+        temp = sidecar + ".tmp"
+        with open(temp, 'w') as f:
+            json.dump(indice.to_dict(), f)
+        os.replace(temp, sidecar)
+
+    def escanear_escenas(self, video_path, umbral=UMBRAL_ESCENA, al_iniciar=None):
+        """
+        Detecta los cambios de plano con una pasada de FFmpeg sobre el video
+        reducido (bloqueante) y los añade al sidecar del índice.
+        al_iniciar recibe el proceso, para poder cancelarlo.
+        """
+        indice = self.escanear(video_path)
+        if indice.cortes_escena is not None:
+            return indice
+        import re
+        
+        kwargs = {"stdout": subprocess.DEVNULL, "stderr": subprocess.PIPE, "text": True}
+        if SYS_CONFIG["system"] == "Windows":
+            kwargs["creationflags"] = subprocess.CREATE_NO_WINDOW
+        proceso = subprocess.Popen([
+            get_ffmpeg_path(), "-hide_banner", "-nostats", "-i", video_path,
+            "-map", "0:v:0", "-an", "-sn",
+            "-vf", f"scale=160:-2,select='gt(scene,{umbral})',showinfo", "-f", "null", "-"
+        ], **kwargs)
+        if al_iniciar:
+            al_iniciar(proceso)
+        _, log = proceso.communicate()
+        if proceso.returncode != 0:
+            raise RuntimeError(f"ffmpeg: {log[-300:]}")
+        indice.cortes_escena = sorted(int(round(float(t) * 1000))
+                                      for t in re.findall(r"pts_time:\s*([\d.]+)", log))
+        self.guardar(indice)
+        return indice
+
+    def _escanear_ffprobe(self, ffprobe_path, video_path):
+        result = subprocess.run([
+            ffprobe_path, "-v", "error",
+            "-show_entries", "format=duration,start_time:stream=codec_type,codec_name,r_frame_rate,"
+                             "avg_frame_rate,time_base,width,height,pix_fmt",
+            "-of", "json", video_path
+        ], capture_output=True, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(f"ffprobe: {result.stderr[:300]}")
+        info = json.loads(result.stdout)
+        
+        datos = {"duracion_ms": int(float(info.get("format", {}).get("duration", 0) or 0) * 1000)}
+        # Los pts de los paquetes son absolutos; el reproductor, -ss y el
+        # escaneo con ffmpeg cuentan desde el inicio (MPEG-TS no empieza en 0)
+        try:
+            inicio = float(info.get("format", {}).get("start_time", 0) or 0)
+        except ValueError:
+            inicio = 0.0
+        for stream in info.get("streams", []):
+            if stream.get("codec_type") == "video" and "vcodec" not in datos:
+                datos["vcodec"] = stream.get("codec_name", "")
+                datos["fps"] = _fraccion(stream.get("avg_frame_rate")) or _fraccion(stream.get("r_frame_rate"))
+                datos["time_base"] = stream.get("time_base", "")
+                datos["ancho"] = stream.get("width", 0)
+                datos["alto"] = stream.get("height", 0)
+                datos["pix_fmt"] = stream.get("pix_fmt", "")
+            elif stream.get("codec_type") == "audio" and "acodec" not in datos:
+                datos["acodec"] = stream.get("codec_name", "")
+        
+        # Lectura de paquetes (sin decodificar): tiempos y banderas de keyframe
+        result = subprocess.run([
+            ffprobe_path, "-v", "error", "-select_streams", "v:0",
+            "-show_entries", "packet=pts_time,flags", "-of", "csv=p=0", video_path
+        ], capture_output=True, text=True)
+        tiempos, keyframes = [], []
+        for linea in result.stdout.splitlines():
+            pts, _, flags = linea.partition(",")
+            try:
+                ms = round((float(pts) - inicio) * 1000, 3)
+            except ValueError:
+                continue
+            tiempos.append(ms)
+            if "K" in flags:
+                keyframes.append(ms)
+        tiempos.sort()
+        keyframes.sort()
+        datos["keyframes"] = keyframes
+        
+        # VFR: si los intervalos entre frames varían, guardar todos los tiempos
+        if len(tiempos) > 2:
+            deltas = [b - a for a, b in zip(tiempos, tiempos[1:])]
+            if max(deltas) - min(deltas) > 1.5:
+                datos["frame_times"] = tiempos
+            if not datos.get("fps"):
+                datos["fps"] = 1000.0 * (len(tiempos) - 1) / (tiempos[-1] - tiempos[0])
+        return datos
+
+    def _leer_cabeceras(self, ffmpeg_path, video_path, vcodec):
+        """Campos de las cabeceras del primer keyframe, leídos con el bsf trace_headers"""
+        import re
+        
+        result = subprocess.run([
+            ffmpeg_path, "-hide_banner", "-i", video_path, "-map", "0:v:0", "-c", "copy",
+            "-frames:v", "1", "-bsf:v", "trace_headers", "-f", "null", "-"
+        ], capture_output=True, text=True)
+        cabeceras = {}
+        for nombre, valor in re.findall(r"\]\s+\d+\s+(\w+)(?:\[0\])?\s+[01]+\s+=\s+(-?\d+)", result.stderr):
+            if nombre in CAMPOS_CABECERAS[vcodec]:
+                cabeceras.setdefault(nombre, int(valor))
+        return cabeceras
+
+    def _escanear_ffmpeg(self, ffmpeg_path, video_path):
+        """Alternativa sin ffprobe: cabecera de ffmpeg y solo keyframes decodificados"""
+        import re
+        
+        result = subprocess.run([
+            ffmpeg_path, "-hide_banner", "-skip_frame", "nokey", "-i", video_path,
+            "-map", "0:v:0", "-vf", "showinfo", "-f", "null", "-"
+        ], capture_output=True, text=True)
+        log = result.stderr
+        
+        datos = {"keyframes": sorted(round(float(t) * 1000, 3)
+                                     for t in re.findall(r"pts_time:\s*([\d.]+)", log))}
+        m = re.search(r"Duration: (\d+):(\d+):([\d.]+)", log)
+        if m:
+            datos["duracion_ms"] = int((int(m.group(1)) * 3600 + int(m.group(2)) * 60 + float(m.group(3))) * 1000)
+        m = re.search(r"Video: (\w+).*?, (\d{2,5})x(\d{2,5})", log)
+        if m:
+            datos["vcodec"], datos["ancho"], datos["alto"] = m.group(1), int(m.group(2)), int(m.group(3))
+        m = re.search(r"([\d.]+) fps", log)
+        if m:
+            datos["fps"] = float(m.group(1))
+        m = re.search(r"Audio: (\w+)", log)
+        if m:
+            datos["acodec"] = m.group(1)
+        return datos
+
+# Instancia global del índice de medios
+MEDIA_INDEX = MediaIndexManager()
+
+class MediaProbeWorker(QThread):
+    """Escanea un video en segundo plano"""
+    finished = pyqtSignal(str, object)
+    error = pyqtSignal(str, str)
+
+    def __init__(self, video_path):
+        super().__init__()
+        self.video_path = video_path
+
+    def run(self):
+        try:
+            self.finished.emit(self.video_path, MEDIA_INDEX.escanear(self.video_path))
+        except Exception as e:
+            self.error.emit(self.video_path, str(e))
+
+class SceneDetectWorker(QThread):
+    """Detecta los cambios de plano de un video en segundo plano"""
+    finished = pyqtSignal(str, object)
+    error = pyqtSignal(str, str)
+
+    def __init__(self, video_path):
+        super().__init__()
+        self.video_path = video_path
+        self.proceso = None
+        self.cancelado = False
+
+    def iniciado(self, proceso):
+        self.proceso = proceso
+        if self.cancelado:
+            self.cancelar()
+
+    def cancelar(self):
+        self.cancelado = True
+        if self.proceso and self.proceso.poll() is None:
+            try:
+                self.proceso.kill()
+            except:
+                pass
+
+    def run(self):
+        try:
+            indice = MEDIA_INDEX.escanear_escenas(self.video_path, al_iniciar=self.iniciado)
+            self.finished.emit(self.video_path, indice)
+        except Exception as e:
+            if not self.cancelado:
+                self.error.emit(self.video_path, str(e))
+
+def alinear_a_keyframe(video_path, ini_ms):
+    """Inicio real de un corte con copia directa: el keyframe anterior a ini_ms"""
+    indice = MEDIA_INDEX.obtener(video_path)
+    if indice and indice.keyframes:
+        return indice.keyframe_antes(ini_ms)
+    return ini_ms
+
+# ========== DECODIFICACIÓN EXACTA DE FRAMES ==========
+# Alto máximo de los frames decodificados (RGB, 3 bytes por píxel)
+FRAME_EXACTO_ALTO = 720
+# Memoria máxima de la caché de frames decodificados
+FRAME_CACHE_MB = 512
+# Frames que se intentan tener decodificados a cada lado del cabezal
+FRAMES_ALREDEDOR = 90
+
+class FrameCache:
+    """Caché LRU de frames decodificados (índice de frame -> array RGB), segura entre hilos"""
+    def __init__(self, tam_frame, max_bytes=FRAME_CACHE_MB * 1024 * 1024):
+        self.capacidad = max(8, max_bytes // tam_frame)
+        self.frames = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def obtener(self, indice):
+        with self.lock:
+            frame = self.frames.get(indice)
+            if frame is not None:
+                self.frames.move_to_end(indice)
+            return frame
+
+    def contiene(self, indice):
+        with self.lock:
+            return indice in self.frames
+
+    def guardar(self, indice, frame):
+        with self.lock:
+            self.frames[indice] = frame
+            self.frames.move_to_end(indice)
+            while len(self.frames) > self.capacidad:
+                self.frames.popitem(last=False)
+
+class FrameDecoder(QThread):
+    """
+    Decodifica con FFmpeg frames exactos del video original a buffers de NumPy.
+    Cada tramo empieza en un keyframe, así se sabe el índice de cada frame que
+    llega por la tubería. Primero el GOP del cabezal, luego los anteriores (para
+    retroceder) y los siguientes, hasta cubrir FRAMES_ALREDEDOR a cada lado.
+    """
+    frame_listo = pyqtSignal(int)
+    error = pyqtSignal(str)
+
+    def __init__(self, video_path, indice):
+        super().__init__()
+        self.video_path = video_path
+        self.indice = indice
+        self.alto = min(indice.alto or FRAME_EXACTO_ALTO, FRAME_EXACTO_ALTO)
+        ancho = indice.ancho * self.alto / indice.alto if indice.alto else self.alto * 16 / 9
+        self.ancho = max(2, int(round(ancho / 2)) * 2)
+        self.tam_frame = self.ancho * self.alto * 3
+        self.cache = FrameCache(self.tam_frame)
+        # La ventana nunca puede ser mayor que lo que cabe en la caché
+        self.margen = max(1, min(FRAMES_ALREDEDOR, self.cache.capacidad // 3))
+        if indice.frame_times:
+            self.total = len(indice.frame_times)
+        else:
+            self.total = max(1, int(indice.duracion_ms / indice.frame_ms()))
+        self.objetivo = None
+        self.condicion = threading.Condition()
+        self.proceso = None
+        self.detenido = False
+
+    def solicitar(self, frame):
+        """Pide el frame (y su entorno); la petición más reciente sustituye a la anterior"""
+        with self.condicion:
+            self.objetivo = frame
+            self.condicion.notify()
+
+    def detener(self):
+        with self.condicion:
+            self.detenido = True
+            self.condicion.notify()
+        self._matar()
+
+    def _matar(self):
+        proceso = self.proceso
+        if proceso and proceso.poll() is None:
+            try:
+                proceso.kill()
+            except:
+                pass
+
+    def gop(self, frame):
+        """Rango [inicio, fin) de índices de frame del GOP que contiene frame"""
+        indice = self.indice
+        inicio = indice.indice_frame(indice.keyframe_antes(indice.tiempo_frame(frame)))
+        siguiente = indice.keyframe_despues(indice.tiempo_frame(frame + 1))
+        fin = indice.indice_frame(siguiente) if siguiente is not None else self.total
+        return min(inicio, frame), max(fin, frame + 1)
+
+    def run(self):
+        while True:
+            with self.condicion:
+                while self.objetivo is None and not self.detenido:
+                    self.condicion.wait()
+                if self.detenido:
+                    return
+                objetivo = self.objetivo
+                self.objetivo = None
+            try:
+                self.rellenar(objetivo)
+            except Exception as e:
+                if not self.detenido:
+                    self.error.emit(str(e))
+
+    def rellenar(self, objetivo):
+        """Decodifica los GOPs que faltan alrededor del objetivo, el suyo primero"""
+        desde = max(0, objetivo - self.margen)
+        hasta = min(self.total, objetivo + self.margen + 1)
+        actual = self.gop(objetivo)
+        tramos = [actual]
+        inicio = actual[0]
+        while inicio > desde:
+            previo = self.gop(inicio - 1)
+            tramos.append(previo)
+            inicio = previo[0]
+        fin = actual[1]
+        while fin < hasta:
+            siguiente = self.gop(fin)
+            tramos.append(siguiente)
+            fin = siguiente[1]
+        
+        for inicio, fin in tramos:
+            if self.detenido or self.objetivo is not None:
+                return  # Hay una petición nueva: se replanifica desde ella
+            faltan = {f for f in range(max(inicio, desde), min(fin, hasta))
+                      if not self.cache.contiene(f)}
+            if faltan:
+                self.decodificar(inicio, max(faltan) + 1, faltan, desde, hasta)
+
+    def decodificar(self, inicio, fin, faltan, desde, hasta):
+        """Decodifica [inicio, fin) desde su keyframe y guarda en la caché los frames de faltan"""
+        indice = self.indice
+        keyframe = indice.keyframe_antes(indice.tiempo_frame(inicio))
+        # Medio frame antes del keyframe: la búsqueda precisa lo entrega como primer frame
+        ss = max(0.0, keyframe - indice.frame_ms() / 2) / 1000
+        cmd = [
+            get_ffmpeg_path(), "-hide_banner", "-loglevel", "error",
+            "-ss", f"{ss:.3f}", "-i", self.video_path, "-map", "0:v:0", "-an", "-sn",
+            "-vf", f"scale={self.ancho}:{self.alto}", "-vsync", "passthrough",
+            "-frames:v", str(fin - inicio), "-f", "rawvideo", "-pix_fmt", "rgb24", "pipe:1"
+        ]
+        kwargs = {"stdout": subprocess.PIPE, "stderr": subprocess.DEVNULL}
+        if SYS_CONFIG["system"] == "Windows":
+            kwargs["creationflags"] = subprocess.CREATE_NO_WINDOW
+        self.proceso = subprocess.Popen(cmd, **kwargs)
+        if self.detenido:
+            self._matar()
+        
+        frame = inicio
+        while frame < fin:
+            datos = self.proceso.stdout.read(self.tam_frame)
+            if len(datos) < self.tam_frame:
+                break
+            if frame in faltan:
+                self.cache.guardar(frame, np.frombuffer(datos, dtype=np.uint8).reshape(self.alto, self.ancho, 3))
+                self.frame_listo.emit(frame)
+            frame += 1
+            # El cabezal saltó fuera de la ventana: este tramo ya no sirve
+            pendiente = self.objetivo
+            if pendiente is not None and not (desde <= pendiente < hasta):
+                self._matar()
+                break
+        self.proceso.stdout.close()
+        self.proceso.wait()
+
+class FrameView(QWidget):
+    """Muestra un frame de FrameDecoder en lugar del reproductor, con su proporción"""
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.frame = None
+        self.imagen = None
+
+    def mostrar(self, frame):
+        alto, ancho, _ = frame.shape
+        self.frame = frame  # QImage no copia el buffer: hay que mantenerlo vivo
+        self.imagen = QImage(frame.data, ancho, alto, 3 * ancho, QImage.Format.Format_RGB888)
+        self.update()
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), Qt.GlobalColor.black)
+        if self.imagen is not None:
+            tam = self.imagen.size().scaled(self.size(), Qt.AspectRatioMode.KeepAspectRatio)
+            x = (self.width() - tam.width()) // 2
+            y = (self.height() - tam.height()) // 2
+            painter.drawImage(QRect(x, y, tam.width(), tam.height()), self.imagen)
+        painter.end()
+
+# ========== TIRA DE MINIATURAS ==========
+FILMSTRIP_ANCHO = 128
+FILMSTRIP_ALTO = 72
+FILMSTRIP_MAX_FRAMES = 1200
+
+def intervalo_filmstrip(duracion_ms):
+    """Un frame cada N segundos (mínimo 2 s) para no pasar de FILMSTRIP_MAX_FRAMES"""
+    return max(2, math.ceil(duracion_ms / 1000.0 / FILMSTRIP_MAX_FRAMES)) * 1000
+
+class Filmstrip:
+    """
+    Hoja de miniaturas RGB24 en un solo archivo (frame i en el byte
+    i * ancho * alto * 3), leída con mmap sin volver a decodificar.
+    """
+    def __init__(self, ruta, intervalo_ms, total, listos=None, ancho=FILMSTRIP_ANCHO, alto=FILMSTRIP_ALTO):
+        self.ruta = ruta
+        self.intervalo_ms = intervalo_ms
+        self.total = total
+        self.ancho = ancho
+        self.alto = alto
+        self.tam_frame = ancho * alto * 3
+        self.listos = listos if listos is not None else bytearray(total)
+        self.mapa = None
+
+    def abrir(self, escritura=False):
+        """Mapea el archivo (creándolo a su tamaño final si hace falta)"""
+        if escritura:
+            with open(self.ruta, 'ab') as f:
+                if f.tell() != self.total * self.tam_frame:
+                    f.truncate(self.total * self.tam_frame)
+        self._archivo = open(self.ruta, 'r+b' if escritura else 'rb')
+        self.mapa = mmap.mmap(self._archivo.fileno(), 0,
+                              access=mmap.ACCESS_WRITE if escritura else mmap.ACCESS_READ)
+        return self
+
+    def cerrar(self):
+        if self.mapa is not None:
+            self.mapa.close()
+            self._archivo.close()
+            self.mapa = None
+
+    def escribir(self, i, datos):
+        inicio = i * self.tam_frame
+        self.mapa[inicio:inicio + self.tam_frame] = datos
+        self.listos[i] = 1
+
+    def indice(self, ms):
+        return min(self.total - 1, max(0, int(ms // self.intervalo_ms)))
+
+    def imagen(self, i):
+        """QImage del frame i, o None si todavía no se ha extraído"""
+        if self.mapa is None or not (0 <= i < self.total) or not self.listos[i]:
+            return None
+        inicio = i * self.tam_frame
+        return QImage(self.mapa[inicio:inicio + self.tam_frame], self.ancho, self.alto,
+                      self.ancho * 3, QImage.Format.Format_RGB888).copy()
+
+class FilmstripCache:
+    """Tiras de miniaturas en disco, una por huella de video"""
+    def __init__(self):
+        self.carpeta = os.path.join(CARPETA_DB, "filmstrips")
+        os.makedirs(self.carpeta, exist_ok=True)
+
+    def rutas(self, huella):
+        base = os.path.join(self.carpeta, f"{huella}_{FILMSTRIP_ANCHO}x{FILMSTRIP_ALTO}")
+        return base + ".rgb", base + ".json"
+
+    def obtener(self, huella):
+        """Tira completa ya generada, o None"""
+        ruta, meta = self.rutas(huella)
+        if not (os.path.exists(ruta) and os.path.exists(meta)):
+            return None
+        try:
+            with open(meta, 'r') as f:
+                datos = json.load(f)
+            listos = bytearray([1]) * datos["total"]
+            for i in datos.get("faltan", []):
+                listos[i] = 0
+            tira = Filmstrip(ruta, datos["intervalo_ms"], datos["total"], listos)
+            if os.path.getsize(ruta) != tira.total * tira.tam_frame:
+                return None
+            return tira.abrir()
+        except:
+            return None
+
+    def nueva(self, huella, duracion_ms):
+        """Tira vacía, mapeada para escritura; sustituye a cualquier tira a medias"""
+        ruta, meta = self.rutas(huella)
+        if os.path.exists(meta):
+            os.remove(meta)
+        intervalo = intervalo_filmstrip(duracion_ms)
+        total = max(1, math.ceil(duracion_ms / intervalo))
+        return Filmstrip(ruta, intervalo, total).abrir(escritura=True)
+
+    def completar(self, huella, tira):
+        """Guarda los metadatos: a partir de aquí la tira se reutiliza"""
+        tira.mapa.flush()
+        _, meta = self.rutas(huella)
+        temp = meta + ".tmp"
+        with open(temp, 'w') as f:
+            json.dump({"intervalo_ms": tira.intervalo_ms, "total": tira.total,
+                       "faltan": [i for i in range(tira.total) if not tira.listos[i]]}, f)
+        os.replace(temp, meta)
+
+# Instancia global de la caché de miniaturas
+FILMSTRIP_CACHE = FilmstripCache()
+
+class FilmstripWorker(QThread):
+    """
+    Extrae la tira de miniaturas en segundo plano. El video se reparte en
+    tramos que se decodifican a la vez (solo keyframes, ya escalados), así
+    la tira se va rellenando por todo el partido desde el primer segundo.
+    """
+    progreso = pyqtSignal(int)
+    finished = pyqtSignal(str, object)
+    error = pyqtSignal(str, str)
+
+    def __init__(self, video_path, huella, tira):
+        super().__init__()
+        self.video_path = video_path
+        self.huella = huella
+        self.tira = tira
+        self.procesos = []
+        self.cancelado = False
+
+    def cancelar(self):
+        self.cancelado = True
+        for proceso in list(self.procesos):
+            if proceso.poll() is None:
+                try:
+                    proceso.kill()
+                except:
+                    pass
+
+    def extraer_tramo(self, desde, hasta, hilos):
+        """Decodifica los frames [desde, hasta) de la tira y los escribe en su sitio"""
+        tira = self.tira
+        cmd = [
+            get_ffmpeg_path(), "-hide_banner", "-loglevel", "error",
+            "-skip_frame", "nokey", "-ss", str(desde * tira.intervalo_ms / 1000),
+            "-i", self.video_path, "-map", "0:v:0", "-an", "-sn",
+            # La búsqueda en la entrada deja el tramo empezando en 0: start_time=0
+            # ancla las ranuras ahí aunque el primer keyframe llegue más tarde
+            "-vf", f"fps=1000/{tira.intervalo_ms}:start_time=0,"
+                   f"scale={tira.ancho}:{tira.alto}:force_original_aspect_ratio=decrease,"
+                   f"pad={tira.ancho}:{tira.alto}:(ow-iw)/2:(oh-ih)/2",
+            "-frames:v", str(hasta - desde), "-threads", str(hilos),
+            "-f", "rawvideo", "-pix_fmt", "rgb24", "pipe:1"
+        ]
+        kwargs = {"stdout": subprocess.PIPE, "stderr": subprocess.DEVNULL}
+        if SYS_CONFIG["system"] == "Windows":
+            kwargs["creationflags"] = subprocess.CREATE_NO_WINDOW
+        proceso = subprocess.Popen(cmd, **kwargs)
+        self.procesos.append(proceso)
+        if self.cancelado:
+            self.cancelar()
+        i = desde
+        while i < hasta:
+            datos = proceso.stdout.read(tira.tam_frame)
+            if len(datos) < tira.tam_frame:
+                break
+            tira.escribir(i, datos)
+            i += 1
+            if i % 4 == 0:
+                self.progreso.emit(sum(tira.listos))
+        proceso.stdout.close()
+        proceso.wait()
+
+    def run(self):
+        try:
+            nucleos = os.cpu_count() or 2
+            tramos = max(1, min(self.tira.total, nucleos // 2))
+            hilos = max(1, nucleos // tramos)
+            paso = math.ceil(self.tira.total / tramos)
+            with concurrent.futures.ThreadPoolExecutor(max_workers=tramos) as pool:
+                futuros = [pool.submit(self.extraer_tramo, a, min(a + paso, self.tira.total), hilos)
+                           for a in range(0, self.tira.total, paso)]
+                for futuro in futuros:
+                    futuro.result()
+            
+            if self.cancelado:
+                self.tira.cerrar()
+                return
+            if not any(self.tira.listos):
+                raise RuntimeError("FFmpeg no devolvió ningún frame")
+            FILMSTRIP_CACHE.completar(self.huella, self.tira)
+            self.progreso.emit(sum(self.tira.listos))
+            self.finished.emit(self.video_path, self.tira)
+        except Exception as e:
+            self.tira.cerrar()
+            if not self.cancelado:
+                self.error.emit(self.video_path, str(e))
+
+# ========== ENVOLVENTE DE AUDIO ==========
+AUDIO_TASA = 8000
+ENVOLVENTE_PASO_MS = 100
+ENVOLVENTE_PISO_DB = -60.0
+
+def rms_db(muestras, ventana):
+    """Nivel RMS en dBFS de cada ventana completa (o final parcial) de muestras int16"""
+    x = muestras.astype(np.float32) / 32768.0
+    n = len(x) // ventana
+    niveles = np.sqrt(np.mean(x[:n * ventana].reshape(n, ventana) ** 2, axis=1))
+    if len(x) > n * ventana:
+        niveles = np.append(niveles, np.sqrt(np.mean(x[n * ventana:] ** 2)))
+    return (20.0 * np.log10(np.maximum(niveles, 1e-6))).astype(np.float32)
+
+def detectar_picos(envolvente, umbral_db=8.0, separacion_ms=20000, suavizado_ms=1000,
+                   paso_ms=ENVOLVENTE_PASO_MS):
+    """
+    Momentos de ruido del público: máximos locales de la envolvente suavizada
+    que superan la mediana del partido en umbral_db. Se eligen de mayor a menor
+    y se descartan los que caen a menos de separacion_ms de uno ya elegido.
+    Devuelve [(ms, dB sobre la mediana)] ordenada por tiempo.
+    """
+    if envolvente is None or len(envolvente) < 3:
+        return []
+    k = max(1, int(suavizado_ms // paso_ms))
+    suave = np.convolve(envolvente, np.ones(k, dtype=np.float32) / k, mode="same")
+    relativo = suave - np.median(envolvente)
+    
+    maximos = np.flatnonzero((relativo[1:-1] >= relativo[:-2]) & (relativo[1:-1] > relativo[2:])
+                             & (relativo[1:-1] >= umbral_db)) + 1
+    separacion = max(1, int(separacion_ms // paso_ms))
+    elegidos = []
+    for i in maximos[np.argsort(relativo[maximos])[::-1]]:
+        j = bisect.bisect_left(elegidos, i)
+        if j > 0 and i - elegidos[j - 1] < separacion:
+            continue
+        if j < len(elegidos) and elegidos[j] - i < separacion:
+            continue
+        elegidos.insert(j, int(i))
+    return [(i * paso_ms, float(relativo[i])) for i in elegidos]
+
+class AudioEnvelopeCache:
+    """Envolventes de volumen en disco (.npy), una por huella de video"""
+    def __init__(self):
+        self.carpeta = os.path.join(CARPETA_DB, "audio_envelopes")
+        os.makedirs(self.carpeta, exist_ok=True)
+
+    def ruta(self, huella):
+        return os.path.join(self.carpeta, f"{huella}_{ENVOLVENTE_PASO_MS}ms.npy")
+
+    def obtener(self, huella):
+        ruta = self.ruta(huella)
+        if HAS_NUMPY and os.path.exists(ruta):
+            try:
+                return np.load(ruta)
+            except:
+                pass
+        return None
+
+    def guardar(self, huella, envolvente):
+        ruta = self.ruta(huella)
+        temp = ruta + ".tmp.npy"
+        np.save(temp, envolvente)
+        os.replace(temp, ruta)
+
+# Instancia global de la caché de envolventes
+AUDIO_ENVELOPES = AudioEnvelopeCache()
+
+class AudioEnvelopeWorker(QThread):
+    """Decodifica el audio una vez a PCM mono de baja tasa y calcula su envolvente RMS"""
+    progreso = pyqtSignal(int)
+    finished = pyqtSignal(str, object)
+    error = pyqtSignal(str, str)
+
+    def __init__(self, video_path, huella, duracion_ms=0):
+        super().__init__()
+        self.video_path = video_path
+        self.huella = huella
+        self.duracion_ms = duracion_ms
+        self.proceso = None
+        self.cancelado = False
+
+    def cancelar(self):
+        self.cancelado = True
+        if self.proceso and self.proceso.poll() is None:
+            try:
+                self.proceso.kill()
+            except:
+                pass
+
+    def run(self):
+        ventana = AUDIO_TASA * ENVOLVENTE_PASO_MS // 1000
+        cmd = [
+            get_ffmpeg_path(), "-hide_banner", "-loglevel", "error",
+            "-i", self.video_path, "-map", "0:a:0", "-vn", "-sn",
+            "-ac", "1", "-ar", str(AUDIO_TASA), "-f", "s16le", "pipe:1"
+        ]
+        err = tempfile.TemporaryFile()
+        kwargs = {"stdout": subprocess.PIPE, "stderr": err}
+        if SYS_CONFIG["system"] == "Windows":
+            kwargs["creationflags"] = subprocess.CREATE_NO_WINDOW
+        try:
+            self.proceso = subprocess.Popen(cmd, **kwargs)
+            if self.cancelado:
+                self.cancelar()
+            # Bloques de un minuto: la memoria no crece con la duración del video
+            partes = []
+            bloque = ventana * 600 * 2
+            while True:
+                datos = self.proceso.stdout.read(bloque)
+                if len(datos) < 2:
+                    break
+                partes.append(rms_db(np.frombuffer(datos[:len(datos) // 2 * 2], dtype=np.int16), ventana))
+                if self.duracion_ms:
+                    self.progreso.emit(min(99, len(partes) * 60000 * 100 // self.duracion_ms))
+            self.proceso.stdout.close()
+            codigo = self.proceso.wait()
+            if self.cancelado:
+                return
+            if codigo != 0 or not partes:
+                err.seek(0)
+                detalle = err.read().decode("utf-8", "replace").strip()[-300:]
+                raise RuntimeError(detalle or f"FFmpeg terminó con código {codigo}")
+            
+            envolvente = np.concatenate(partes)
+            AUDIO_ENVELOPES.guardar(self.huella, envolvente)
+            self.progreso.emit(100)
+            self.finished.emit(self.video_path, envolvente)
+        except Exception as e:
+            if not self.cancelado:
+                self.error.emit(self.video_path, str(e))
+        finally:
+            err.close()
+
+class PicosAudioDialog(QDialog):
+    """Parámetros del detector de picos y categoría donde se aceptan los candidatos"""
+    def __init__(self, categorias, valores=None, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Detectar picos de audio")
+        valores = valores or {}
+        layout = QVBoxLayout(self)
+        
+        layout.addWidget(QLabel("Categoría para los picos aceptados:"))
+        self.categoria_combo = QComboBox()
+        self.categoria_combo.addItems(categorias)
+        if valores.get("categoria") in categorias:
+            self.categoria_combo.setCurrentText(valores["categoria"])
+        layout.addWidget(self.categoria_combo)
+        
+        self.spins = {}
+        for clave, texto, rango, defecto, sufijo in [
+            ("umbral_db", "Umbral sobre el volumen medio:", (1, 40), 8, " dB"),
+            ("separacion_ms", "Separación mínima entre picos:", (1, 300), 20, " seg"),
+            ("pre_ms", "Clip: segundos antes del pico:", (0, 60), 12, " seg"),
+            ("post_ms", "Clip: segundos después del pico:", (0, 60), 4, " seg"),
+        ]:
+            fila = QHBoxLayout()
+            fila.addWidget(QLabel(texto))
+            spin = QSpinBox()
+            spin.setRange(*rango)
+            escala = 1 if clave == "umbral_db" else 1000
+            spin.setValue(int(valores.get(clave, defecto * escala) / escala))
+            spin.setSuffix(sufijo)
+            fila.addWidget(spin)
+            layout.addLayout(fila)
+            self.spins[clave] = (spin, escala)
+        
+        btns = QHBoxLayout()
+        btn_ok = QPushButton("🔊 Detectar")
+        btn_ok.clicked.connect(self.accept)
+        btn_cancel = QPushButton("Cancelar")
+        btn_cancel.clicked.connect(self.reject)
+        btns.addWidget(btn_ok)
+        btns.addWidget(btn_cancel)
+        layout.addLayout(btns)
+
+    def valores(self):
+        valores = {clave: spin.value() * escala for clave, (spin, escala) in self.spins.items()}
+        valores["categoria"] = self.categoria_combo.currentText()
+        return valores
+
+# ========== CACHÉ DE RENDERS ==========
+def leer_config():
+    """Lee config.json completo (vacío si no existe o está dañado)"""
+    if os.path.exists(ARCHIVO_CONFIG):
+        try:
+            with open(ARCHIVO_CONFIG, 'r') as f:
+                return json.load(f)
+        except:
+            pass
+    return {}
+
+def guardar_config(cambios):
+    """Mezcla cambios en config.json sin pisar el resto de claves"""
+    config = leer_config()
+    config.update(cambios)
+    with open(ARCHIVO_CONFIG, 'w') as f:
+        json.dump(config, f, indent=2)
+
+def enlazar_o_copiar(origen, destino):
+    """Crea destino como enlace duro de origen o, si no se puede, como copia"""
+    import shutil
+    temp = destino + ".part"
+    if os.path.exists(temp):
+        os.remove(temp)
+    try:
+        os.link(origen, temp)
+    except OSError:
+        shutil.copyfile(origen, temp)
+    os.replace(temp, destino)
+
+def _firma_archivo(ruta, bloque=64 * 1024):
+    import hashlib
+    with open(ruta, 'rb') as f:
+        return hashlib.sha1(f.read(bloque)).hexdigest()
+
+class RenderCache:
+    """
+    Segmentos ya renderizados, direccionados por contenido: la clave combina
+    la huella del video, el rango y los ajustes de codificación y texto.
+    """
+    LIMITE_GB_DEFECTO = 10
+
+    def __init__(self, carpeta=None):
+        self.carpeta = carpeta or os.path.join(CARPETA_DB, "render_cache")
+        os.makedirs(self.carpeta, exist_ok=True)
+        self.archivo_indice = os.path.join(self.carpeta, "index.json")
+        self.cerrojo = threading.Lock()
+        self.entradas = {}
+        # Los accesos solo se anotan en memoria; el índice se escribe al
+        # guardar un segmento, al cambiar el límite o al cerrar (persistir)
+        self.accesos_sin_guardar = False
+        # Segmentos en uso (clave -> nº de exportaciones que los usan): no se
+        # expulsan hasta que se sueltan, aunque otro render llene la caché
+        self.fijadas = collections.Counter()
+        # Bytes por encima del límite que no se pudieron expulsar (segmentos en uso)
+        self.exceso_bytes = 0
+        try:
+            with open(self.archivo_indice, 'r') as f:
+                self.entradas = json.load(f)
+        except:
+            pass
+        self.limite_bytes = int(leer_config().get("render_cache_gb", self.LIMITE_GB_DEFECTO) * 1024 ** 3)
+
+    def activa(self):
+        return self.limite_bytes > 0
+
+    @staticmethod
+    def clave(huella, ini_ms, fin_ms, ajustes):
+        """Clave estable de un segmento"""
+        import hashlib
+        datos = json.dumps([huella, int(ini_ms), int(fin_ms), ajustes], sort_keys=True)
+        return hashlib.sha1(datos.encode("utf-8")).hexdigest()
+
+    def _guardar_indice(self):
+        temp = self.archivo_indice + ".tmp"
+        with open(temp, 'w') as f:
+            json.dump(self.entradas, f)
+        os.replace(temp, self.archivo_indice)
+        self.accesos_sin_guardar = False
+
+    def persistir(self):
+        """Escribe el índice si hay accesos sin guardar"""
+        with self.cerrojo:
+            if self.accesos_sin_guardar:
+                self._guardar_indice()
+
+    def _descartar(self, clave):
+        entrada = self.entradas.pop(clave, None)
+        if entrada:
+            try:
+                os.remove(os.path.join(self.carpeta, entrada["archivo"]))
+            except OSError:
+                pass
+
+    def obtener(self, clave, fijar=False):
+        """
+        Ruta del segmento si está en caché y pasa la verificación de integridad.
+        Con fijar, el segmento no se expulsa hasta soltar(clave).
+        """
+        if not self.activa():
+            return None
+        with self.cerrojo:
+            entrada = self.entradas.get(clave)
+            if not entrada:
+                return None
+            ruta = os.path.join(self.carpeta, entrada["archivo"])
+            try:
+                valido = (os.path.getsize(ruta) == entrada["tamano"]
+                          and _firma_archivo(ruta) == entrada["firma"])
+            except OSError:
+                valido = False
+            if not valido:
+                self._descartar(clave)
+                self._guardar_indice()
+                return None
+            entrada["acceso"] = time.time()
+            self.accesos_sin_guardar = True
+            if fijar:
+                self.fijadas[clave] += 1
+            return ruta
+
+    def guardar(self, clave, ruta_origen, mover=True, fijar=False):
+        """
+        Incorpora un segmento recién renderizado y devuelve su ruta en la caché.
+        Con fijar, el segmento no se expulsa hasta soltar(clave).
+        """
+        if not self.activa() or not os.path.exists(ruta_origen):
+            return ruta_origen
+        archivo = clave + os.path.splitext(ruta_origen)[1]
+        ruta = os.path.join(self.carpeta, archivo)
+        if mover:
+            os.replace(ruta_origen, ruta)
+        else:
+            enlazar_o_copiar(ruta_origen, ruta)
+        with self.cerrojo:
+            self.entradas[clave] = {
+                "archivo": archivo, "tamano": os.path.getsize(ruta),
+                "firma": _firma_archivo(ruta), "acceso": time.time()
+            }
+            if fijar:
+                self.fijadas[clave] += 1
+            self._recortar()
+            self._guardar_indice()
+        return ruta
+
+    def soltar(self, claves):
+        """Libera segmentos fijados con obtener/guardar (uno por cada vez que se fijaron)"""
+        with self.cerrojo:
+            for clave in claves:
+                self.fijadas[clave] -= 1
+                if self.fijadas[clave] <= 0:
+                    del self.fijadas[clave]
+
+    def _recortar(self):
+        """Expulsa los segmentos menos usados hasta respetar el límite de disco"""
+        total = sum(e["tamano"] for e in self.entradas.values())
+        for clave in sorted(self.entradas, key=lambda c: self.entradas[c]["acceso"]):
+            if total <= self.limite_bytes:
+                break
+            # Los fijados los está usando una exportación en curso
+            if clave in self.fijadas:
+                continue
+            total -= self.entradas[clave]["tamano"]
+            self._descartar(clave)
+        self.exceso_bytes = max(0, total - self.limite_bytes)
+
+    def tamano_total(self):
+        return sum(e["tamano"] for e in self.entradas.values())
+
+    def establecer_limite(self, gb):
+        with self.cerrojo:
+            self.limite_bytes = int(gb * 1024 ** 3)
+            self._recortar()
+            self._guardar_indice()
+
+    def vaciar(self):
+        """Borra todos los segmentos salvo los que usa una exportación en curso"""
+        with self.cerrojo:
+            for clave in list(self.entradas):
+                if clave not in self.fijadas:
+                    self._descartar(clave)
+            self._guardar_indice()
+
+RENDER_CACHE = RenderCache()
+
+# ========== COLA DE RENDERIZADO ==========
+def construir_cmd_corte(ffmpeg_path, video_path, ini_ms, fin_ms, salida):
+    """Comando FFmpeg para cortar un clip con copia directa de streams"""
+    return [
+        ffmpeg_path, "-ss", str(ini_ms / 1000.0),
+        "-i", video_path,
+        "-t", str((fin_ms - ini_ms) / 1000.0),
+        "-c:v", "copy",
+        "-c:a", "copy",
+        "-y", salida
+    ]
+
+def escapar_drawtext(texto):
+    """Escapa el texto para usarlo dentro de drawtext=text='...'"""
+    return (texto.replace("\\", "\\\\\\\\").replace("'", "\u2019")
+            .replace(":", "\\:").replace("%", "\\\\%"))
+
+def con_hilos(cmd, hilos):
+    """Añade un límite de hilos al codificador, justo antes de la salida"""
+    return cmd[:-2] + ["-threads", str(hilos)] + cmd[-2:]
+
+# Registro de rendimiento de cada FFmpeg (una línea JSON por ejecución)
+ARCHIVO_TELEMETRIA = os.path.join(CARPETA_DB, "ffmpeg_telemetria.jsonl")
+_CERROJO_TELEMETRIA = threading.Lock()
+
+def formatear_duracion(segundos):
+    """Segundos como m:ss o h:mm:ss"""
+    segundos = int(max(0, segundos))
+    h, resto = divmod(segundos, 3600)
+    m, s = divmod(resto, 60)
+    return f"{h}:{m:02d}:{s:02d}" if h else f"{m}:{s:02d}"
+
+class FFmpegTelemetry:
+    """Estado de un FFmpeg en curso leído de su salida -progress"""
+    def __init__(self, duracion_ms=0, etiqueta=""):
+        self.duracion_ms = duracion_ms
+        self.etiqueta = etiqueta
+        self.inicio = time.time()
+        self.out_time_ms = 0
+        self.frames = 0
+        self.fps = 0.0
+        self.velocidad = 0.0
+        self.bytes = 0
+        self.terminado = False
+
+    def actualizar(self, clave, valor):
+        """Procesa un par clave=valor; devuelve True al cerrar cada bloque de progreso"""
+        try:
+            if clave in ("out_time_us", "out_time_ms"):
+                # out_time_ms también viene en microsegundos
+                self.out_time_ms = max(0, int(valor) / 1000.0)
+            elif clave == "frame":
+                self.frames = int(valor)
+            elif clave == "fps":
+                self.fps = float(valor)
+            elif clave == "speed":
+                self.velocidad = float(valor.rstrip("x"))
+            elif clave == "total_size":
+                self.bytes = int(valor)
+            elif clave == "progress":
+                self.terminado = valor == "end"
+                return True
+        except ValueError:
+            pass
+        return False
+
+    @property
+    def fraccion(self):
+        if self.duracion_ms <= 0:
+            return 0.0
+        return min(max(self.out_time_ms / self.duracion_ms, 0.0), 1.0)
+
+    def transcurrido(self):
+        return time.time() - self.inicio
+
+    def eta(self):
+        """Segundos restantes estimados (None si aún no se puede estimar)"""
+        if self.duracion_ms <= 0:
+            return None
+        restante = max(0.0, self.duracion_ms - self.out_time_ms) / 1000.0
+        if self.velocidad > 0:
+            return restante / self.velocidad
+        if self.fraccion > 0:
+            return self.transcurrido() * (1 - self.fraccion) / self.fraccion
+        return None
+
+    def texto(self):
+        partes = []
+        if self.velocidad:
+            partes.append(f"{self.velocidad:.2f}x")
+        if self.fps:
+            partes.append(f"{self.fps:.0f} fps")
+        if self.bytes:
+            partes.append(f"{self.bytes / 1024 ** 2:.1f} MB")
+        eta = self.eta()
+        if eta is not None and not self.terminado:
+            partes.append(f"ETA {formatear_duracion(eta)}")
+        return " · ".join(partes)
+
+def _valor_opcion(cmd, *opciones):
+    for i, arg in enumerate(cmd[:-1]):
+        if arg in opciones:
+            return cmd[i + 1]
+    return ""
+
+def registrar_telemetria(telemetria, cmd, codigo):
+    """Añade una ejecución al registro de rendimiento"""
+    segundos = telemetria.transcurrido()
+    entrada = {
+        "fecha": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "etiqueta": telemetria.etiqueta,
+        "codec": _valor_opcion(cmd, "-c:v", "-c") or "?",
+        "preset": _valor_opcion(cmd, "-preset"),
+        "hilos": _valor_opcion(cmd, "-threads"),
+        "media_s": round(telemetria.out_time_ms / 1000.0, 2),
+        "segundos": round(segundos, 2),
+        "velocidad": round(telemetria.out_time_ms / 1000.0 / segundos, 2) if segundos > 0 else 0,
+        "fps": telemetria.fps,
+        "bytes": telemetria.bytes,
+        "codigo": codigo
+    }
+    try:
+        with _CERROJO_TELEMETRIA, open(ARCHIVO_TELEMETRIA, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entrada, ensure_ascii=False) + "\n")
+    except OSError:
+        pass
+
+def leer_telemetria(limite=500):
+    """Últimas entradas del registro de rendimiento"""
+    if not os.path.exists(ARCHIVO_TELEMETRIA):
+        return []
+    entradas = []
+    with open(ARCHIVO_TELEMETRIA, 'r', encoding='utf-8') as f:
+        for linea in f.readlines()[-limite:]:
+            try:
+                entradas.append(json.loads(linea))
+            except ValueError:
+                pass
+    return entradas
+
+def ejecutar_ffmpeg_progreso(cmd, duracion_ms=0, al_progresar=None, al_iniciar=None, etiqueta=""):
+    """
+    Ejecuta un comando FFmpeg leyendo su progreso con -progress.
+    al_progresar recibe la FFmpegTelemetry en cada bloque y al_iniciar el proceso.
+    Devuelve (código de salida, últimas líneas de error).
+    """
+    telemetria = FFmpegTelemetry(duracion_ms, etiqueta)
+    # -progress escribe pares clave=valor por stdout; stderr va a un
+    # archivo temporal para que nunca bloquee el proceso
+    cmd = [cmd[0], "-progress", "pipe:1", "-nostats", "-loglevel", "error"] + cmd[1:]
+    with tempfile.TemporaryFile() as err:
+        kwargs = {"stdout": subprocess.PIPE, "stderr": err, "text": True}
+        if SYS_CONFIG["system"] == "Windows":
+            kwargs["creationflags"] = subprocess.CREATE_NO_WINDOW
+        proceso = subprocess.Popen(cmd, **kwargs)
+        if al_iniciar:
+            al_iniciar(proceso)
+        
+        for linea in proceso.stdout:
+            clave, _, valor = linea.strip().partition("=")
+            if telemetria.actualizar(clave, valor) and al_progresar:
+                al_progresar(telemetria)
+        
+        codigo = proceso.wait()
+        registrar_telemetria(telemetria, cmd, codigo)
+        detalle = ""
+        if codigo != 0:
+            err.seek(0)
+            detalle = err.read().decode("utf-8", "replace").strip()[-500:] or f"FFmpeg terminó con código {codigo}"
+        return codigo, detalle
+
+def titulo_clip(clip):
+    """Texto 'tiempo - nombre' con el que se rotula un clip"""
+    return f"{clip['tiempo']} - {clip.get('nombre', 'Clip')}"
+
+def fusionar_intervalos(clips, tolerancia_ms=0, pre_ms=0, post_ms=0, duracion_ms=None):
+    """
+    Unión de los rangos de los clips (con márgenes), juntando los que se solapan
+    o quedan a menos de tolerancia_ms. Cada tramo conserva sus clips en 'clips'.
+    """
+    tramos = []
+    for clip in sorted(clips, key=lambda c: c['ini']):
+        ini = max(0, clip['ini'] - pre_ms)
+        fin = clip['fin'] + post_ms
+        if duracion_ms:
+            fin = min(fin, duracion_ms)
+        if tramos and ini <= tramos[-1]['fin'] + tolerancia_ms:
+            tramos[-1]['fin'] = max(tramos[-1]['fin'], fin)
+            tramos[-1]['clips'].append(clip)
+        else:
+            tramos.append({'ini': ini, 'fin': fin, 'clips': [clip]})
+    
+    for tramo in tramos:
+        tramo['tiempo'] = tramo['clips'][0]['tiempo']
+        tramo['nombre'] = " / ".join(dict.fromkeys(c.get('nombre', 'Clip') for c in tramo['clips']))
+    return tramos
+
+def calcular_capitulos(tramos, inicios=None):
+    """
+    Capítulos [(ini_ms, fin_ms, título)] en la línea de tiempo de la exportación.
+    inicios: inicio real de cada tramo si no coincide con 'ini' (keyframe previo).
+    """
+    capitulos, offset = [], 0
+    for k, tramo in enumerate(tramos):
+        inicio = inicios[k] if inicios else tramo['ini']
+        for clip in tramo.get('clips', [tramo]):
+            capitulos.append((offset + clip['ini'] - inicio, offset + clip['fin'] - inicio, titulo_clip(clip)))
+        offset += tramo['fin'] - inicio
+    capitulos.sort()
+    return capitulos
+
+def escribir_ffmetadata(ruta, capitulos):
+    """Escribe un archivo FFMETADATA1 con un capítulo por entrada"""
+    def escapar(texto):
+        for c in "\\=;#\n":
+            texto = texto.replace(c, "\\" + c)
+        return texto
+    
+    with open(ruta, 'w', encoding='utf-8') as f:
+        f.write(";FFMETADATA1\n")
+        for ini, fin, titulo in capitulos:
+            f.write(f"[CHAPTER]\nTIMEBASE=1/1000\nSTART={int(ini)}\nEND={int(fin)}\ntitle={escapar(titulo)}\n")
+
+def _tiempo_srt(ms):
+    ms = max(0, int(ms))
+    return f"{ms // 3600000:02d}:{ms // 60000 % 60:02d}:{ms // 1000 % 60:02d},{ms % 1000:03d}"
+
+def escribir_srt(ruta, capitulos):
+    """Escribe los rótulos de los clips como subtítulos SRT"""
+    with open(ruta, 'w', encoding='utf-8') as f:
+        for n, (ini, fin, titulo) in enumerate(capitulos, 1):
+            f.write(f"{n}\n{_tiempo_srt(ini)} --> {_tiempo_srt(fin)}\n{titulo}\n\n")
+
+def codec_subtitulos(salida):
+    """Codec de subtítulos que admite el contenedor de salida (None si no admite)"""
+    ext = os.path.splitext(salida)[1].lower()
+    return {".mp4": "mov_text", ".mov": "mov_text", ".mkv": "srt"}.get(ext)
+
+def admite_capitulos(salida):
+    """Si el contenedor de salida guarda capítulos (AVI no)"""
+    return os.path.splitext(salida)[1].lower() in (".mp4", ".mov", ".mkv")
+
+def escribir_etiquetas(base, capitulos, salida, subtitulos=True):
+    """
+    Escribe, si el contenedor los admite, los capítulos (FFMETADATA) y los
+    subtítulos con los rótulos. Devuelve (metadatos, subtitulos) o None en cada uno.
+    """
+    metadatos = None
+    if admite_capitulos(salida):
+        metadatos = base + "_meta.txt"
+        escribir_ffmetadata(metadatos, capitulos)
+    srt = None
+    if subtitulos and codec_subtitulos(salida):
+        srt = base + ".srt"
+        escribir_srt(srt, capitulos)
+    return metadatos, srt
+
+def construir_cmd_concat(ffmpeg_path, lista, salida, metadatos=None, subtitulos=None):
+    """Une con copia directa los tramos de una lista del demuxer concat"""
+    cmd = [ffmpeg_path, "-f", "concat", "-safe", "0", "-i", lista]
+    if metadatos:
+        cmd += ["-i", metadatos]
+    if subtitulos:
+        cmd += ["-i", subtitulos]
+    if metadatos:
+        cmd += ["-map_chapters", "1"]
+    if subtitulos:
+        cmd += ["-map", "0:v?", "-map", "0:a?", "-map", f"{2 if metadatos else 1}:s"]
+    cmd += ["-c", "copy"]
+    if subtitulos:
+        cmd += ["-c:s", codec_subtitulos(salida)]
+    return cmd + ["-y", salida]
+
+def filtro_timestamp(texto):
+    """Filtro drawtext con la marca de tiempo de un clip"""
+    return (f"drawtext=text='{escapar_drawtext(texto)}':fontcolor=white:fontsize=24"
+            ":box=1:boxcolor=black@0.5:boxborderw=5:x=10:y=10")
+
+# Parámetros de calidad de cada codificador en las exportaciones re-codificadas
+ARGS_CODEC = {
+    "libx264": ["-preset", "medium", "-crf", "23"],
+    "libx265": ["-preset", "medium", "-crf", "26"],
+    "libvpx-vp9": ["-crf", "32", "-b:v", "0", "-row-mt", "1"],
+}
+
+def lecturas_lineales(clips):
+    """
+    Agrupa los clips (en el orden de la playlist) en lecturas lineales del
+    video: se abre una lectura nueva solo si un clip empieza antes de que
+    acabe el anterior. Una playlist en orden cronológico es una sola lectura.
+    """
+    lecturas = []
+    for i, clip in enumerate(clips):
+        if not lecturas or clip['ini'] < clips[i - 1]['fin']:
+            lecturas.append([])
+        lecturas[-1].append(i)
+    return lecturas
+
+def construir_cmd_exportacion_unica(ffmpeg_path, video_path, clips, salida, codec="libx264",
+                                    timestamp=False, tiene_audio=True, metadatos=None, subtitulos=None):
+    """
+    Un solo comando FFmpeg que recorta, rotula y une todos los clips con
+    el filtro concat y escribe directamente el archivo final. El video se
+    decodifica una vez por lectura lineal (ver lecturas_lineales) y cada
+    clip es una rama trim/atrim de esa lectura.
+    metadatos/subtitulos: archivos opcionales con capítulos y rótulos.
+    """
+    cmd = [ffmpeg_path]
+    filtros = []
+    ramas_video, ramas_audio = {}, {}
+    lecturas = lecturas_lineales(clips)
+    for k, indices in enumerate(lecturas):
+        # Búsqueda en la entrada hasta el primer clip: los tiempos de la
+        # lectura empiezan en 0 ahí, y se lee de corrido hasta el último
+        inicio = clips[indices[0]]['ini']
+        fin = max(clips[i]['fin'] for i in indices)
+        cmd += ["-ss", str(inicio / 1000.0), "-t", str((fin - inicio) / 1000.0), "-i", video_path]
+        filtros.append(f"[{k}:v:0]split={len(indices)}" + "".join(f"[s{i}]" for i in indices))
+        if tiene_audio:
+            filtros.append(f"[{k}:a:0]asplit={len(indices)}" + "".join(f"[t{i}]" for i in indices))
+        for i in indices:
+            a, b = (clips[i]['ini'] - inicio) / 1000.0, (clips[i]['fin'] - inicio) / 1000.0
+            video = f"[s{i}]trim=start={a}:end={b},setpts=PTS-STARTPTS"
+            if timestamp:
+                video += "," + filtro_timestamp(titulo_clip(clips[i]))
+            ramas_video[i] = video + f"[v{i}]"
+            if tiene_audio:
+                ramas_audio[i] = f"[t{i}]atrim=start={a}:end={b},asetpts=PTS-STARTPTS[a{i}]"
+    
+    entradas_concat = ""
+    for i in range(len(clips)):
+        filtros.append(ramas_video[i])
+        entradas_concat += f"[v{i}]"
+        if tiene_audio:
+            filtros.append(ramas_audio[i])
+            entradas_concat += f"[a{i}]"
+    
+    if metadatos:
+        cmd += ["-i", metadatos]
+    if subtitulos:
+        cmd += ["-i", subtitulos]
+    
+    n_audio = 1 if tiene_audio else 0
+    filtros.append(f"{entradas_concat}concat=n={len(clips)}:v=1:a={n_audio}[vout]" + ("[aout]" if tiene_audio else ""))
+    cmd += ["-filter_complex", ";".join(filtros), "-map", "[vout]"]
+    if tiene_audio:
+        cmd += ["-map", "[aout]", "-c:a", "aac", "-b:a", "128k"]
+    cmd += ["-c:v", codec] + ARGS_CODEC.get(codec, []) + ["-pix_fmt", "yuv420p"]
+    if metadatos:
+        cmd += ["-map_chapters", str(len(lecturas))]
+    if subtitulos:
+        cmd += ["-map", f"{len(lecturas) + (1 if metadatos else 0)}:s", "-c:s", codec_subtitulos(salida)]
+    if salida.lower().endswith((".mp4", ".mov")):
+        cmd += ["-movflags", "+faststart"]
+    return cmd + ["-y", salida]
+
+# Codificadores con los que se re-codifican los GOP de los bordes en smart-cut
+CODECS_SMART_CUT = {"h264": "libx264", "hevc": "libx265"}
+PERFILES_H264 = {66: "baseline", 77: "main", 100: "high", 110: "high10", 122: "high422", 244: "high444"}
+PERFILES_HEVC = {1: "main", 2: "main10", 3: "mainstillpicture"}
+
+def args_cabeceras_smart_cut(indice):
+    """
+    Opciones del codificador que reproducen el perfil, el nivel, las referencias
+    y la entropía de la fuente: el MP4 resultante guarda un solo avcC/hvcC y los
+    decodificadores por hardware fallan en la unión si los SPS/PPS no encajan.
+    """
+    cab = indice.cabeceras if indice else {}
+    if not cab:
+        return []
+    args = []
+    if indice.vcodec == "h264":
+        if cab.get("profile_idc") in PERFILES_H264:
+            args += ["-profile:v", PERFILES_H264[cab["profile_idc"]]]
+        if cab.get("level_idc"):
+            args += ["-level:v", f"{cab['level_idc'] / 10:.1f}"]
+        params = [f"ref={max(1, cab.get('max_num_ref_frames', 1))}",
+                  f"cabac={cab.get('entropy_coding_mode_flag', 0)}",
+                  f"8x8dct={cab.get('transform_8x8_mode_flag', 0)}"]
+        args += ["-x264-params", ":".join(params)]
+    elif indice.vcodec == "hevc":
+        if cab.get("general_profile_idc") in PERFILES_HEVC:
+            args += ["-profile:v", PERFILES_HEVC[cab["general_profile_idc"]]]
+        if cab.get("general_level_idc"):
+            args += ["-x265-params", f"level-idc={cab['general_level_idc'] / 30:.1f}"]
+    return args
+
+def construir_cmds_smart_cut(ffmpeg_path, video_path, indice, ini_ms, fin_ms, salida):
+    """
+    Comandos para un corte preciso al frame: solo se re-codifican los GOP
+    parciales del inicio y del final, el tramo entre keyframes se copia.
+    Devuelve (comandos, temporales).
+    """
+    encoder = CODECS_SMART_CUT.get(indice.vcodec) if indice else None
+    args_video = ["-c:v", encoder or "libx264", "-preset", "veryfast", "-crf", "18"]
+    if indice and indice.pix_fmt:
+        args_video += ["-pix_fmt", indice.pix_fmt]
+    if encoder:
+        args_video += args_cabeceras_smart_cut(indice)
+    
+    k1 = indice.keyframe_despues(ini_ms) if encoder else None
+    k2 = indice.keyframe_antes(fin_ms) if encoder else None
+    
+    # Sin un GOP completo dentro del clip no hay nada que copiar
+    if k1 is None or k2 is None or k2 <= k1:
+        return [[
+            ffmpeg_path, "-ss", str(ini_ms / 1000.0), "-i", video_path,
+            "-t", str((fin_ms - ini_ms) / 1000.0),
+            "-map", "0:v:0", "-map", "0:a:0?"
+        ] + args_video + ["-c:a", "aac", "-b:a", "128k", "-y", salida]], []
+    
+    base = os.path.join(CARPETA_CORTES, f"smartcut_{int(time.time() * 1000)}_{int(ini_ms)}")
+    tramos = []
+    if k1 - ini_ms > 1:
+        tramos.append((ini_ms, k1, True))
+    tramos.append((k1, k2, False))
+    if fin_ms - k2 > 1:
+        tramos.append((k2, fin_ms, True))
+    
+    comandos, temporales = [], []
+    lista = base + "_lista.txt"
+    with open(lista, "w") as f:
+        for i, (a, b, recodificar) in enumerate(tramos):
+            # MPEG-TS lleva SPS/PPS en banda, así los tramos re-codificados
+            # y los copiados se pueden concatenar sin re-codificar de nuevo
+            parte = f"{base}_{i}.ts"
+            temporales.append(parte)
+            f.write(f"file '{parte}'\n")
+            cmd = [ffmpeg_path, "-ss", str(a / 1000.0), "-i", video_path]
+            if recodificar:
+                cmd += ["-t", str((b - a) / 1000.0), "-map", "0:v:0", "-an"] + args_video
+            else:
+                # Copiando, -t corta por paquetes y se pasaría de k2 (frames
+                # repetidos al unir con el tramo final): se acota por frames
+                frames = indice.indice_frame(b) - indice.indice_frame(a)
+                cmd += ["-frames:v", str(frames), "-map", "0:v:0", "-an", "-c:v", "copy"]
+            comandos.append(cmd + ["-y", parte])
+    temporales.append(lista)
+    
+    # Unir el video y añadir el audio del rango exacto (re-codificarlo es barato)
+    comandos.append([
+        ffmpeg_path, "-f", "concat", "-safe", "0", "-i", lista,
+        "-ss", str(ini_ms / 1000.0), "-t", str((fin_ms - ini_ms) / 1000.0), "-i", video_path,
+        "-map", "0:v:0", "-map", "1:a:0?", "-c:v", "copy", "-c:a", "aac", "-b:a", "128k",
+        "-y", salida
+    ])
+    return comandos, temporales
+
+def construir_cmd_keyframes_densos(ffmpeg_path, video_path, indice, salida, gop_seg=1):
+    """Re-codifica la fuente con un keyframe cada gop_seg segundos (una sola vez)"""
+    fps = indice.fps if indice else 30
+    return [
+        ffmpeg_path, "-i", video_path, "-map", "0:v:0", "-map", "0:a?",
+        "-c:v", "libx264", "-preset", "veryfast", "-crf", "18",
+        "-g", str(max(1, int(round(fps * gop_seg)))), "-sc_threshold", "0",
+        "-c:a", "copy", "-movflags", "+faststart", "-y", salida
+    ]
+
+# Proxies de reproducción: baja resolución y solo frames intra (cada frame es un keyframe)
+PROXY_ALTO = 360
+CARPETA_PROXIES = os.path.join(CARPETA_DB, "proxies")
+
+def ruta_proxy(huella):
+    return os.path.join(CARPETA_PROXIES, f"{huella}_{PROXY_ALTO}p.mp4")
+
+def construir_cmd_proxy(ffmpeg_path, video_path, salida, tiene_audio=True):
+    """Proxy intra de baja resolución: cualquier posición se decodifica sin GOP previo"""
+    cmd = [
+        ffmpeg_path, "-i", video_path, "-map", "0:v:0",
+        "-vf", f"scale=-2:{PROXY_ALTO}",
+        "-c:v", "libx264", "-preset", "ultrafast", "-tune", "fastdecode", "-crf", "26",
+        "-g", "1", "-keyint_min", "1", "-pix_fmt", "yuv420p"
+    ]
+    if tiene_audio:
+        cmd += ["-map", "0:a:0", "-c:a", "aac", "-b:a", "96k", "-ac", "2"]
+    return cmd + ["-movflags", "+faststart", "-y", salida]
+
+# Clips por comando en el renderizado por lotes (cada salida re-codificada es un codificador más)
+CLIPS_POR_LOTE_COPIA = 16
+CLIPS_POR_LOTE_RECODIFICAR = 4
+
+def construir_cmd_lote(ffmpeg_path, video_path, tramos, indice=None, codec="copy", tiene_audio=True):
+    """
+    Un solo comando FFmpeg que lee el video una vez, de principio a fin del
+    lote, y escribe varios clips. tramos: [(ini_ms, fin_ms, salida)] por inicio.
+    """
+    if codec == "copy":
+        # Cada salida empieza en el keyframe anterior; el margen cubre el
+        # retraso de dts de los B-frames para no saltarse ese keyframe
+        margen = (indice.frame_ms() if indice else 40) * 3
+        tramos = [(max(0, alinear_a_keyframe(video_path, ini) - margen), fin, salida)
+                  for ini, fin, salida in tramos]
+    
+    inicio = max(0, min(t[0] for t in tramos) - 1000)
+    cmd = [ffmpeg_path, "-ss", str(inicio / 1000.0), "-i", video_path]
+    
+    if codec == "copy":
+        for ini, fin, salida in tramos:
+            cmd += ["-map", "0:v:0"] + (["-map", "0:a:0"] if tiene_audio else [])
+            cmd += ["-ss", str((ini - inicio) / 1000.0), "-to", str((fin - inicio) / 1000.0),
+                    "-c", "copy", "-y", salida]
+        return cmd
+    
+    # Una sola decodificación repartida entre un codificador por clip
+    n = len(tramos)
+    filtros = [f"[0:v:0]split={n}" + "".join(f"[s{i}]" for i in range(n))]
+    if tiene_audio:
+        filtros.append(f"[0:a:0]asplit={n}" + "".join(f"[t{i}]" for i in range(n)))
+    for i, (ini, fin, _) in enumerate(tramos):
+        a, b = (ini - inicio) / 1000.0, (fin - inicio) / 1000.0
+        filtros.append(f"[s{i}]trim=start={a}:end={b},setpts=PTS-STARTPTS[v{i}]")
+        if tiene_audio:
+            filtros.append(f"[t{i}]atrim=start={a}:end={b},asetpts=PTS-STARTPTS[a{i}]")
+    cmd += ["-filter_complex", ";".join(filtros)]
+    
+    hilos = max(1, (os.cpu_count() or 2) // n)
+    for i, (_, _, salida) in enumerate(tramos):
+        cmd += ["-map", f"[v{i}]"]
+        if tiene_audio:
+            cmd += ["-map", f"[a{i}]", "-c:a", "aac", "-b:a", "128k"]
+        cmd += ["-c:v", codec] + ARGS_CODEC.get(codec, []) + ["-threads", str(hilos), "-y", salida]
+    return cmd
+
+class RenderJob:
+    """Trabajo de la cola: uno o varios comandos FFmpeg que se ejecutan en orden"""
+    PENDIENTE = "pendiente"
+    EJECUTANDO = "ejecutando"
+    COMPLETADO = "completado"
+    ERROR = "error"
+    CANCELADO = "cancelado"
+
+    def __init__(self, job_id, nombre, comandos, salida, duracion_ms=0, temporales=None, salidas=None,
+                 en_serie=False):
+        self.id = job_id
+        self.nombre = nombre
+        self.comandos = comandos
+        self.salida = salida
+        self.salidas = salidas or [salida]
+        self.duracion_ms = duracion_ms
+        self.temporales = temporales or []
+        # Los trabajos en serie nunca corren a la vez entre sí (p. ej. los lotes,
+        # que son lecturas lineales del mismo video y no deben competir por el disco)
+        self.en_serie = en_serie
+        self.estado = RenderJob.PENDIENTE
+        self.progreso = 0
+        self.mensaje = ""
+        self.proceso = None
+        self.cancelado = False
+        self.telemetria = None
+
+    def terminado(self):
+        return self.estado in (RenderJob.COMPLETADO, RenderJob.ERROR, RenderJob.CANCELADO)
+
+class RenderJobWorker(QThread):
+    """Ejecuta los comandos de un RenderJob leyendo el progreso de FFmpeg"""
+    progress = pyqtSignal(int, int)
+    finished_job = pyqtSignal(int, bool, str)
+
+    def __init__(self, job):
+        super().__init__()
+        self.job = job
+
+    def al_progresar(self, paso, telemetria):
+        self.job.telemetria = telemetria
+        self.progress.emit(self.job.id, int((paso + telemetria.fraccion) / len(self.job.comandos) * 100))
+
+    def run(self):
+        job = self.job
+        total = len(job.comandos)
+        for paso, cmd in enumerate(job.comandos):
+            if job.cancelado:
+                break
+            try:
+                codigo, detalle = ejecutar_ffmpeg_progreso(
+                    cmd, job.duracion_ms,
+                    lambda t, paso=paso: self.al_progresar(paso, t),
+                    lambda proceso: setattr(job, "proceso", proceso),
+                    job.nombre
+                )
+            except Exception as e:
+                self.finished_job.emit(job.id, False, str(e))
+                return
+            if job.cancelado:
+                break
+            if codigo != 0:
+                self.finished_job.emit(job.id, False, detalle)
+                return
+            self.progress.emit(job.id, int((paso + 1) / total * 100))
+        
+        if job.cancelado:
+            self.finished_job.emit(job.id, False, "Cancelado")
+        else:
+            self.finished_job.emit(job.id, True, job.salida)
+
+class RenderQueue(QObject):
+    """Cola de renders en segundo plano con un número limitado de FFmpeg simultáneos"""
+    job_added = pyqtSignal(int)
+    job_status = pyqtSignal(int, str)
+    job_progress = pyqtSignal(int, int)
+    job_done = pyqtSignal(int, str)
+    job_failed = pyqtSignal(int, str)
+
+    def __init__(self, parent=None, max_concurrentes=None):
+        super().__init__(parent)
+        # Los cortes con copia directa están limitados por el disco:
+        # la mitad de los núcleos (máx. 4) evita que compitan entre sí
+        self.max_concurrentes = max_concurrentes or max(1, min(4, (os.cpu_count() or 2) // 2))
+        self.jobs = {}
+        self.pendientes = []
+        self.workers = {}
+        self._siguiente_id = 1
+
+    def agregar(self, nombre, comandos, salida, duracion_ms=0, temporales=None, salidas=None, en_serie=False):
+        """Encola un trabajo y devuelve su id"""
+        job = RenderJob(self._siguiente_id, nombre, comandos, salida, duracion_ms, temporales, salidas, en_serie)
+        self._siguiente_id += 1
+        self.jobs[job.id] = job
+        self.pendientes.append(job.id)
+        self.job_added.emit(job.id)
+        self._lanzar_siguientes()
+        return job.id
+
+    def activos(self):
+        return len(self.workers)
+
+    def en_espera(self):
+        return len(self.pendientes)
+
+    def _lanzar_siguientes(self):
+        while len(self.workers) < self.max_concurrentes:
+            serie_ocupada = any(w.job.en_serie for w in self.workers.values())
+            job_id = next((j for j in self.pendientes
+                           if not (serie_ocupada and self.jobs[j].en_serie)), None)
+            if job_id is None:
+                break
+            self.pendientes.remove(job_id)
+            job = self.jobs[job_id]
+            job.estado = RenderJob.EJECUTANDO
+            worker = RenderJobWorker(job)
+            worker.progress.connect(self._al_progresar)
+            worker.finished_job.connect(self._al_terminar)
+            self.workers[job.id] = worker
+            self.job_status.emit(job.id, job.estado)
+            worker.start()
+
+    def _al_progresar(self, job_id, valor):
+        job = self.jobs.get(job_id)
+        if job:
+            job.progreso = valor
+            self.job_progress.emit(job_id, valor)
+
+    def _al_terminar(self, job_id, ok, mensaje):
+        job = self.jobs[job_id]
+        worker = self.workers.pop(job_id, None)
+        if worker:
+            worker.wait()
+            worker.deleteLater()
+        job.proceso = None
+        job.mensaje = mensaje
+        
+        for temp in job.temporales:
+            if os.path.exists(temp):
+                try:
+                    os.remove(temp)
+                except:
+                    pass
+        
+        if job.cancelado:
+            job.estado = RenderJob.CANCELADO
+            for salida in job.salidas:
+                if os.path.exists(salida):
+                    try:
+                        os.remove(salida)
+                    except:
+                        pass
+        elif ok:
+            job.estado = RenderJob.COMPLETADO
+            job.progreso = 100
+        else:
+            job.estado = RenderJob.ERROR
+        
+        self.job_status.emit(job_id, job.estado)
+        if job.estado == RenderJob.COMPLETADO:
+            self.job_done.emit(job_id, job.salida)
+        elif job.estado == RenderJob.ERROR:
+            self.job_failed.emit(job_id, mensaje)
+        
+        self._lanzar_siguientes()
+
+    def cancelar(self, job_id):
+        """Cancela un trabajo pendiente o mata su FFmpeg si ya está en curso"""
+        job = self.jobs.get(job_id)
+        if not job or job.terminado():
+            return
+        job.cancelado = True
+        if job_id in self.pendientes:
+            self.pendientes.remove(job_id)
+            job.estado = RenderJob.CANCELADO
+            self.job_status.emit(job_id, job.estado)
+        elif job.proceso and job.proceso.poll() is None:
+            job.proceso.kill()
+
+    def cancelar_todos(self):
+        for job_id in list(self.pendientes) + list(self.workers):
+            self.cancelar(job_id)
+
+    def limpiar_terminados(self):
+        for job_id in [j.id for j in self.jobs.values() if j.terminado()]:
+            del self.jobs[job_id]
+
+    def cerrar(self):
+        """Mata y recoge todos los procesos hijos (al salir de la aplicación)"""
+        self.cancelar_todos()
+        for worker in list(self.workers.values()):
+            if worker.job.proceso and worker.job.proceso.poll() is None:
+                worker.job.proceso.kill()
+            worker.wait()
+        self.workers.clear()
+
+class RenderQueueDialog(QDialog):
+    """Panel no modal con el estado de la cola de renderizado"""
+    def __init__(self, queue, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Cola de Renderizado")
+        self.resize(600, 400)
+        self.queue = queue
+        self.items = {}
+        
+        layout = QVBoxLayout(self)
+        self.lbl_resumen = QLabel()
+        layout.addWidget(self.lbl_resumen)
+        
+        self.list_w = QListWidget()
+        layout.addWidget(self.list_w)
+        
+        btns = QHBoxLayout()
+        btn_cancelar = QPushButton("⏹ Cancelar seleccionado")
+        btn_cancelar.clicked.connect(self.cancelar_seleccionado)
+        btn_cancelar_todos = QPushButton("⏹ Cancelar todos")
+        btn_cancelar_todos.clicked.connect(self.queue.cancelar_todos)
+        btn_limpiar = QPushButton("🧹 Limpiar terminados")
+        btn_limpiar.clicked.connect(self.limpiar_terminados)
+        btns.addWidget(btn_cancelar)
+        btns.addWidget(btn_cancelar_todos)
+        btns.addWidget(btn_limpiar)
+        layout.addLayout(btns)
+        
+        for job_id in self.queue.jobs:
+            self.agregar_item(job_id)
+        
+        self.queue.job_added.connect(self.agregar_item)
+        self.queue.job_status.connect(self.actualizar_item)
+        self.queue.job_progress.connect(self.actualizar_item)
+        self.actualizar_resumen()
+
+    def agregar_item(self, job_id):
+        it = QListWidgetItem()
+        it.setData(Qt.ItemDataRole.UserRole, job_id)
+        self.list_w.addItem(it)
+        self.items[job_id] = it
+        self.actualizar_item(job_id)
+
+    def actualizar_item(self, job_id, *args):
+        job = self.queue.jobs.get(job_id)
+        it = self.items.get(job_id)
+        if not job or not it:
+            return
+        iconos = {
+            RenderJob.PENDIENTE: "⏳", RenderJob.EJECUTANDO: "🎬",
+            RenderJob.COMPLETADO: "✅", RenderJob.ERROR: "❌", RenderJob.CANCELADO: "⏹"
+        }
+        texto = f"{iconos.get(job.estado, '')} {job.nombre} - {job.estado}"
+        if job.estado == RenderJob.EJECUTANDO:
+            texto += f" ({job.progreso}%)"
+            if job.telemetria and job.telemetria.texto():
+                texto += f"  {job.telemetria.texto()}"
+        elif job.estado == RenderJob.ERROR:
+            texto += f": {job.mensaje[:80]}"
+        it.setText(texto)
+        it.setToolTip(job.salida)
+        self.actualizar_resumen()
+
+    def actualizar_resumen(self):
+        self.lbl_resumen.setText(
+            f"En curso: {self.queue.activos()} / {self.queue.max_concurrentes}  |  "
+            f"En espera: {self.queue.en_espera()}"
+        )
+
+    def cancelar_seleccionado(self):
+        it = self.list_w.currentItem()
+        if it:
+            self.queue.cancelar(it.data(Qt.ItemDataRole.UserRole))
+
+    def limpiar_terminados(self):
+        self.queue.limpiar_terminados()
+        for job_id in list(self.items):
+            if job_id not in self.queue.jobs:
+                it = self.items.pop(job_id)
+                self.list_w.takeItem(self.list_w.row(it))
+
+class TelemetriaDialog(QDialog):
+    """Rendimiento registrado de las ejecuciones de FFmpeg"""
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("📈 Rendimiento de FFmpeg")
+        self.resize(800, 500)
+        layout = QVBoxLayout(self)
+        
+        self.browser = QTextBrowser()
+        layout.addWidget(self.browser)
+        
+        btn_layout = QHBoxLayout()
+        btn_actualizar = QPushButton("🔄 Actualizar")
+        btn_actualizar.clicked.connect(self.actualizar)
+        btn_cerrar = QPushButton("Cerrar")
+        btn_cerrar.clicked.connect(self.accept)
+        btn_layout.addWidget(btn_actualizar)
+        btn_layout.addStretch()
+        btn_layout.addWidget(btn_cerrar)
+        layout.addLayout(btn_layout)
+        
+        self.actualizar()
+
+    def actualizar(self):
+        entradas = [e for e in leer_telemetria() if e.get("segundos")]
+        if not entradas:
+            self.browser.setHtml("<p>Aún no hay ejecuciones registradas.</p>")
+            return
+        
+        # Resumen por codec y preset: velocidad media respecto al tiempo real
+        grupos = {}
+        for e in entradas:
+            grupos.setdefault((e["codec"], e["preset"] or "-"), []).append(e)
+        html = "<h3>Resumen por codec / preset</h3><table border='1' cellpadding='4' cellspacing='0'>"
+        html += "<tr><th>Codec</th><th>Preset</th><th>Ejecuciones</th><th>Velocidad media</th><th>Media procesada</th></tr>"
+        for (codec, preset), grupo in sorted(grupos.items()):
+            media = sum(e["media_s"] for e in grupo)
+            segundos = sum(e["segundos"] for e in grupo)
+            velocidad = media / segundos if segundos else 0
+            color = "#e74c3c" if velocidad < 1 else "#27ae60"
+            html += (f"<tr><td>{codec}</td><td>{preset}</td><td>{len(grupo)}</td>"
+                     f"<td style='color:{color}'><b>{velocidad:.2f}x</b></td><td>{formatear_duracion(media)}</td></tr>")
+        html += "</table>"
+        
+        html += "<h3>Últimas ejecuciones</h3><table border='1' cellpadding='4' cellspacing='0'>"
+        html += "<tr><th>Fecha</th><th>Trabajo</th><th>Codec</th><th>Hilos</th><th>Duración</th><th>Tiempo</th><th>Velocidad</th><th>Tamaño</th></tr>"
+        for e in reversed(entradas[-200:]):
+            color = "#e74c3c" if e["velocidad"] < 1 or e["codigo"] != 0 else "#000000"
+            html += (f"<tr style='color:{color}'><td>{e['fecha']}</td><td>{e['etiqueta']}</td>"
+                     f"<td>{e['codec']} {e['preset']}</td><td>{e['hilos'] or '-'}</td>"
+                     f"<td>{formatear_duracion(e['media_s'])}</td><td>{formatear_duracion(e['segundos'])}</td>"
+                     f"<td>{e['velocidad']:.2f}x</td><td>{e['bytes'] / 1024 ** 2:.1f} MB</td></tr>")
+        html += "</table>"
+        self.browser.setHtml(html)
+
+# ========== DIÁLOGO PARA AGREGAR/EDITAR BOTONES ==========
+class AddButtonDialog(QDialog):
+    """Diálogo para agregar un nuevo botón"""
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Agregar Nuevo Botón")
+        self.resize(400, 500)  # Aumentado para incluir duración
+        self.button_data = None
+        self.setup_ui()
+    
+    def setup_ui(self):
+        layout = QVBoxLayout(self)
+        
+        # Nombre del botón
+        layout.addWidget(QLabel("Nombre del botón:"))
+        self.nombre_input = QLineEdit()
+        self.nombre_input.setPlaceholderText("Ej: SALIDA, GOL, FALTA")
+        layout.addWidget(self.nombre_input)
+        
+        # Tecla de acceso
+        layout.addWidget(QLabel("Tecla de acceso rápido:"))
+        self.tecla_input = QLineEdit()
+        self.tecla_input.setMaxLength(1)
+        self.tecla_input.setPlaceholderText("Una letra o número")
+        layout.addWidget(self.tecla_input)
+        
+        # Tipo de corte
+        layout.addWidget(QLabel("Tipo de corte:"))
+        self.tipo_combo = QComboBox()
+        self.tipo_combo.addItems(["manual", "auto"])
+        self.tipo_combo.currentTextChanged.connect(self.toggle_duracion)
+        layout.addWidget(self.tipo_combo)
+        
+        # Duración para cortes automáticos
+        self.duracion_label = QLabel("Duración automática (segundos):")
+        self.duracion_spin = QSpinBox()
+        self.duracion_spin.setRange(1, 60)
+        self.duracion_spin.setValue(10)
+        self.duracion_spin.setSuffix(" seg")
+        self.duracion_layout = QHBoxLayout()
+        self.duracion_layout.addWidget(self.duracion_label)
+        self.duracion_layout.addWidget(self.duracion_spin)
         layout.addLayout(self.duracion_layout)
         
         # Equipo
@@ -2481,12 +5698,259 @@ class DiagramaTactico(QDialog):
             self.parent().diagrama_tactico = None
         event.accept()
 
-# ========== DIÁLOGO DE EXPORTACIÓN ==========
-class ExportDialog(QDialog):
-    def __init__(self, video_path, clips, parent=None):
+# ========== CAPTURAS DE PANTALLA ==========
+def ruta_captura(tiempo_ms):
+    """Ruta JPG de una captura; el sufijo en ms evita choques en ráfagas"""
+    minutos = tiempo_ms // 60000
+    segundos = (tiempo_ms % 60000) // 1000
+    return os.path.join(CARPETA_CAPTURAS, f"frame_{minutos:02d}_{segundos:02d}_{time.time_ns() // 1000000}.jpg")
+
+def construir_cmd_captura(ffmpeg, video, tiempo_ms, salida):
+    """Frame exacto a resolución completa con FFmpeg (respaldo de la captura directa)"""
+    return [ffmpeg, "-ss", f"{tiempo_ms / 1000:.3f}", "-i", video,
+            "-frames:v", "1", "-q:v", "2", "-y", salida]
+
+class CaptureSaver(QObject):
+    """Codifica y guarda en disco, fuera del hilo de la interfaz, los frames capturados"""
+    guardada = pyqtSignal(str, int)
+    error = pyqtSignal(str)
+
+    def __init__(self, parent=None):
         super().__init__(parent)
-        self.setWindowTitle(LANG.get("export"))
-        self.resize(500, 450)
+        self.pool = concurrent.futures.ThreadPoolExecutor(max_workers=2)
+
+    def guardar(self, imagen, ruta, tiempo_ms):
+        self.pool.submit(self._guardar, imagen, ruta, tiempo_ms)
+
+    def _guardar(self, imagen, ruta, tiempo_ms):
+        try:
+            os.makedirs(os.path.dirname(ruta), exist_ok=True)
+            if imagen.save(ruta, "JPG", 95):
+                self.guardada.emit(ruta, tiempo_ms)
+            else:
+                self.error.emit(f"No se pudo escribir {ruta}")
+        except Exception as e:
+            self.error.emit(str(e))
+
+    def cerrar(self):
+        """Espera a que se escriban las capturas pendientes"""
+        self.pool.shutdown(wait=True)
+
+# ========== HOJAS DE CONTACTOS ==========
+HOJA_MINI_ANCHO = 480
+HOJA_MINI_ALTO = 270
+HOJA_COLUMNAS = 4
+HOJA_FILAS = 5
+
+def tiempo_representativo(clip, punto, desplazamiento_ms=0):
+    """Instante del clip que lo representa: 'inicio', 'mitad' o inicio + desplazamiento"""
+    if punto == "mitad":
+        return (clip['ini'] + clip['fin']) // 2
+    if punto == "desplazamiento":
+        return min(clip['ini'] + desplazamiento_ms, max(clip['ini'], clip['fin'] - 1))
+    return clip['ini']
+
+def construir_cmd_fotogramas(ffmpeg, video, frames, ancho, alto):
+    """
+    Un solo FFmpeg que recorre el video una vez y entrega por stdout, en RGB24,
+    solo los frames pedidos (números de frame ordenados y sin repetir).
+    """
+    seleccion = "+".join(f"eq(n,{n})" for n in frames)
+    return [
+        ffmpeg, "-hide_banner", "-loglevel", "error", "-i", video,
+        "-map", "0:v:0", "-an", "-sn",
+        "-vf", f"select='{seleccion}',"
+               f"scale={ancho}:{alto}:force_original_aspect_ratio=decrease,"
+               f"pad={ancho}:{alto}:(ow-iw)/2:(oh-ih)/2",
+        "-vsync", "passthrough", "-frames:v", str(len(frames)),
+        "-f", "rawvideo", "-pix_fmt", "rgb24", "pipe:1"
+    ]
+
+class HojaContactosWorker(QThread):
+    """
+    Extrae un fotograma por clip en una sola pasada ordenada sobre el video y
+    los compone en hojas de contactos (JPG) o en una cuadrícula PDF.
+    """
+    progress = pyqtSignal(int)
+    finished = pyqtSignal(list)
+    error = pyqtSignal(str)
+
+    def __init__(self, video_path, entradas, carpeta, pdf=False):
+        super().__init__()
+        self.video_path = video_path
+        # entradas: [(ms, [líneas de pie de foto])] en el orden de las hojas
+        self.entradas = entradas
+        self.carpeta = carpeta
+        self.pdf = pdf
+        self.proceso = None
+        self.cancelado = False
+
+    def cancelar(self):
+        self.cancelado = True
+        if self.proceso and self.proceso.poll() is None:
+            try:
+                self.proceso.kill()
+            except:
+                pass
+
+    def extraer(self):
+        """Devuelve {número de frame: QImage} leyendo la salida de un único FFmpeg"""
+        indice = MEDIA_INDEX.obtener(self.video_path)
+        if indice is None:
+            indice = MEDIA_INDEX.escanear(self.video_path)
+        self.frames = [indice.indice_frame(ms) for ms, _ in self.entradas]
+        pendientes = sorted(set(self.frames))
+        
+        cmd = construir_cmd_fotogramas(get_ffmpeg_path(), self.video_path, pendientes,
+                                       HOJA_MINI_ANCHO, HOJA_MINI_ALTO)
+        tam = HOJA_MINI_ANCHO * HOJA_MINI_ALTO * 3
+        kwargs = {"stdout": subprocess.PIPE, "stderr": subprocess.DEVNULL}
+        if SYS_CONFIG["system"] == "Windows":
+            kwargs["creationflags"] = subprocess.CREATE_NO_WINDOW
+        self.proceso = subprocess.Popen(cmd, **kwargs)
+        imagenes = {}
+        for n in pendientes:
+            datos = self.proceso.stdout.read(tam)
+            if len(datos) < tam:
+                break
+            imagenes[n] = QImage(datos, HOJA_MINI_ANCHO, HOJA_MINI_ALTO, HOJA_MINI_ANCHO * 3,
+                                 QImage.Format.Format_RGB888).copy()
+            self.progress.emit(len(imagenes) * 80 // len(pendientes))
+        self.proceso.stdout.close()
+        self.proceso.wait()
+        return imagenes
+
+    def componer_hojas(self, imagenes):
+        """Cuadrículas de HOJA_COLUMNAS x HOJA_FILAS miniaturas con su pie de foto"""
+        pie = 54
+        margen = 12
+        celda_w, celda_h = HOJA_MINI_ANCHO + margen, HOJA_MINI_ALTO + pie + margen
+        por_hoja = HOJA_COLUMNAS * HOJA_FILAS
+        rutas = []
+        for inicio in range(0, len(self.entradas), por_hoja):
+            grupo = list(range(inicio, min(inicio + por_hoja, len(self.entradas))))
+            filas = math.ceil(len(grupo) / HOJA_COLUMNAS)
+            hoja = QImage(HOJA_COLUMNAS * celda_w + margen, filas * celda_h + margen,
+                          QImage.Format.Format_RGB32)
+            hoja.fill(QColor("#1e272e"))
+            painter = QPainter(hoja)
+            painter.setFont(QFont("Arial", 11))
+            for k, i in enumerate(grupo):
+                x = margen + (k % HOJA_COLUMNAS) * celda_w
+                y = margen + (k // HOJA_COLUMNAS) * celda_h
+                imagen = imagenes.get(self.frames[i])
+                if imagen is not None:
+                    painter.drawImage(x, y, imagen)
+                else:
+                    painter.fillRect(x, y, HOJA_MINI_ANCHO, HOJA_MINI_ALTO, QColor("#2c3e50"))
+                painter.setPen(QColor("white"))
+                for j, linea in enumerate(self.entradas[i][1][:3]):
+                    painter.drawText(QRect(x, y + HOJA_MINI_ALTO + 4 + j * 17, HOJA_MINI_ANCHO, 17),
+                                     Qt.AlignmentFlag.AlignLeft, linea)
+            painter.end()
+            ruta = os.path.join(self.carpeta, f"hoja_{len(rutas) + 1:02d}.jpg")
+            hoja.save(ruta, "JPG", 90)
+            rutas.append(ruta)
+        return rutas
+
+    def componer_pdf(self, imagenes):
+        """Cuadrícula PDF (reportlab) con una celda por clip"""
+        ruta = os.path.join(self.carpeta, "hoja_contactos.pdf")
+        temporales = []
+        try:
+            styles = getSampleStyleSheet()
+            ancho_celda = 10.5 * inch / HOJA_COLUMNAS
+            alto_img = ancho_celda * HOJA_MINI_ALTO / HOJA_MINI_ANCHO
+            celdas = []
+            for i, (_, lineas) in enumerate(self.entradas):
+                imagen = imagenes.get(self.frames[i])
+                if imagen is not None:
+                    temp = os.path.join(self.carpeta, f"_mini_{i}.jpg")
+                    imagen.save(temp, "JPG", 90)
+                    temporales.append(temp)
+                    img = Image(temp, width=ancho_celda - 6, height=alto_img - 4)
+                else:
+                    img = Paragraph("<i>Sin imagen</i>", styles['Normal'])
+                texto = "<br/>".join(l.replace("&", "&amp;").replace("<", "&lt;") for l in lineas)
+                celdas.append([img, Paragraph(texto, styles['Normal'])])
+            
+            filas = [celdas[i:i + HOJA_COLUMNAS] for i in range(0, len(celdas), HOJA_COLUMNAS)]
+            filas[-1] += [[Spacer(1, 1)]] * (HOJA_COLUMNAS - len(filas[-1]))
+            tabla = Table(filas, colWidths=[ancho_celda] * HOJA_COLUMNAS)
+            tabla.setStyle(TableStyle([
+                ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+                ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+            ]))
+            doc = SimpleDocTemplate(ruta, pagesize=landscape(A4),
+                                    leftMargin=0.4 * inch, rightMargin=0.4 * inch,
+                                    topMargin=0.4 * inch, bottomMargin=0.4 * inch)
+            doc.build([Paragraph("<b>HOJA DE CONTACTOS</b>", styles['Title']), tabla])
+        finally:
+            for temp in temporales:
+                if os.path.exists(temp):
+                    os.remove(temp)
+        return [ruta]
+
+    def run(self):
+        try:
+            os.makedirs(self.carpeta, exist_ok=True)
+            imagenes = self.extraer()
+            if self.cancelado:
+                return
+            if not imagenes:
+                raise RuntimeError("FFmpeg no devolvió ningún fotograma")
+            rutas = self.componer_pdf(imagenes) if self.pdf else self.componer_hojas(imagenes)
+            self.progress.emit(100)
+            self.finished.emit(rutas)
+        except Exception as e:
+            if not self.cancelado:
+                self.error.emit(str(e))
+
+class HojaContactosDialog(QDialog):
+    """Opciones de la hoja de contactos: fotograma de cada clip y formato"""
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Hoja de Contactos")
+        layout = QVBoxLayout(self)
+        
+        layout.addWidget(QLabel("Fotograma de cada clip:"))
+        self.punto_combo = QComboBox()
+        self.punto_combo.addItem("Inicio del clip", "inicio")
+        self.punto_combo.addItem("Mitad del clip", "mitad")
+        self.punto_combo.addItem("Segundos después del inicio", "desplazamiento")
+        layout.addWidget(self.punto_combo)
+        
+        self.desplazamiento_spin = QSpinBox()
+        self.desplazamiento_spin.setRange(0, 120)
+        self.desplazamiento_spin.setValue(3)
+        self.desplazamiento_spin.setSuffix(" seg")
+        self.desplazamiento_spin.setEnabled(False)
+        self.punto_combo.currentIndexChanged.connect(
+            lambda: self.desplazamiento_spin.setEnabled(self.punto_combo.currentData() == "desplazamiento")
+        )
+        layout.addWidget(self.desplazamiento_spin)
+        
+        layout.addWidget(QLabel("Formato:"))
+        self.formato_combo = QComboBox()
+        self.formato_combo.addItem(f"Imágenes JPG ({HOJA_COLUMNAS}x{HOJA_FILAS} por hoja)", False)
+        self.formato_combo.addItem("PDF (cuadrícula)", True)
+        layout.addWidget(self.formato_combo)
+        
+        btns = QHBoxLayout()
+        btn_ok = QPushButton("🖼️ Generar")
+        btn_ok.clicked.connect(self.accept)
+        btn_cancel = QPushButton("Cancelar")
+        btn_cancel.clicked.connect(self.reject)
+        btns.addWidget(btn_ok)
+        btns.addWidget(btn_cancel)
+        layout.addLayout(btns)
+
+# ========== DIÁLOGO DE EXPORTACIÓN ==========
+class ExportDialog(QDialog):
+    def __init__(self, video_path, clips, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle(LANG.get("export"))
+        self.resize(500, 450)
         self.video_path = video_path
         self.clips = clips
         self.worker = None
@@ -2528,6 +5992,7 @@ class ExportDialog(QDialog):
         self.codec_combo = QComboBox()
         self.codec_combo.addItems([
             "Copia directa (rápido)",
+            "Smart-cut (preciso y rápido)",
             "H.264 (compatible)",
             "HEVC (alta calidad)",
             "VP9 (web optimizado)"
@@ -2546,13 +6011,39 @@ class ExportDialog(QDialog):
         config_layout.addLayout(quality_layout)
         
         # Opciones adicionales
-        self.include_timestamp = QCheckBox("Incluir marca de tiempo en video")
-        self.include_timestamp.setChecked(True)
-        config_layout.addWidget(self.include_timestamp)
+        etiquetas_layout = QHBoxLayout()
+        etiquetas_layout.addWidget(QLabel("Marca de tiempo:"))
+        self.etiquetas_combo = crear_combo_etiquetas()
+        etiquetas_layout.addWidget(self.etiquetas_combo)
+        config_layout.addLayout(etiquetas_layout)
         
         self.include_logo = QCheckBox("Incluir logo del equipo")
         config_layout.addWidget(self.include_logo)
         
+        # Fusión de clips superpuestos
+        self.fusionar_check = QCheckBox("Fusionar clips superpuestos (un capítulo por clip)")
+        config_layout.addWidget(self.fusionar_check)
+        
+        fusion_layout = QHBoxLayout()
+        fusion_layout.addWidget(QLabel("Tolerancia (s):"))
+        self.tolerancia_spin = QSpinBox()
+        self.tolerancia_spin.setRange(0, 60)
+        self.tolerancia_spin.setValue(2)
+        fusion_layout.addWidget(self.tolerancia_spin)
+        fusion_layout.addWidget(QLabel("Margen antes (s):"))
+        self.margen_pre_spin = QSpinBox()
+        self.margen_pre_spin.setRange(0, 60)
+        fusion_layout.addWidget(self.margen_pre_spin)
+        fusion_layout.addWidget(QLabel("Margen después (s):"))
+        self.margen_post_spin = QSpinBox()
+        self.margen_post_spin.setRange(0, 60)
+        fusion_layout.addWidget(self.margen_post_spin)
+        config_layout.addLayout(fusion_layout)
+        
+        for spin in (self.tolerancia_spin, self.margen_pre_spin, self.margen_post_spin):
+            spin.setEnabled(False)
+            self.fusionar_check.toggled.connect(spin.setEnabled)
+        
         config_group.setLayout(config_layout)
         layout.addWidget(config_group)
         
@@ -2569,7 +6060,8 @@ class ExportDialog(QDialog):
         self.export_btn = QPushButton("🚀 Exportar")
         self.export_btn.clicked.connect(self.iniciar_exportacion)
         self.cancel_btn = QPushButton("Cancelar")
-        self.cancel_btn.clicked.connect(self.reject)
+        self.cancel_btn.clicked.connect(self.cancelar)
+        self.worker = None
         
         btn_layout.addWidget(self.export_btn)
         btn_layout.addWidget(self.cancel_btn)
@@ -2585,6 +6077,7 @@ class ExportDialog(QDialog):
         # Mapear codec
         codec_map = {
             "Copia directa (rápido)": "copy",
+            "Smart-cut (preciso y rápido)": "smartcut",
             "H.264 (compatible)": "libx264",
             "HEVC (alta calidad)": "libx265",
             "VP9 (web optimizado)": "libvpx-vp9"
@@ -2610,10 +6103,25 @@ class ExportDialog(QDialog):
                 return
         
         # Crear y ejecutar worker con timestamp
-        self.worker = ExportWorker(self.video_path, self.clips, output_path, codec, self.include_timestamp.isChecked())
+        fusion = None
+        if self.fusionar_check.isChecked():
+            fusion = {
+                "tolerancia_ms": self.tolerancia_spin.value() * 1000,
+                "pre_ms": self.margen_pre_spin.value() * 1000,
+                "post_ms": self.margen_post_spin.value() * 1000
+            }
+        
+        etiquetas = self.etiquetas_combo.currentData()
+        self.worker = ExportWorker(self.video_path, self.clips, output_path, codec,
+                                   etiquetas == ETIQUETAS_INCRUSTADAS, fusion,
+                                   etiquetas == ETIQUETAS_SUAVES)
         self.worker.progress.connect(self.progress_bar.setValue)
+        self.worker.telemetria.connect(
+            lambda t: self.status_label.setText(f"Exportando... {t.texto()}")
+        )
         self.worker.finished.connect(self.exportacion_completada)
         self.worker.error.connect(self.exportacion_error)
+        self.worker.cancelled.connect(self.exportacion_cancelada)
         
         self.export_btn.setEnabled(False)
         self.cancel_btn.setText("Cancelar Exportación")
@@ -2638,16 +6146,42 @@ class ExportDialog(QDialog):
         self.cancel_btn.setText("Cancelar")
         self.status_label.setText("Error - Listo para reintentar")
 
+    def cancelar(self):
+        """Detiene la exportación en curso o, si no hay ninguna, cierra el diálogo"""
+        if self.worker is not None and self.worker.isRunning():
+            self.cancel_btn.setEnabled(False)
+            self.status_label.setText("Cancelando...")
+            self.worker.cancelar()
+        else:
+            self.reject()
+
+    def exportacion_cancelada(self):
+        """La exportación se canceló: temporales y salida parcial ya borrados"""
+        self.export_btn.setEnabled(True)
+        self.cancel_btn.setEnabled(True)
+        self.cancel_btn.setText("Cancelar")
+        self.progress_bar.setValue(0)
+        self.status_label.setText("Exportación cancelada")
+
 # ========== GESTIÓN DE PROYECTOS ==========
+# Proyectos a partir de este tamaño se cargan en segundo plano con barra de progreso
+PROYECTO_GRANDE_BYTES = 4 * 1024 * 1024
+BLOQUE_LECTURA = 1024 * 1024
+
 class ProyectoManager:
     @staticmethod
-    def guardar_proyecto(nombre_proyecto, video_path, cortes, config, metadata=None):
-        """Guarda un proyecto en disco"""
+    def guardar_proyecto(nombre_proyecto, video_path, clips, config, metadata=None, journal_seq=0):
+        """
+        Guarda un proyecto en disco (clips en formato compacto, ver
+        clips_a_compacto). journal_seq es la última operación del diario de
+        ediciones que ya incluye.
+        """
         proyecto_data = {
             "nombre": nombre_proyecto,
             "fecha_creacion": time.strftime("%Y-%m-%d %H:%M:%S"),
             "video_path": video_path,
-            "cortes": cortes,
+            "journal_seq": journal_seq,
+            "clips": clips,
             "botonera_config": config,
             "metadata": metadata or {}
         }
@@ -2665,19 +6199,37 @@ class ProyectoManager:
             if not os.path.exists(folder):
                 os.makedirs(folder)
         
-        # Guardar archivo del proyecto
+        # Guardar archivo del proyecto (en un temporal y luego reemplazo: un
+        # corte a mitad de escritura nunca deja el .mca a medias)
         proyecto_file = os.path.join(proyecto_folder, f"{nombre_proyecto}.mca")
-        with open(proyecto_file, 'w') as f:
-            json.dump(proyecto_data, f, indent=2, ensure_ascii=False)
+        temporal = proyecto_file + ".tmp"
+        with open(temporal, 'w', encoding='utf-8') as f:
+            json.dump(proyecto_data, f, ensure_ascii=False, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporal, proyecto_file)
         
         return proyecto_file
 
     @staticmethod
-    def cargar_proyecto(archivo_proyecto):
-        """Carga un proyecto desde disco"""
+    def cargar_proyecto(archivo_proyecto, progreso=None):
+        """Carga un proyecto desde disco (progreso(bytes_leidos, total) se llama por cada bloque)"""
         try:
             with open(archivo_proyecto, 'r', encoding='utf-8') as f:
-                proyecto_data = json.load(f)
+                if progreso is None:
+                    proyecto_data = json.load(f)
+                else:
+                    total = max(1, os.fstat(f.fileno()).st_size)
+                    bloques = []
+                    leidos = 0
+                    while True:
+                        bloque = f.read(BLOQUE_LECTURA)
+                        if not bloque:
+                            break
+                        bloques.append(bloque)
+                        leidos += len(bloque)
+                        progreso(min(leidos, total), total)
+                    proyecto_data = json.loads("".join(bloques))
             
             # Verificar que el video aún existe
             video_path = proyecto_data.get("video_path", "")
@@ -2727,7 +6279,7 @@ class ProyectoManager:
                             video_exists = os.path.exists(video_path)
                             
                             # Contar clips
-                            total_clips = len(proyecto_data.get("cortes", []))
+                            total_clips = total_clips_proyecto(proyecto_data)
                             
                             proyectos.append({
                                 "nombre": proyecto_data.get("nombre", item),
@@ -2755,14 +6307,232 @@ class ProyectoManager:
                 return False
         return False
 
+class ProyectoLoader(QThread):
+    """Lee y decodifica un proyecto grande en segundo plano (los clips llegan ya construidos)"""
+    progreso = pyqtSignal(int)
+    terminado = pyqtSignal(object, object)
+    error = pyqtSignal(str)
+    cancelada = pyqtSignal()
+
+    def __init__(self, archivo_proyecto):
+        super().__init__()
+        self.archivo_proyecto = archivo_proyecto
+        self.cancelado = False
+
+    def cancelar(self):
+        self.cancelado = True
+
+    def leido(self, leidos, total):
+        if self.cancelado:
+            raise InterruptedError("Carga cancelada")
+        # La lectura es el 80% del trabajo; decodificar y construir los clips, el resto
+        self.progreso.emit(int(80 * leidos / total))
+
+    def run(self):
+        try:
+            proyecto = ProyectoManager.cargar_proyecto(self.archivo_proyecto, progreso=self.leido)
+            self.progreso.emit(90)
+            clips = ProyectoJournal.rehacer(proyecto, clips_de_proyecto(proyecto))
+            if self.cancelado:
+                self.cancelada.emit()
+                return
+            self.progreso.emit(100)
+            self.terminado.emit(proyecto, clips)
+        except Exception as e:
+            if self.cancelado:
+                self.cancelada.emit()
+            else:
+                self.error.emit(str(e))
+
+class ProyectoJournal:
+    """
+    Diario de ediciones del proyecto: una línea JSON por operación (alta,
+    cambio y baja de clips, limpieza, formación guardada, video), escrita y
+    sincronizada a disco al momento. Lo que no está aún en el .mca está aquí;
+    cada guardado completo lo compacta.
+    """
+    def __init__(self):
+        self.nombre = None
+        self.archivo = None
+        self.f = None
+        self.seq = 0
+        self.lock = threading.Lock()
+        # Llamada con el mensaje cuando una operación no se pudo escribir
+        self.al_fallar = None
+
+    @staticmethod
+    def ruta(nombre_proyecto):
+        return os.path.join(CARPETA_PROYECTOS, nombre_proyecto, f"{nombre_proyecto}.journal")
+
+    @staticmethod
+    def leer(archivo):
+        """Operaciones del diario (una última línea a medio escribir se descarta)"""
+        operaciones = []
+        try:
+            with open(archivo, 'r', encoding='utf-8') as f:
+                for linea in f:
+                    try:
+                        operaciones.append(json.loads(linea))
+                    except ValueError:
+                        break
+        except OSError:
+            pass
+        return operaciones
+
+    @staticmethod
+    def rehacer(proyecto, clips):
+        """
+        Aplica a un proyecto recién leído las operaciones del diario posteriores
+        a su último guardado. Devuelve los clips resultantes y deja en
+        proyecto["ediciones_recuperadas"] cuántas se aplicaron.
+        """
+        desde = proyecto.get("journal_seq", 0)
+        por_id = {clip.id: clip for clip in clips}
+        formaciones = proyecto.setdefault("metadata", {}).setdefault("formaciones_guardadas", [])
+        aplicadas = 0
+        for op in ProyectoJournal.leer(ProyectoJournal.ruta(proyecto.get("nombre", ""))):
+            if op.get("n", 0) <= desde:
+                continue
+            tipo = op.get("op")
+            if tipo in ("alta", "cambio"):
+                clip = ClipRecord(op["clip"])
+                por_id[clip.id] = clip
+            elif tipo == "baja":
+                por_id.pop(op["id"], None)
+            elif tipo == "limpiar":
+                por_id.clear()
+            elif tipo == "formacion":
+                formaciones.append(op["formacion"])
+                formaciones.sort(key=lambda x: x['minuto'])
+            elif tipo == "video":
+                proyecto["video_path"] = op["ruta"]
+            else:
+                continue
+            aplicadas += 1
+        proyecto["ediciones_recuperadas"] = aplicadas
+        return list(por_id.values())
+
+    @staticmethod
+    def pendientes():
+        """Proyectos con ediciones en el diario que no llegaron al .mca (cierre inesperado)"""
+        proyectos = []
+        if not os.path.exists(CARPETA_PROYECTOS):
+            return proyectos
+        for nombre in os.listdir(CARPETA_PROYECTOS):
+            archivo = os.path.join(CARPETA_PROYECTOS, nombre, f"{nombre}.mca")
+            journal = ProyectoJournal.ruta(nombre)
+            if os.path.exists(archivo) and os.path.exists(journal) and os.path.getsize(journal) > 0:
+                proyectos.append((os.path.getmtime(journal), nombre, archivo))
+        # El más reciente primero
+        return [(nombre, archivo) for _, nombre, archivo in sorted(proyectos, reverse=True)]
+
+    def abrir(self, nombre_proyecto, seq=0, nuevo=False):
+        """Empieza a registrar en el diario del proyecto (nuevo=True lo vacía)"""
+        with self.lock:
+            self._cerrar()
+            self.nombre = nombre_proyecto
+            self.archivo = self.ruta(nombre_proyecto)
+            os.makedirs(os.path.dirname(self.archivo), exist_ok=True)
+            if nuevo:
+                self.seq = 0
+                self.f = open(self.archivo, 'w', encoding='utf-8')
+            else:
+                # Se reescribe sin la posible línea final a medio escribir, para
+                # que lo que se añada no quede pegado a ella
+                operaciones = self.leer(self.archivo)
+                self._reescribir(self.archivo, operaciones)
+                self.seq = max([seq] + [op.get("n", 0) for op in operaciones])
+                self.f = open(self.archivo, 'a', encoding='utf-8')
+
+    @staticmethod
+    def _reescribir(archivo, operaciones):
+        temporal = archivo + ".tmp"
+        with open(temporal, 'w', encoding='utf-8') as f:
+            for op in operaciones:
+                f.write(json.dumps(op, ensure_ascii=False, separators=(",", ":")) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporal, archivo)
+
+    def _cerrar(self):
+        if self.f is not None:
+            try:
+                self.f.close()
+            except OSError:
+                pass
+        self.f = None
+
+    def cerrar(self):
+        with self.lock:
+            self._cerrar()
+            self.nombre = self.archivo = None
+
+    def registrar(self, op, **datos):
+        """
+        Añade una operación al diario y la sincroniza a disco (sin proyecto
+        con nombre no hace nada). Devuelve False si no se pudo escribir.
+        """
+        with self.lock:
+            if self.f is None:
+                return True
+            self.seq += 1
+            datos.update(op=op, n=self.seq)
+            try:
+                self.f.write(json.dumps(datos, ensure_ascii=False, separators=(",", ":")) + "\n")
+                self.f.flush()
+                os.fsync(self.f.fileno())
+                return True
+            except OSError as e:
+                error = str(e)
+        if self.al_fallar:
+            self.al_fallar(error)
+        return False
+
+    def compactar(self, nombre_proyecto, hasta_seq):
+        """Quita del diario del proyecto lo que ya está en su .mca (operaciones hasta hasta_seq)"""
+        archivo = self.ruta(nombre_proyecto)
+        with self.lock:
+            restantes = [op for op in self.leer(archivo) if op.get("n", 0) > hasta_seq]
+            abierto = archivo == self.archivo and self.f is not None
+            if abierto:
+                self._cerrar()
+            self._reescribir(archivo, restantes)
+            if abierto:
+                self.f = open(archivo, 'a', encoding='utf-8')
+
+    def descartar(self):
+        """Vacía el diario abierto (el usuario decidió no guardar los cambios)"""
+        if self.nombre:
+            self.compactar(self.nombre, self.seq)
+
+class ProyectoSaver(QThread):
+    """Escribe el .mca en segundo plano y después compacta el diario de ediciones"""
+    terminado = pyqtSignal(str)
+    error = pyqtSignal(str)
+
+    def __init__(self, journal, nombre_proyecto, video_path, clips, config, metadata, journal_seq):
+        super().__init__()
+        self.journal = journal
+        self.datos = (nombre_proyecto, video_path, clips, config, metadata)
+        self.journal_seq = journal_seq
+
+    def run(self):
+        try:
+            archivo = ProyectoManager.guardar_proyecto(*self.datos, journal_seq=self.journal_seq)
+            self.journal.compactar(self.datos[0], self.journal_seq)
+            self.terminado.emit(archivo)
+        except Exception as e:
+            self.error.emit(str(e))
+
 # ========== GESTOR DE FORMACIONES ==========
 class GestorFormaciones:
-    def __init__(self):
+    def __init__(self, journal=None):
         self.formaciones_guardadas = []
+        self.journal = journal
         
     def agregar_formacion(self, minuto, diagrama_data):
         """Agrega una formación al gestor"""
-        self.formaciones_guardadas.append({
+        formacion = {
             "minuto": minuto,
             "formacion": diagrama_data["formacion"],
             "jugadores": diagrama_data["jugadores"].copy(),
@@ -2770,7 +6540,10 @@ class GestorFormaciones:
             "notas": diagrama_data.get("notas", ""),
             "es_local": diagrama_data.get("es_local", True),
             "tamano_fichas": diagrama_data.get("tamano_fichas", 24)
-        })
+        }
+        self.formaciones_guardadas.append(formacion)
+        if self.journal is not None:
+            self.journal.registrar("formacion", formacion=formacion)
         
         # Ordenar por minuto
         self.formaciones_guardadas.sort(key=lambda x: x['minuto'])
@@ -2811,6 +6584,30 @@ class MatchClipAnalyzer(QMainWindow):
         self.proyecto_actual = None
         self.proyecto_modificado = False
         self.nombre_proyecto_actual = ""
+        self.media_index = None
+        self.probe_worker = None
+        self.cortes_precisos = False
+        self.job_keyframes_densos = None
+        self.filmstrip_worker = None
+        self.envolvente_worker = None
+        self.picos_config = None
+        self.escenas_worker = None
+        self.jobs_captura = set()
+        self.jobs_lote = set()
+        self.hoja_worker = None
+        self.cargador_proyecto = None
+        self.proxy_activo = None
+        self.job_proxy = None
+        self.decodificador = None
+        self.frame_mostrado = None
+        self.frame_esperado = None
+        config_general = leer_config()
+        self.ajuste_escena = config_general.get("ajuste_escena", False)
+        self.tolerancia_escena_ms = config_general.get("tolerancia_escena_ms", TOLERANCIA_ESCENA_MS)
+        self.usar_proxies = config_general.get("usar_proxies", False)
+        self.frame_exacto = config_general.get("frame_exacto", False) and HAS_NUMPY
+        self.claves_cache = {}
+        self.dialogos_playlist = []
         
         # Cargar configuración
         self.config = self.cargar_config_botones()
@@ -2823,7 +6620,31 @@ class MatchClipAnalyzer(QMainWindow):
         
         # Inicializar gestores
         self.diagrama_tactico = None
-        self.gestor_formaciones = GestorFormaciones()
+        self.journal = ProyectoJournal()
+        self.journal.al_fallar = self.journal_fallido
+        self.gestor_formaciones = GestorFormaciones(self.journal)
+        self.guardador = None
+        self.guardado_pendiente = False
+        
+        # Cola de renderizado en segundo plano
+        self.render_queue = RenderQueue(self)
+        self.render_queue.job_done.connect(self.render_completado)
+        self.render_queue.job_failed.connect(self.render_fallido)
+        self.render_queue.job_status.connect(self.actualizar_estado_renders)
+        self.render_queue.job_progress.connect(self.proxy_progreso)
+        self.render_queue.job_status.connect(self.proxy_estado)
+        self.dialogo_renders = None
+        
+        # Capturas: el frame del reproductor se guarda en segundo plano
+        self.capturas = CaptureSaver(self)
+        self.capturas.guardada.connect(self.captura_guardada)
+        self.capturas.error.connect(
+            lambda msg: self.statusBar().showMessage(f"❌ Error al guardar la captura: {msg[:150]}", 8000)
+        )
+        
+        # Todos los clips del proyecto; las listas por categoría son vistas filtradas
+        self.clips = ClipStore(self)
+        self.clips.conteos_cambiados.connect(self.actualizar_contadores)
         
         # Inicializar variables para listas
         self.listas_widgets = {}
@@ -2856,6 +6677,7 @@ class MatchClipAnalyzer(QMainWindow):
         self.player.setVideoOutput(self.video_widget)
         self.player.positionChanged.connect(self.actualizar_pos)
         self.player.durationChanged.connect(self.actualizar_dur)
+        self.player.playbackStateChanged.connect(self.estado_reproduccion)
         
         # Y también los botones ya existen
         self.btn_back_5.clicked.connect(lambda: self.saltar_tiempo(-5000))
@@ -2959,7 +6781,12 @@ class MatchClipAnalyzer(QMainWindow):
         v_layout.setContentsMargins(0, 0, 0, 0)
         
         self.video_widget = QVideoWidget()
-        v_layout.addWidget(self.video_widget)
+        # Encima del reproductor, el frame exacto decodificado al avanzar frame a frame
+        self.frame_view = FrameView()
+        self.video_stack = QStackedWidget()
+        self.video_stack.addWidget(self.video_widget)
+        self.video_stack.addWidget(self.frame_view)
+        v_layout.addWidget(self.video_stack)
         
         # Botón para mostrar/ocultar panel
         self.btn_toggle = QPushButton(">")
@@ -3089,6 +6916,8 @@ class MatchClipAnalyzer(QMainWindow):
         btn_cap = QPushButton("📷 CAPTURAR PANTALLA")
         btn_cap.setFocusPolicy(Qt.FocusPolicy.NoFocus)
         btn_cap.setStyleSheet("background: #8e44ad; color: white;")
+        btn_cap.setToolTip("Clic: captura instantánea del frame en pantalla\n"
+                           "Mayús+clic: frame exacto a resolución completa con FFmpeg")
         btn_cap.clicked.connect(self.capturar_pantalla)
         fila_tiempo.addWidget(btn_cap)
         
@@ -3101,10 +6930,10 @@ class MatchClipAnalyzer(QMainWindow):
         
         fila_tiempo.addStretch()
         
-        # Zoom slider
+        # Zoom slider (logarítmico: partido entero -> frames)
         self.zoom_slider = QSlider(Qt.Orientation.Horizontal)
-        self.zoom_slider.setRange(10, 2000)
-        self.zoom_slider.setValue(10)
+        self.zoom_slider.setRange(0, ClickableTimeline.NIVELES_ZOOM)
+        self.zoom_slider.setValue(0)
         self.zoom_slider.setFixedWidth(150)
         self.zoom_slider.valueChanged.connect(self.cambiar_zoom)
         
@@ -3123,13 +6952,15 @@ class MatchClipAnalyzer(QMainWindow):
         
         layout_principal.addLayout(fila_tiempo)
         
-        # Timeline
-        self.scroll_timeline = QScrollArea()
-        self.scroll_timeline.setFixedHeight(90)
-        self.scroll_timeline.setStyleSheet("background: #1e272e;")
+        # Timeline: vista de ancho fijo con su propia barra de desplazamiento
         self.timeline = ClickableTimeline(self.player)
-        self.scroll_timeline.setWidget(self.timeline)
-        layout_principal.addWidget(self.scroll_timeline)
+        self.barra_timeline = QScrollBar(Qt.Orientation.Horizontal)
+        self.barra_timeline.setFocusPolicy(Qt.FocusPolicy.NoFocus)
+        self.barra_timeline.valueChanged.connect(self.timeline.desplazar_a)
+        self.timeline.vista_cambiada.connect(self.sincronizar_vista_timeline)
+        self.timeline.clic_en_clips.connect(self.seleccionar_clip_en)
+        layout_principal.addWidget(self.timeline)
+        layout_principal.addWidget(self.barra_timeline)
         
         # Botonera
         self.grid_btns = QGridLayout()
@@ -3183,6 +7014,15 @@ class MatchClipAnalyzer(QMainWindow):
         footer.addWidget(btn_exportar)
         
         layout_principal.addLayout(footer)
+        
+        # Barra de estado: notificaciones no bloqueantes de los renders
+        self.lbl_renders = QLabel("")
+        self.lbl_renders.setStyleSheet("color: #f39c12; padding: 0 8px;")
+        self.statusBar().addPermanentWidget(self.lbl_renders)
+        self.lbl_proxy = QLabel("")
+        self.lbl_proxy.setStyleSheet("color: #1abc9c; padding: 0 8px;")
+        self.statusBar().addPermanentWidget(self.lbl_proxy)
+        self.statusBar().setStyleSheet("color: white;")
 
     def crear_barra_menu(self):
         """Crea la barra de menú"""
@@ -3255,6 +7095,46 @@ class MatchClipAnalyzer(QMainWindow):
         exportar_pdf_action = tools_menu.addAction("📤 Exportar Canchas a PDF")
         exportar_pdf_action.triggered.connect(self.exportar_canchas_pdf)
         
+        tools_menu.addSeparator()
+        
+        renders_action = tools_menu.addAction("🎞️ Cola de Renderizado")
+        renders_action.triggered.connect(self.mostrar_cola_renders)
+        
+        render_todos_action = tools_menu.addAction("🎬 Renderizar Todos los Clips")
+        render_todos_action.triggered.connect(self.renderizar_todos_los_clips)
+        
+        telemetria_action = tools_menu.addAction("📈 Rendimiento de FFmpeg")
+        telemetria_action.triggered.connect(lambda: TelemetriaDialog(self).exec())
+        
+        precisos_action = tools_menu.addAction("✂️ Cortes precisos (smart-cut)")
+        precisos_action.setCheckable(True)
+        precisos_action.setChecked(self.cortes_precisos)
+        precisos_action.toggled.connect(lambda activo: setattr(self, 'cortes_precisos', activo))
+        
+        densos_action = tools_menu.addAction("🔑 Re-codificar video con keyframes densos")
+        densos_action.triggered.connect(self.recodificar_keyframes_densos)
+        
+        escena_action = tools_menu.addAction("🎬 Ajustar clips a cambios de plano")
+        escena_action.setCheckable(True)
+        escena_action.setChecked(self.ajuste_escena)
+        escena_action.toggled.connect(self.cambiar_ajuste_escena)
+        
+        proxy_action = tools_menu.addAction("🎞️ Reproducir con proxy de baja resolución")
+        proxy_action.setCheckable(True)
+        proxy_action.setChecked(self.usar_proxies)
+        proxy_action.toggled.connect(self.cambiar_uso_proxies)
+        
+        frame_exacto_action = tools_menu.addAction("🎯 Paso de frame exacto (caché de frames)")
+        frame_exacto_action.setCheckable(True)
+        frame_exacto_action.setChecked(self.frame_exacto)
+        frame_exacto_action.toggled.connect(self.cambiar_frame_exacto)
+        
+        hoja_action = tools_menu.addAction("🖼️ Hoja de Contactos de los Clips")
+        hoja_action.triggered.connect(self.generar_hoja_contactos)
+        
+        picos_action = tools_menu.addAction("🔊 Detectar picos de audio")
+        picos_action.triggered.connect(self.detectar_picos_audio)
+        
         # Menú Ayuda
         help_menu = menubar.addMenu("❓ Ayuda")
         
@@ -3298,31 +7178,36 @@ class MatchClipAnalyzer(QMainWindow):
         
         # Lista de clips
         if nom_base not in self.listas_widgets:
-            lw = QListWidget()
+            proxy = CategoriaProxyModel(nom_base, self)
+            proxy.setSourceModel(self.clips)
+            lw = QListView()
+            lw.setModel(proxy)
+            # Filas de alto fijo: la vista solo consulta las que se ven
+            lw.setUniformItemSizes(True)
             lw.setStyleSheet("""
-                QListWidget {
+                QListView {
                     background: #151515;
                     color: white;
                     border: 1px solid #2c3e50;
                     border-radius: 3px;
                     font-family: 'Arial', sans-serif;
                 }
-                QListWidget::item {
+                QListView::item {
                     padding: 5px;
                     border-bottom: 1px solid #2c3e50;
                 }
-                QListWidget::item:selected {
+                QListView::item:selected {
                     background: #3498db;
                     color: white;
                 }
-                QListWidget::item:hover {
+                QListView::item:hover {
                     background: #2c3e50;
                 }
             """)
             lw.setSelectionMode(QAbstractItemView.SelectionMode.MultiSelection)
             lw.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
             lw.customContextMenuRequested.connect(lambda pos, w=lw, n=nom_base: self.menu_contextual(pos, w, n))
-            lw.itemDoubleClicked.connect(self.saltar_a_evento)
+            lw.doubleClicked.connect(lambda index: self.saltar_a_evento(index.data(ClipStore.ROL_CLIP)))
             
             layout.addWidget(lw)
             self.listas_widgets[nom_base] = lw
@@ -3389,7 +7274,7 @@ class MatchClipAnalyzer(QMainWindow):
             if duracion and tipo == "auto":
                 tooltip_text += f"\nDuración automática: {duracion/1000} segundos"
             if tags:
-                tag_names = [TAG_MANAGER.get_tag_by_id(tag_id)["name"] for tag_id in tags if TAG_MANAGER.get_tag_by_id(tag_id)]
+                tag_names = [tag["name"] for tag in map(TAG_MANAGER.get_tag_by_id, tags) if tag]
                 if tag_names:
                     tooltip_text += f"\nEtiquetas: {', '.join(tag_names)}"
             btn.setToolTip(tooltip_text)
@@ -3412,17 +7297,20 @@ class MatchClipAnalyzer(QMainWindow):
         """Prepara una playlist con los clips seleccionados"""
         seleccionados = []
         for nom, lw in self.listas_widgets.items():
-            for i in range(lw.count()):
-                if lw.item(i).isSelected():
-                    seleccionados.append(lw.item(i).data(Qt.ItemDataRole.UserRole))
+            for index in sorted(lw.selectionModel().selectedRows(), key=lambda i: i.row()):
+                seleccionados.append(index.data(ClipStore.ROL_CLIP).to_dict())
         
         if not seleccionados:
             QMessageBox.warning(self, "Sin selección", 
                               "No hay clips seleccionados para la playlist.")
             return
         
+        # No modal: se puede seguir revisando el partido mientras se genera
         dialog = PlaylistDialog(seleccionados, self.video_path, self)
-        dialog.exec()
+        dialog.setAttribute(Qt.WidgetAttribute.WA_DeleteOnClose)
+        dialog.finished.connect(lambda _, d=dialog: self.dialogos_playlist.remove(d))
+        self.dialogos_playlist.append(dialog)
+        dialog.show()
 
     def manejar_evento(self, nom, tipo, carp, col_t, etiquetas, duracion=0):
         """Maneja un evento de botón (corte o marca)"""
@@ -3479,8 +7367,11 @@ class MatchClipAnalyzer(QMainWindow):
         """Registra un nuevo clip"""
         if nom not in self.listas_widgets:
             return
-            
-        l = self.listas_widgets[nom]
+        
+        # Inicio y fin al cambio de plano más cercano (si no colapsan el clip)
+        ini_ajustado, fin_ajustado = self.ajustar_a_escena(ini), self.ajustar_a_escena(fin)
+        if fin_ajustado > ini_ajustado:
+            ini, fin = ini_ajustado, fin_ajustado
         
         # Verificar que el corte tenga duración válida
         if fin <= ini:
@@ -3488,141 +7379,296 @@ class MatchClipAnalyzer(QMainWindow):
                               "El tiempo de fin debe ser mayor que el de inicio.")
             return
         
+        # Aviso (sin interrumpir) si se solapa con otro clip de la misma categoría
+        solapados = [c for c in self.clips.solapados(ini, fin) if c.categoria == nom]
+        
         # Calcular número de clip
-        num_clip = l.count() + 1
+        num_clip = self.clips.conteo(nom) + 1
         nombre_base = nom.replace(" RIVAL", "").replace("_", " ")
         nombre_auto = f"{nombre_base} {num_clip}"
-        tiempo_formateado = self.format_time(ini)
-        
-        # Crear item de lista
-        it = QListWidgetItem(f"[{tiempo_formateado}] {nombre_auto}")
         
-        # Datos del clip
-        data = {
+        # Alta en el almacén (la lista de la categoría y el contador se actualizan solos)
+        clip = self.clips.agregar(ClipRecord({
             "ini": ini, 
             "fin": fin, 
-            "nom": nom, 
-            "tiempo": tiempo_formateado,
+            "categoria": nom, 
             "nombre": nombre_auto,
             "color": col,
-            "categoria": nom,
             "numero": num_clip,
             "tags": etiquetas.copy() if etiquetas else [],
             "notas": ""
-        }
-        
-        it.setData(Qt.ItemDataRole.UserRole, data)
-        it.setForeground(QColor(col))
-        
-        # Tooltip con información
-        tooltip_text = f"{nombre_auto}\n"
-        tooltip_text += f"Tiempo: {tiempo_formateado}\n"
-        tooltip_text += f"Duración: {(fin-ini)/1000:.1f}s"
-        
-        if etiquetas:
-            tag_names = [TAG_MANAGER.get_tag_by_id(tag_id)["name"] 
-                       for tag_id in etiquetas 
-                       if TAG_MANAGER.get_tag_by_id(tag_id)]
-            if tag_names:
-                tooltip_text += f"\nEtiquetas: {', '.join(tag_names)}"
+        }))
         
-        it.setToolTip(tooltip_text)
-        
-        # Agregar a la lista
-        l.addItem(it)
-        
-        # Actualizar contador
-        self.labels_contadores[nom].setText(str(num_clip))
+        self.journal.registrar("alta", clip=clip.to_dict())
         
         # Actualizar timeline
         self.timeline.marks.append((ini, col))
         self.timeline.segmentos.append((ini, fin, col, nombre_auto))
-        self.timeline.update()
+        self.timeline.invalidar()
         
         # Marcar proyecto como modificado
         self.proyecto_modificado = True
         self.actualizar_estado_proyecto()
         
+        if solapados:
+            self.avisar_solapamiento(nombre_auto, solapados)
+        
         # RENDERIZAR EL CLIP INDIVIDUALMENTE
-        self.renderizar_clip_individual(data)
+        self.renderizar_clip_individual(clip.to_dict())
+
+    def actualizar_contadores(self):
+        for nom, lbl in self.labels_contadores.items():
+            lbl.setText(str(self.clips.conteo(nom)))
+
+    def avisar_solapamiento(self, nombre, clips):
+        nombres = ", ".join(c.nombre for c in clips[:3])
+        if len(clips) > 3:
+            nombres += f" y {len(clips) - 3} más"
+        self.statusBar().showMessage(f"⚠️ {nombre} se solapa con: {nombres}", 6000)
+
+    def resaltar_clips_en(self, ms):
+        """Recuadra en el timeline y pone en negrita en las listas los clips bajo el cabezal"""
+        clips = self.clips.en(ms)
+        ids = {c.id for c in clips}
+        if ids == self.clips.resaltados:
+            return
+        self.clips.set_resaltados(ids)
+        self.timeline.set_resaltados([(c.ini, c.fin) for c in clips])
+
+    def seleccionar_clip_en(self, ms, tolerancia):
+        """Clic en el timeline: selecciona en su lista el clip más corto bajo el puntero"""
+        clips = self.clips.solapados(ms - tolerancia, ms + tolerancia)
+        if not clips:
+            return
+        clip = min(clips, key=ClipRecord.duracion)
+        lista = self.listas_widgets.get(clip.categoria)
+        if lista is None:
+            return
+        index = lista.model().mapFromSource(self.clips.index(self.clips.fila(clip)))
+        lista.clearSelection()
+        lista.setCurrentIndex(index)
+        lista.scrollTo(index)
+        self.statusBar().showMessage(f"🎯 {clip.texto()}", 3000)
+
+    def ruta_salida_clip(self, clip_data):
+        """Devuelve la ruta del MP4 de un clip dentro de la carpeta de su categoría"""
+        categoria = clip_data['categoria']
+        for boton in self.config:
+            if boton[0] == categoria and len(boton) > 4:
+                carpeta_nombre = boton[4]
+                break
+        else:
+            carpeta_nombre = categoria
+        
+        path = os.path.join(CARPETA_CORTES, carpeta_nombre)
+        if not os.path.exists(path): 
+            os.makedirs(path, exist_ok=True)
+        
+        nombre_seguro = clip_data['nombre'].replace(' ', '_').replace('/', '_')
+        return os.path.join(path, f"{nombre_seguro}_{int(clip_data['ini'])}.mp4")
+
+    def encolar_corte(self, nombre, ini, fin, out):
+        """Envía un corte a la cola de renderizado"""
+        ffmpeg_path = get_ffmpeg_path()
+        if not ffmpeg_path:
+            raise FileNotFoundError("FFmpeg no está disponible")
+        
+        if self.cortes_precisos and self.media_index:
+            # Un corte preciso ya renderizado se reutiliza desde la caché
+            clave = RenderCache.clave(self.media_index.huella, ini, fin, {"modo": "smartcut-clip"})
+            en_cache = RENDER_CACHE.obtener(clave, fijar=True)
+            if en_cache:
+                try:
+                    enlazar_o_copiar(en_cache, out)
+                finally:
+                    RENDER_CACHE.soltar([clave])
+                self.statusBar().showMessage(f"✅ Clip '{nombre}' recuperado de la caché: {out}", 5000)
+                return None
+            
+            comandos, temporales = construir_cmds_smart_cut(
+                ffmpeg_path, self.video_path, self.media_index, ini, fin, out
+            )
+            job_id = self.render_queue.agregar(nombre, comandos, out, fin - ini, temporales)
+            self.claves_cache[job_id] = clave
+            self.actualizar_estado_renders()
+            return job_id
+        
+        # Con copia directa el clip empieza en un keyframe: arrancar en el
+        # anterior a ini para no perder el inicio ni mostrar frames congelados
+        ini = alinear_a_keyframe(self.video_path, ini)
+        cmd = construir_cmd_corte(ffmpeg_path, self.video_path, ini, fin, out)
+        job_id = self.render_queue.agregar(nombre, [cmd], out, fin - ini)
+        self.actualizar_estado_renders()
+        return job_id
 
     def renderizar_clip_individual(self, clip_data):
-            """Renderiza un clip individual usando FFmpeg"""
+        """Renderiza un clip individual en la cola de FFmpeg"""
+        try:
+            out = self.ruta_salida_clip(clip_data)
+            self.encolar_corte(clip_data['nombre'], clip_data['ini'], clip_data['fin'], out)
+            
+        except Exception as e:
+            self.statusBar().showMessage(
+                f"⚠️ No se pudo renderizar '{clip_data['nombre']}' automáticamente: {e}. "
+                "Puedes intentarlo desde el menú contextual.", 8000
+            )
+
+    def recodificar_keyframes_densos(self):
+        """Genera una copia del video con un keyframe por segundo para cortes más precisos"""
+        if not self.video_path:
+            QMessageBox.warning(self, "Sin video", "Primero abre un video.")
+            return
+        ffmpeg_path = get_ffmpeg_path()
+        if not ffmpeg_path:
+            QMessageBox.critical(self, "Error", "FFmpeg no está disponible.")
+            return
+        
+        base, _ = os.path.splitext(self.video_path)
+        salida = base + "_keyframes.mp4"
+        reply = QMessageBox.question(
+            self, "Keyframes densos",
+            "Se re-codificará el video una sola vez con un keyframe por segundo.\n"
+            "Los cortes con copia directa serán casi exactos a partir de entonces.\n\n"
+            f"Archivo de salida:\n{salida}\n\n¿Continuar?",
+            QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No
+        )
+        if reply != QMessageBox.StandardButton.Yes:
+            return
+        
+        cmd = construir_cmd_keyframes_densos(ffmpeg_path, self.video_path, self.media_index, salida)
+        duracion = self.media_index.duracion_ms if self.media_index else self.player.duration()
+        self.job_keyframes_densos = self.render_queue.agregar(
+            "Keyframes densos: " + os.path.basename(self.video_path), [cmd], salida, duracion
+        )
+        self.actualizar_estado_renders()
+        self.mostrar_cola_renders()
+
+    def usar_video_recodificado(self, salida):
+        """Cambia el video del proyecto por la versión con keyframes densos"""
+        reply = QMessageBox.question(
+            self, "Keyframes densos",
+            f"Video re-codificado:\n{salida}\n\n¿Usarlo como video del proyecto?",
+            QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No
+        )
+        if reply != QMessageBox.StandardButton.Yes:
+            return
+        
+        pos = self.player.position()
+        self.video_path = salida
+        self.player.setSource(QUrl.fromLocalFile(salida))
+        self.player.setPosition(pos)
+        self.indexar_video()
+
+    def renderizar_todos_los_clips(self):
+        """Renderiza todos los clips recorriendo el video una sola vez por lote"""
+        if not self.video_path:
+            QMessageBox.warning(self, "Sin video", "Primero abre un video.")
+            return
+        ffmpeg_path = get_ffmpeg_path()
+        if not ffmpeg_path:
+            QMessageBox.critical(self, "Error", "FFmpeg no está disponible.")
+            return
+        
+        clips = self.clips.a_dicts()
+        if not clips:
+            QMessageBox.warning(self, "Sin clips", "No hay clips para renderizar.")
+            return
+        
+        modos = ["Copia directa (rápido)", "Re-codificar H.264 (preciso)"]
+        modo, ok = QInputDialog.getItem(
+            self, "Renderizar Todos los Clips",
+            f"Se renderizarán {len(clips)} clips en sus carpetas.\nModo:", modos, 0, False
+        )
+        if not ok:
+            return
+        codec = "copy" if modo == modos[0] else "libx264"
+        tiene_audio = bool(self.media_index.acodec) if self.media_index else True
+        
+        # Ordenados por inicio: cada lote es una lectura lineal de un tramo del video
+        clips.sort(key=lambda c: c['ini'])
+        tamano = CLIPS_POR_LOTE_COPIA if codec == "copy" else CLIPS_POR_LOTE_RECODIFICAR
+        lotes = [clips[i:i + tamano] for i in range(0, len(clips), tamano)]
+        # Los lotes van en serie: uno tras otro, sin búsquedas cruzadas en el mismo video
+        for n, lote in enumerate(lotes, 1):
+            tramos = [(c['ini'], c['fin'], self.ruta_salida_clip(c)) for c in lote]
+            cmd = construir_cmd_lote(ffmpeg_path, self.video_path, tramos, self.media_index, codec, tiene_audio)
+            job_id = self.render_queue.agregar(
+                f"Lote {n}/{len(lotes)} ({len(lote)} clips)", [cmd], CARPETA_CORTES,
+                sum(c['fin'] - c['ini'] for c in lote), salidas=[t[2] for t in tramos], en_serie=True
+            )
+            self.jobs_lote.add(job_id)
+        
+        self.actualizar_estado_renders()
+        self.statusBar().showMessage(f"🎬 {len(clips)} clips encolados en {len(lotes)} lotes", 5000)
+        self.mostrar_cola_renders()
+
+    def render_completado(self, job_id, salida):
+        """Notificación no bloqueante de un render terminado"""
+        if self.job_proxy and job_id == self.job_proxy[0]:
+            self.proxy_terminado(salida)
+            return
+        if job_id in self.jobs_captura:
+            self.jobs_captura.discard(job_id)
+            self.statusBar().showMessage(f"📸 Captura exacta guardada: {os.path.basename(salida)}", 4000)
+            return
+        if job_id == self.job_keyframes_densos:
+            self.job_keyframes_densos = None
+            self.usar_video_recodificado(salida)
+            return
+        if job_id in self.jobs_lote:
+            self.jobs_lote.discard(job_id)
+            job = self.render_queue.jobs.get(job_id)
+            nombre = job.nombre if job else "Lote"
+            clips = len(job.salidas) if job else 0
+            self.statusBar().showMessage(f"✅ {nombre} terminado: {clips} clips guardados en {salida}", 5000)
+            return
+        if job_id in self.claves_cache:
             try:
-                # ===== VERIFICAR FFMPEG PRIMERO =====
+                RENDER_CACHE.guardar(self.claves_cache.pop(job_id), salida, mover=False)
+            except OSError:
+                pass
+        job = self.render_queue.jobs.get(job_id)
+        nombre = job.nombre if job else os.path.basename(salida)
+        self.statusBar().showMessage(f"✅ Clip '{nombre}' renderizado: {salida}", 5000)
+
+    def render_fallido(self, job_id, mensaje):
+        """Notificación no bloqueante de un render con error"""
+        if self.job_proxy and job_id == self.job_proxy[0]:
+            self.job_proxy = None
+            self.lbl_proxy.setText("🎞️ Proxy: error")
+            if os.path.exists(self.render_queue.jobs[job_id].salida):
                 try:
-                    ffmpeg_path = get_ffmpeg_path()
-                except FileNotFoundError as e:
-                    QMessageBox.warning(
-                        self, 
-                        "FFmpeg no encontrado",
-                        f"No se puede renderizar clip:\n{str(e)}"
-                    )
-                    return
-                # ====================================
-                
-                # Crear carpeta si no existe
-                categoria = clip_data['categoria']
-                for boton in self.config:
-                    if boton[0] == categoria and len(boton) > 4:
-                        carpeta_nombre = boton[4]
-                        break
-                else:
-                    carpeta_nombre = categoria
-                
-                path = os.path.join(CARPETA_CORTES, carpeta_nombre)
-                if not os.path.exists(path): 
-                    os.makedirs(path, exist_ok=True)
-                
-                # Nombre del archivo de salida
-                nombre_seguro = clip_data['nombre'].replace(' ', '_').replace('/', '_')
-                out = os.path.join(path, f"{nombre_seguro}_{int(clip_data['ini'])}.mp4")
-                
-                # Convertir tiempos a segundos
-                inicio_seg = clip_data['ini'] / 1000.0
-                duracion_seg = (clip_data['fin'] - clip_data['ini']) / 1000.0
-                
-                # Comando FFmpeg
-                cmd = [
-                    ffmpeg_path, "-ss", str(inicio_seg), 
-                    "-i", self.video_path, 
-                    "-t", str(duracion_seg), 
-                    "-c:v", "copy", 
-                    "-c:a", "copy", 
-                    "-y", out
-                ]
-                
-                # Ejecutar en segundo plano
-                if SYS_CONFIG["system"] == "Windows":
-                    subprocess.Popen(cmd, creationflags=subprocess.CREATE_NO_WINDOW)
-                else:
-                    subprocess.Popen(cmd)
-                    
-                QMessageBox.information(
-                    self, "Clip Renderizado", 
-                    f"Clip '{clip_data['nombre']}' renderizado exitosamente.\n"
-                    f"Archivo: {out}"
-                )
-                
-            except Exception as e:
-                QMessageBox.warning(
-                    self, "Advertencia", 
-                    f"No se pudo renderizar el clip automáticamente:\n{str(e)}\n"
-                    "Puedes intentarlo manualmente desde el menú contextual."
-                )           
+                    os.remove(self.render_queue.jobs[job_id].salida)
+                except:
+                    pass
+        self.claves_cache.pop(job_id, None)
+        self.jobs_captura.discard(job_id)
+        self.jobs_lote.discard(job_id)
+        job = self.render_queue.jobs.get(job_id)
+        nombre = job.nombre if job else ""
+        self.statusBar().showMessage(f"❌ Error al renderizar '{nombre}': {mensaje[:150]}", 10000)
+
+    def actualizar_estado_renders(self, *args):
+        """Muestra en la barra de estado cuántos renders hay en curso"""
+        activos = self.render_queue.activos()
+        en_espera = self.render_queue.en_espera()
+        if activos or en_espera:
+            self.lbl_renders.setText(f"🎬 Renders: {activos} en curso, {en_espera} en espera")
+        else:
+            self.lbl_renders.setText("")
+
+    def mostrar_cola_renders(self):
+        """Muestra el panel de la cola de renderizado"""
+        if self.dialogo_renders is None:
+            self.dialogo_renders = RenderQueueDialog(self.render_queue, self)
+        self.dialogo_renders.show()
+        self.dialogo_renders.raise_()
 
     def actualizar_timeline_segmentos(self):
         """Actualiza los segmentos en el timeline"""
-        self.timeline.segmentos = []
-        for nom, lw in self.listas_widgets.items():
-            for i in range(lw.count()):
-                data = lw.item(i).data(Qt.ItemDataRole.UserRole)
-                if data:
-                    self.timeline.segmentos.append(
-                        (data['ini'], data['fin'], data.get('color', '#3498db'), 
-                         data.get('nombre', 'Clip'))
-                    )
-        self.timeline.update()
+        self.timeline.segmentos = [(c.ini, c.fin, c.color, c.nombre) for c in self.clips.cronologico()]
+        self.resaltar_clips_en(self.player.position())
+        self.timeline.invalidar()
 
     def limpiar_listas_huérfanas(self):
         """Elimina listas de categorías que ya no existen en la configuración"""
@@ -3646,32 +7692,8 @@ class MatchClipAnalyzer(QMainWindow):
         # Nombre del archivo de salida
         out = os.path.join(path, f"{n}_{int(s)}.mp4")
         
-        # Convertir tiempos a segundos
-        inicio_seg = s / 1000.0
-        duracion_seg = d / 1000.0
-        
-        # Comando FFmpeg
-        ffmpeg_path = get_ffmpeg_path()
-        cmd = [
-            ffmpeg_path, "-ss", str(inicio_seg), 
-            "-i", self.video_path, 
-            "-t", str(duracion_seg), 
-            "-c:v", "copy", 
-            "-c:a", "copy", 
-            "-y", out
-        ]
-        
         try:
-            if SYS_CONFIG["system"] == "Windows":
-                subprocess.Popen(cmd, creationflags=subprocess.CREATE_NO_WINDOW)
-            else:
-                subprocess.Popen(cmd)
-                
-            QMessageBox.information(
-                self, "Clip Renderizado", 
-                f"Clip '{n}' renderizado exitosamente.\n"
-                f"Archivo: {out}"
-            )
+            self.encolar_corte(n, s, s + d, out)
         except Exception as e:
             QMessageBox.critical(
                 self, "Error FFmpeg", 
@@ -3700,8 +7722,10 @@ class MatchClipAnalyzer(QMainWindow):
         
         if file: 
             self.video_path = file
+            self.journal.registrar("video", ruta=file)
             self.player.setSource(QUrl.fromLocalFile(file))
             self.player.play()
+            self.indexar_video()
             
             # ===== AGREGAR ESTO =====
             self.setFocus()  # Asegurar que la ventana tenga el foco
@@ -3714,6 +7738,364 @@ class MatchClipAnalyzer(QMainWindow):
                 self.nombre_proyecto_actual = f"Proyecto_{nombre_base}"
                 self.actualizar_estado_proyecto()
 
+    def indexar_video(self):
+        """Carga o genera en segundo plano el índice de keyframes del video"""
+        # Quien llama acaba de poner el original en el reproductor
+        self.proxy_activo = None
+        self.lbl_proxy.setText("")
+        self.detener_decodificador()
+        self.media_index = MEDIA_INDEX.obtener(self.video_path)
+        if self.media_index:
+            self.timeline.frame_ms = self.media_index.frame_ms()
+            self.preparar_proxy()
+            self.iniciar_decodificador()
+            self.cargar_filmstrip()
+            self.cargar_envolvente()
+            self.detectar_escenas()
+        if self.media_index or not self.video_path:
+            return
+        
+        self.statusBar().showMessage("🔎 Indexando keyframes del video...")
+        self.probe_worker = MediaProbeWorker(self.video_path)
+        self.probe_worker.finished.connect(self.indice_listo)
+        self.probe_worker.error.connect(
+            lambda path, msg: self.statusBar().showMessage(f"⚠️ No se pudo indexar el video: {msg[:150]}", 8000)
+        )
+        self.probe_worker.start()
+
+    def indice_listo(self, video_path, indice):
+        """Recibe el índice generado por MediaProbeWorker"""
+        if video_path != self.video_path:
+            return
+        self.media_index = indice
+        tipo = "VFR" if indice.vfr else f"{indice.fps:.3f} fps"
+        self.statusBar().showMessage(
+            f"✅ Video indexado: {len(indice.keyframes)} keyframes, {tipo}", 5000
+        )
+        self.timeline.frame_ms = indice.frame_ms()
+        self.preparar_proxy()
+        self.iniciar_decodificador()
+        self.cargar_filmstrip()
+        self.cargar_envolvente()
+        self.detectar_escenas()
+
+    def cambiar_frame_exacto(self, activo):
+        if activo and not HAS_NUMPY:
+            QMessageBox.warning(self, "Frame exacto", "El paso de frame exacto necesita NumPy:\npip install numpy")
+            self.sender().setChecked(False)
+            return
+        self.frame_exacto = activo
+        guardar_config({"frame_exacto": activo})
+        if activo:
+            self.iniciar_decodificador()
+        else:
+            self.detener_decodificador()
+
+    def iniciar_decodificador(self):
+        """Arranca el decodificador de frames exactos del video abierto"""
+        if not self.frame_exacto or self.decodificador:
+            return
+        if not self.media_index or not self.media_index.vcodec or not get_ffmpeg_path():
+            return
+        # Siempre el original: con el proxy activo los frames salen igual a resolución completa
+        self.decodificador = FrameDecoder(self.video_path, self.media_index)
+        self.decodificador.frame_listo.connect(self.frame_decodificado)
+        self.decodificador.error.connect(
+            lambda m: self.statusBar().showMessage(f"⚠️ Decodificación de frames: {m}", 8000)
+        )
+        self.decodificador.start()
+
+    def detener_decodificador(self):
+        self.ocultar_frame_exacto()
+        if self.decodificador:
+            self.decodificador.detener()
+            self.decodificador.wait()
+            self.decodificador.deleteLater()
+            self.decodificador = None
+
+    def mostrar_frame_exacto(self, frame):
+        """Pausa y muestra el frame indicado desde la caché; si no está, lo pide y lo muestra al llegar"""
+        self.player.pause()
+        self.btn_play_pause.setText("▶️")
+        frame = max(0, min(frame, self.decodificador.total - 1))
+        self.frame_mostrado = frame
+        self.player.setPosition(int(math.ceil(self.media_index.tiempo_frame(frame))))
+        # Se pide siempre, aunque esté en caché, para seguir precargando alrededor
+        self.decodificador.solicitar(frame)
+        imagen = self.decodificador.cache.obtener(frame)
+        if imagen is not None:
+            self.frame_esperado = None
+            self.frame_view.mostrar(imagen)
+            self.video_stack.setCurrentWidget(self.frame_view)
+        else:
+            self.frame_esperado = frame
+            self.video_stack.setCurrentWidget(self.video_widget)
+
+    def frame_decodificado(self, frame):
+        if frame != self.frame_esperado or not self.decodificador:
+            return
+        imagen = self.decodificador.cache.obtener(frame)
+        if imagen is not None:
+            self.frame_esperado = None
+            self.frame_view.mostrar(imagen)
+            self.video_stack.setCurrentWidget(self.frame_view)
+
+    def ocultar_frame_exacto(self):
+        self.frame_mostrado = None
+        self.frame_esperado = None
+        self.video_stack.setCurrentWidget(self.video_widget)
+
+    def estado_reproduccion(self, estado):
+        if estado == QMediaPlayer.PlaybackState.PlayingState:
+            self.ocultar_frame_exacto()
+
+    def cambiar_uso_proxies(self, activo):
+        self.usar_proxies = activo
+        guardar_config({"usar_proxies": activo})
+        if activo:
+            self.preparar_proxy()
+        else:
+            if self.job_proxy:
+                self.render_queue.cancelar(self.job_proxy[0])
+                self.job_proxy = None
+            self.cambiar_fuente_reproductor(self.video_path)
+            self.proxy_activo = None
+            self.lbl_proxy.setText("")
+
+    def preparar_proxy(self):
+        """Usa el proxy del video si ya existe; si no, lo encola en la cola de renders"""
+        if not self.usar_proxies or not self.media_index or not self.media_index.vcodec:
+            return
+        final = ruta_proxy(self.media_index.huella)
+        if os.path.exists(final):
+            self.activar_proxy(final)
+            return
+        if self.job_proxy and self.job_proxy[1] == self.video_path:
+            return
+        
+        ffmpeg_path = get_ffmpeg_path()
+        if not ffmpeg_path:
+            return
+        os.makedirs(CARPETA_PROXIES, exist_ok=True)
+        # Se escribe aparte y se renombra al terminar: un proxy a medias nunca se usa
+        temp = final[:-4] + ".part.mp4"
+        cmd = construir_cmd_proxy(ffmpeg_path, self.video_path, temp, bool(self.media_index.acodec))
+        job_id = self.render_queue.agregar(
+            "Proxy: " + os.path.basename(self.video_path), [cmd], temp,
+            self.media_index.duracion_ms, salidas=[temp]
+        )
+        self.job_proxy = (job_id, self.video_path, final)
+        self.lbl_proxy.setText("🎞️ Proxy: en cola")
+
+    def proxy_progreso(self, job_id, valor):
+        if self.job_proxy and job_id == self.job_proxy[0]:
+            self.lbl_proxy.setText(f"🎞️ Proxy: {valor}%")
+
+    def proxy_estado(self, job_id, estado):
+        # Cancelado desde el panel de renders: el video sigue con el original
+        if self.job_proxy and job_id == self.job_proxy[0] and estado == RenderJob.CANCELADO:
+            self.job_proxy = None
+            self.lbl_proxy.setText("")
+
+    def proxy_terminado(self, salida):
+        """Renombra el proxy recién generado y, si es del video abierto, lo activa"""
+        _, video, final = self.job_proxy
+        self.job_proxy = None
+        try:
+            os.replace(salida, final)
+        except OSError as e:
+            self.lbl_proxy.setText("")
+            self.statusBar().showMessage(f"⚠️ No se pudo guardar el proxy: {e}", 8000)
+            return
+        if video == self.video_path and self.usar_proxies:
+            self.activar_proxy(final)
+
+    def cambiar_fuente_reproductor(self, ruta):
+        """Cambia el archivo del reproductor conservando posición y estado"""
+        pos = self.player.position()
+        reproduciendo = self.player.playbackState() == QMediaPlayer.PlaybackState.PlayingState
+        self.player.setSource(QUrl.fromLocalFile(ruta))
+        self.player.setPosition(pos)
+        if reproduciendo:
+            self.player.play()
+        else:
+            self.player.pause()
+
+    def activar_proxy(self, ruta):
+        """Reproducción, búsqueda y paso de frame sobre el proxy; los cortes siguen usando el original"""
+        if self.proxy_activo == ruta:
+            return
+        self.cambiar_fuente_reproductor(ruta)
+        self.proxy_activo = ruta
+        self.lbl_proxy.setText("🎞️ Proxy activo")
+
+    def detectar_escenas(self):
+        """Detecta en segundo plano los cambios de plano si el sidecar aún no los tiene"""
+        if not self.media_index or self.media_index.cortes_escena is not None or not self.media_index.vcodec:
+            return
+        if self.escenas_worker and self.escenas_worker.isRunning():
+            return
+        self.escenas_worker = SceneDetectWorker(self.video_path)
+        self.escenas_worker.finished.connect(self.escenas_listas)
+        self.escenas_worker.error.connect(
+            lambda path, msg: self.statusBar().showMessage(f"⚠️ No se detectaron cambios de plano: {msg[:150]}", 8000)
+        )
+        self.escenas_worker.start()
+
+    def escenas_listas(self, video_path, indice):
+        if video_path != self.video_path:
+            self.detectar_escenas()
+            return
+        self.media_index = indice
+        self.statusBar().showMessage(f"🎬 {len(indice.cortes_escena)} cambios de plano detectados", 5000)
+
+    def cambiar_ajuste_escena(self, activo):
+        self.ajuste_escena = activo
+        guardar_config({"ajuste_escena": activo})
+
+    def ajustar_a_escena(self, ms):
+        """ms llevado al cambio de plano más cercano, si el ajuste está activo y hay uno cerca"""
+        if not self.ajuste_escena or not self.media_index:
+            return ms
+        corte = self.media_index.corte_cercano(ms, self.tolerancia_escena_ms)
+        return ms if corte is None else corte
+
+    def filmstrip_fallida(self, video_path, msg):
+        if video_path == self.video_path:
+            self.timeline.set_filmstrip(None)
+        self.statusBar().showMessage(f"⚠️ Sin miniaturas: {msg[:150]}", 8000)
+
+    def detener_filmstrip(self):
+        """Cancela la extracción de miniaturas en curso (mata sus FFmpeg)"""
+        if self.filmstrip_worker and self.filmstrip_worker.isRunning():
+            self.filmstrip_worker.cancelar()
+            self.filmstrip_worker.wait()
+        self.filmstrip_worker = None
+
+    def cargar_filmstrip(self):
+        """Tira de miniaturas del timeline: de la caché o generada en segundo plano"""
+        if (self.filmstrip_worker and self.filmstrip_worker.isRunning()
+                and self.filmstrip_worker.video_path == self.video_path):
+            return
+        self.detener_filmstrip()
+        indice = self.media_index
+        if not indice or not indice.duracion_ms or not indice.vcodec:
+            self.timeline.set_filmstrip(None)
+            return
+        
+        tira = FILMSTRIP_CACHE.obtener(indice.huella)
+        if tira is None:
+            # Tira vacía que se muestra mientras el worker la va rellenando
+            try:
+                tira = FILMSTRIP_CACHE.nueva(indice.huella, indice.duracion_ms)
+            except OSError:
+                return
+            self.filmstrip_worker = FilmstripWorker(self.video_path, indice.huella, tira)
+            self.filmstrip_worker.progreso.connect(lambda _: self.timeline.redibujar())
+            self.filmstrip_worker.error.connect(self.filmstrip_fallida)
+            self.filmstrip_worker.start()
+        self.timeline.set_filmstrip(tira)
+
+    def detener_envolvente(self):
+        if self.envolvente_worker and self.envolvente_worker.isRunning():
+            self.envolvente_worker.cancelar()
+            self.envolvente_worker.wait()
+        self.envolvente_worker = None
+
+    def cargar_envolvente(self):
+        """Envolvente de volumen del audio: de la caché o calculada en segundo plano"""
+        if (self.envolvente_worker and self.envolvente_worker.isRunning()
+                and self.envolvente_worker.video_path == self.video_path):
+            return
+        self.detener_envolvente()
+        self.timeline.picos = []
+        self.timeline.pico_actual = -1
+        indice = self.media_index
+        if not HAS_NUMPY or not indice or not indice.acodec:
+            self.timeline.set_envolvente(None)
+            return
+        
+        envolvente = AUDIO_ENVELOPES.obtener(indice.huella)
+        if envolvente is not None:
+            self.envolvente_lista(self.video_path, envolvente)
+            return
+        self.timeline.set_envolvente(None)
+        self.envolvente_worker = AudioEnvelopeWorker(self.video_path, indice.huella, indice.duracion_ms)
+        self.envolvente_worker.finished.connect(self.envolvente_lista)
+        self.envolvente_worker.error.connect(
+            lambda path, msg: self.statusBar().showMessage(f"⚠️ Sin onda de audio: {msg[:150]}", 8000)
+        )
+        self.envolvente_worker.start()
+
+    def envolvente_lista(self, video_path, envolvente):
+        if video_path != self.video_path:
+            return
+        self.timeline.set_envolvente(envolvente)
+
+    def detectar_picos_audio(self):
+        """Propone como candidatos los picos de ruido del público"""
+        if self.timeline.envolvente is None:
+            if not HAS_NUMPY:
+                QMessageBox.warning(self, "Sin NumPy", "La detección de picos de audio necesita NumPy.")
+            else:
+                QMessageBox.warning(self, "Sin audio",
+                                    "La envolvente de audio no está disponible (¿video sin audio o aún calculándose?).")
+            return
+        
+        dialog = PicosAudioDialog([c[0] for c in self.config], self.picos_config, self)
+        if not dialog.exec():
+            return
+        self.picos_config = dialog.valores()
+        picos = detectar_picos(self.timeline.envolvente, self.picos_config["umbral_db"],
+                               self.picos_config["separacion_ms"])
+        self.timeline.picos = picos
+        self.timeline.pico_actual = -1
+        self.timeline.invalidar()
+        if not picos:
+            self.statusBar().showMessage("🔊 Ningún pico supera el umbral", 5000)
+            return
+        self.ir_a_pico(1)
+
+    def ir_a_pico(self, direccion):
+        """Salta al candidato siguiente (1) o anterior (-1), empezando antes de la jugada"""
+        picos = self.timeline.picos
+        if not picos:
+            return
+        n = max(0, min(len(picos) - 1, self.timeline.pico_actual + direccion))
+        self.timeline.pico_actual = n
+        self.timeline.invalidar()
+        ms = picos[n][0]
+        self.player.setPosition(max(0, ms - self.picos_config["pre_ms"]))
+        self.statusBar().showMessage(
+            f"🔊 Pico {n+1}/{len(picos)} (+{picos[n][1]:.1f} dB) · "
+            f"AvPág/RePág: navegar · Enter: añadir a {self.picos_config['categoria']} · Supr: descartar"
+        )
+
+    def resolver_pico(self, aceptar):
+        """Acepta el candidato actual como clip de la categoría elegida, o lo descarta"""
+        picos = self.timeline.picos
+        n = self.timeline.pico_actual
+        if not (0 <= n < len(picos)):
+            return
+        ms = picos.pop(n)[0]
+        if aceptar:
+            categoria = self.picos_config["categoria"]
+            for c in self.config:
+                if c[0] == categoria:
+                    fin = ms + self.picos_config["post_ms"]
+                    if self.media_index and self.media_index.duracion_ms:
+                        fin = min(fin, self.media_index.duracion_ms)
+                    self.registrar(max(0, ms - self.picos_config["pre_ms"]), fin, categoria,
+                                   c[5], c[7] if len(c) > 7 else [])
+                    break
+        self.timeline.pico_actual = n - 1
+        if picos:
+            self.ir_a_pico(1)
+        else:
+            self.timeline.pico_actual = -1
+            self.timeline.invalidar()
+            self.statusBar().showMessage("🔊 Revisión de picos terminada", 5000)
+
     def manejar_evento_idx(self, idx):
         """Maneja evento por índice de botón"""
         if idx < len(self.config):
@@ -3746,41 +8128,51 @@ class MatchClipAnalyzer(QMainWindow):
 
     def actualizar_pos(self, p):
         """Actualiza posición del reproductor"""
-        self.timeline.position = p
-        self.timeline.update()
+        # Cualquier salto que no sea el del frame exacto devuelve la vista al reproductor
+        if self.frame_mostrado is not None:
+            if abs(p - self.media_index.tiempo_frame(self.frame_mostrado)) > self.media_index.frame_ms():
+                self.ocultar_frame_exacto()
+        if self.player.playbackState() == QMediaPlayer.PlaybackState.PlayingState:
+            self.timeline.seguir(p)
+        self.timeline.mover_cabezal(p)
+        self.resaltar_clips_en(p)
         self.btn_timer.setText(f"{self.format_time(p)} / {self.format_time(self.player.duration())}")
         # Actualizar label de tiempo
         self.time_label.setText(f"{p//60000:02d}:{(p%60000)//1000:02d}.{p%1000:03d}")
 
     def actualizar_dur(self, d):
         """Actualiza duración del video"""
-        self.timeline.duration = d
-        self.cambiar_zoom(self.zoom_slider.value())
+        self.timeline.set_duracion(d)
 
     def cambiar_zoom(self, val):
         """Cambia el zoom del timeline"""
-        self.timeline.setFixedWidth(int(self.scroll_timeline.width() * (val / 10.0)))
+        self.timeline.set_nivel_zoom(val)
 
         # **AGREGA ESTO:** Devolver foco después de cambiar zoom
         self.setFocus()
 
-    def saltar_a_evento(self, item):
+    def sincronizar_vista_timeline(self):
+        """Lleva la barra y el deslizador de zoom a la vista actual del timeline"""
+        visibles = int(self.timeline.ms_visibles())
+        self.barra_timeline.blockSignals(True)
+        self.barra_timeline.setRange(0, max(0, self.timeline.duration - visibles))
+        self.barra_timeline.setPageStep(max(1, visibles))
+        self.barra_timeline.setSingleStep(max(1, visibles // 20))
+        self.barra_timeline.setValue(int(self.timeline.inicio_ms))
+        self.barra_timeline.blockSignals(False)
+        self.zoom_slider.blockSignals(True)
+        self.zoom_slider.setValue(self.timeline.nivel_zoom())
+        self.zoom_slider.blockSignals(False)
+
+    def saltar_a_evento(self, clip):
         """Salta a la posición de un evento"""
-        data = item.data(Qt.ItemDataRole.UserRole)
-        if data:
-            self.player.setPosition(data['ini'])
+        if clip:
+            self.player.setPosition(int(clip.ini))
             self.player.play()
 
     def format_time(self, ms):
         """Formatea milisegundos a HH:MM:SS o MM:SS"""
-        s = int(ms // 1000)
-        horas = s // 3600
-        minutos = (s % 3600) // 60
-        segundos = s % 60
-        
-        if horas > 0:
-            return f"{horas:02d}:{minutos:02d}:{segundos:02d}"
-        return f"{minutos:02d}:{segundos:02d}"
+        return formatear_tiempo(ms)
 
     def toggle_panel(self):
         """Muestra/oculta el panel derecho"""
@@ -3801,80 +8193,101 @@ class MatchClipAnalyzer(QMainWindow):
         self.diagrama_tactico.raise_()
 
     def capturar_pantalla(self):
-        """Captura usando FFmpeg"""
+        """Captura el frame que se está mostrando; FFmpeg queda como respaldo"""
         if not self.video_path: 
             QMessageBox.warning(self, "Sin video", "Primero carga un video.")
             return
         
+        tiempo_ms = self.player.position()
+        nombre = ruta_captura(tiempo_ms)
+        exacta = bool(QApplication.keyboardModifiers() & Qt.KeyboardModifier.ShiftModifier)
+        
+        # Frame ya decodificado por el reproductor: sin procesos ni esperas
+        # (con el proxy activo ese frame es de baja resolución: se usa FFmpeg)
+        if not exacta and not self.proxy_activo:
+            frame = self.video_widget.videoSink().videoFrame()
+            if frame.isValid():
+                margen = max(100, 3 * self.media_index.frame_ms()) if self.media_index else 250
+                inicio = frame.startTime()
+                if inicio < 0 or abs(inicio // 1000 - tiempo_ms) <= margen:
+                    imagen = frame.toImage()
+                    if not imagen.isNull():
+                        self.capturas.guardar(imagen, nombre, tiempo_ms)
+                        return
+        
+        # Respaldo: FFmpeg en la cola de renders (frame exacto, resolución completa)
         try:
-            # ===== VERIFICAR FFMPEG =====
-            try:
-                ffmpeg_path = get_ffmpeg_path()
-            except FileNotFoundError as e:
-                QMessageBox.warning(
-                    self,
-                    "FFmpeg no encontrado",
-                    f"No se puede capturar pantalla:\n{str(e)}"
-                )
-                return
-            # ============================
-            # Tiempo actual en segundos
-            tiempo_segundos = self.player.position() / 1000.0
-            
-            # Crear carpeta si no existe
-            os.makedirs(CARPETA_CAPTURAS, exist_ok=True)
-            
-            # Nombre del archivo
-            timestamp = int(time.time())
-            tiempo_ms = self.player.position()
-            minutos = tiempo_ms // 60000
-            segundos = (tiempo_ms % 60000) // 1000
-            
-            nombre = os.path.join(
-                CARPETA_CAPTURAS, 
-                f"frame_{minutos:02d}_{segundos:02d}_{timestamp}.jpg"
+            ffmpeg_path = get_ffmpeg_path()
+        except FileNotFoundError as e:
+            QMessageBox.warning(
+                self,
+                "FFmpeg no encontrado",
+                f"No se puede capturar pantalla:\n{str(e)}"
             )
-            
-            # Comando FFmpeg para extraer frame exacto
+            return
+        os.makedirs(CARPETA_CAPTURAS, exist_ok=True)
+        job_id = self.render_queue.agregar(
+            f"📸 Captura {self.format_time(tiempo_ms)}",
+            [construir_cmd_captura(ffmpeg_path, self.video_path, tiempo_ms, nombre)], nombre
+        )
+        self.jobs_captura.add(job_id)
 
-            cmd = [
-                ffmpeg_path,
-                "-ss", str(tiempo_segundos),      # Ir al tiempo exacto
-                "-i", self.video_path,           # Archivo de entrada
-                "-vframes", "1",                 # Solo 1 frame
-                "-q:v", "2",                     # Calidad (2 = alta calidad)
-                "-y",                            # Sobrescribir si existe
-                nombre                           # Archivo de salida
-            ]
-            
-            # DEBUG: Mostrar comando
-            print("Ejecutando FFmpeg:", " ".join(cmd))
-            
-            # Ejecutar FFmpeg
-            result = subprocess.run(
-                cmd, 
-                capture_output=True, 
-                text=True,
-                timeout=10
-            )
-            
-            if result.returncode == 0 and os.path.exists(nombre):
-                QMessageBox.information(
-                    self, "✅ Captura exitosa", 
-                    f"📸 Frame extraído con FFmpeg:\n{nombre}\n"
-                    f"⏱️ Tiempo: {minutos:02d}:{segundos:02d}"
-                )
-            else:
-                error_msg = result.stderr[:300] if result.stderr else "Error desconocido"
-                QMessageBox.warning(
-                    self, "Error FFmpeg", 
-                    f"No se pudo extraer frame:\n{error_msg}"
-                )
-                
-        except subprocess.TimeoutExpired:
-            QMessageBox.warning(self, "Timeout", "FFmpeg tardó demasiado")
-        except Exception as e:
-            QMessageBox.warning(self, "Error", f"Error: {str(e)}")
+    def generar_hoja_contactos(self):
+        """Un fotograma de cada clip, extraídos en una sola pasada y montados en hojas"""
+        if not self.video_path:
+            QMessageBox.warning(self, "Sin video", "Primero abre un video.")
+            return
+        if self.hoja_worker and self.hoja_worker.isRunning():
+            QMessageBox.information(self, "Hoja de contactos", "Ya se está generando una hoja de contactos.")
+            return
+        
+        clips = self.clips.a_dicts()
+        if not clips:
+            QMessageBox.warning(self, "Sin clips", "No hay clips para la hoja de contactos.")
+            return
+        
+        dialog = HojaContactosDialog(self)
+        if not dialog.exec():
+            return
+        pdf = dialog.formato_combo.currentData()
+        if pdf and not HAS_REPORTLAB:
+            QMessageBox.warning(self, "Sin reportlab", "Para generar el PDF instala reportlab.")
+            return
+        punto = dialog.punto_combo.currentData()
+        desplazamiento = dialog.desplazamiento_spin.value() * 1000
+        
+        # Orden cronológico: las hojas siguen el partido
+        entradas = []
+        for clip in sorted(clips, key=lambda c: c['ini']):
+            ms = tiempo_representativo(clip, punto, desplazamiento)
+            lineas = [clip.get('nombre', 'Clip'), f"{self.format_time(ms)} · {clip.get('categoria', '')}"]
+            tags = [tag["name"] for tag in map(TAG_MANAGER.get_tag_by_id, clip.get('tags', [])) if tag]
+            if tags:
+                lineas.append(", ".join(tags))
+            entradas.append((ms, lineas))
+        
+        carpeta = os.path.join(CARPETA_EXPORT, f"contactos_{time.strftime('%Y%m%d_%H%M%S')}")
+        self.hoja_worker = HojaContactosWorker(self.video_path, entradas, carpeta, pdf)
+        self.hoja_worker.progress.connect(
+            lambda v: self.statusBar().showMessage(f"🖼️ Hoja de contactos: {v}%")
+        )
+        self.hoja_worker.finished.connect(self.hoja_contactos_lista)
+        self.hoja_worker.error.connect(
+            lambda msg: QMessageBox.critical(self, "Error", f"No se pudo generar la hoja de contactos:\n{msg}")
+        )
+        self.hoja_worker.start()
+
+    def hoja_contactos_lista(self, rutas):
+        self.statusBar().showMessage(f"🖼️ Hoja de contactos lista ({len(rutas)} archivos)", 5000)
+        QMessageBox.information(
+            self, "Hoja de Contactos",
+            f"Se generaron {len(rutas)} archivos en:\n{os.path.dirname(rutas[0])}"
+        )
+
+    def captura_guardada(self, ruta, tiempo_ms):
+        self.statusBar().showMessage(
+            f"📸 Captura {self.format_time(tiempo_ms)} guardada: {os.path.basename(ruta)}", 4000
+        )
 
     def ir_a_tiempo_manual(self):
         """Salta a un tiempo específico"""
@@ -3932,6 +8345,8 @@ class MatchClipAnalyzer(QMainWindow):
             )
             if reply == QMessageBox.StandardButton.Yes:
                 self.guardar_proyecto()
+            elif reply == QMessageBox.StandardButton.No:
+                self.journal.descartar()
             elif reply == QMessageBox.StandardButton.Cancel:
                 return
         
@@ -3949,16 +8364,13 @@ class MatchClipAnalyzer(QMainWindow):
             self.proyecto_modificado = True
             
             # Limpiar clips
-            for lw in self.listas_widgets.values():
-                lw.clear()
-            
-            for lbl in self.labels_contadores.values():
-                lbl.setText("0")
+            self.clips.limpiar()
+            self.timeline.set_resaltados([])
             
             # Limpiar timeline
             self.timeline.marks = []
             self.timeline.segmentos = []
-            self.timeline.update()
+            self.timeline.invalidar()
             
             # Limpiar formaciones
             self.gestor_formaciones.formaciones_guardadas = []
@@ -3966,6 +8378,15 @@ class MatchClipAnalyzer(QMainWindow):
             # Actualizar estado
             self.actualizar_estado_proyecto()
             
+            # Diario de ediciones nuevo y primera copia del .mca, para poder
+            # recuperar el proyecto aunque se cierre antes del primer guardado
+            # (si ya existe uno con ese nombre, no se pisa hasta guardar)
+            if not os.path.exists(os.path.join(CARPETA_PROYECTOS, nombre, f"{nombre}.mca")):
+                self.journal.abrir(nombre, nuevo=True)
+                self.guardar_proyecto(silencioso=True)
+            else:
+                self.journal.cerrar()
+            
             # Preguntar por video
             reply = QMessageBox.question(
                 self, "Cargar Video",
@@ -3976,50 +8397,84 @@ class MatchClipAnalyzer(QMainWindow):
             if reply == QMessageBox.StandardButton.Yes:
                 self.abrir_archivo()
 
-    def guardar_proyecto(self):
-        """Guarda el proyecto actual"""
+    def guardar_proyecto(self, silencioso=False):
+        """Guarda el proyecto actual en segundo plano (silencioso: sin mensaje al terminar)"""
         if not self.nombre_proyecto_actual:
             self.guardar_proyecto_como()
             return
         
+        # Ya hay un guardado en marcha: se repite al terminar, con el estado de entonces
+        if self.guardador is not None and self.guardador.isRunning():
+            self.guardado_pendiente = True
+            return
+        
+        # Guardar como: el diario pasa al proyecto nuevo
+        if self.journal.nombre != self.nombre_proyecto_actual:
+            self.journal.abrir(self.nombre_proyecto_actual, nuevo=True)
+        
         # Recolectar todos los clips
-        cortes = []
-        for nom, lw in self.listas_widgets.items():
-            for i in range(lw.count()):
-                data = lw.item(i).data(Qt.ItemDataRole.UserRole)
-                if data:
-                    cortes.append(data)
-        
-        # Metadata del proyecto
-        metadata = {
-            "total_clips": len(cortes),
+        clips = self.clips.a_compacto()
+        
+        # Metadata del proyecto (copia: el hilo la serializa mientras se sigue editando)
+        metadata = copy.deepcopy({
+            "total_clips": len(self.clips),
             "video_duracion": self.player.duration(),
             "fecha_modificacion": time.strftime("%Y-%m-d %H:%M:%S"),
             "formaciones_guardadas": self.gestor_formaciones.formaciones_guardadas,
             "equipos": self.equipos,
             "config_botones": self.config
-        }
+        })
         
-        # Guardar proyecto
-        try:
-            proyecto_file = ProyectoManager.guardar_proyecto(
-                self.nombre_proyecto_actual,
-                self.video_path,
-                cortes,
-                self.config,
-                metadata
-            )
-            
-            self.proyecto_actual = proyecto_file
-            self.proyecto_modificado = False
-            self.actualizar_estado_proyecto()
-            
+        # Guardar proyecto (el .mca incluye hasta la última operación del diario)
+        self.guardador = ProyectoSaver(
+            self.journal,
+            self.nombre_proyecto_actual,
+            self.video_path,
+            clips,
+            copy.deepcopy(self.config),
+            metadata,
+            self.journal.seq
+        )
+        self.guardador.terminado.connect(lambda archivo: self.proyecto_guardado(archivo, silencioso))
+        self.guardador.error.connect(self.error_guardado)
+        
+        self.proyecto_modificado = False
+        self.actualizar_estado_proyecto()
+        self.statusBar().showMessage("💾 Guardando proyecto...")
+        self.guardador.start()
+
+    def journal_fallido(self, mensaje):
+        # La edición queda solo en memoria hasta el próximo guardado completo
+        self.statusBar().showMessage(f"⚠️ No se pudo escribir el diario de ediciones ({mensaje}): guarda el proyecto")
+
+    def proyecto_guardado(self, proyecto_file, silencioso):
+        self.proyecto_actual = proyecto_file
+        self.statusBar().showMessage(f"💾 Proyecto '{self.nombre_proyecto_actual}' guardado", 3000)
+        
+        if self.guardado_pendiente:
+            self.guardado_pendiente = False
+            self.guardar_proyecto(silencioso=True)
+        elif not silencioso:
             QMessageBox.information(self, "Proyecto Guardado", 
                                   f"Proyecto '{self.nombre_proyecto_actual}' guardado exitosamente.")
-            
-        except Exception as e:
-            QMessageBox.critical(self, "Error al guardar", 
-                               f"No se pudo guardar el proyecto:\n{str(e)}")
+
+    def error_guardado(self, mensaje):
+        # Las ediciones siguen en el diario; el proyecto queda como modificado
+        self.guardado_pendiente = False
+        self.proyecto_modificado = True
+        self.actualizar_estado_proyecto()
+        self.statusBar().clearMessage()
+        QMessageBox.critical(self, "Error al guardar", 
+                           f"No se pudo guardar el proyecto:\n{mensaje}")
+
+    def esperar_guardado(self):
+        """Espera a que termine el guardado en curso (al cerrar la aplicación)"""
+        if self.guardador is not None and self.guardador.isRunning():
+            self.guardador.wait()
+        if self.guardado_pendiente:
+            self.guardado_pendiente = False
+            self.guardar_proyecto(silencioso=True)
+            self.guardador.wait()
 
     def guardar_proyecto_como(self):
         """Guarda el proyecto con un nuevo nombre"""
@@ -4034,6 +8489,87 @@ class MatchClipAnalyzer(QMainWindow):
             self.lbl_proyecto.setText(f"📁 {nombre}")
             self.guardar_proyecto()
 
+    def aplicar_proyecto(self, proyecto, clips):
+        """
+        Vuelca en la interfaz un proyecto ya leído (con las ediciones del diario
+        ya rehechas), con el repintado suspendido. Devuelve si se encontró el video.
+        """
+        self.setUpdatesEnabled(False)
+        try:
+            # Actualizar estado de la aplicación
+            self.nombre_proyecto_actual = proyecto['nombre']
+            self.video_path = proyecto['video_path']
+            self.config = proyecto['botonera_config']
+            
+            # Cargar equipos si existen
+            if 'metadata' in proyecto and 'equipos' in proyecto['metadata']:
+                self.equipos = proyecto['metadata']['equipos']
+            
+            # Cargar video si existe
+            video_encontrado = os.path.exists(self.video_path)
+            if video_encontrado:
+                self.player.setSource(QUrl.fromLocalFile(self.video_path))
+                self.indexar_video()
+            
+            # Reconstruir interfaz
+            self.reconstruir_interfaz()
+            
+            # Cargar clips (de categorías que existan en la botonera): un solo
+            # reset del modelo y un solo redibujado del timeline
+            self.clips.reemplazar([clip for clip in clips if clip.categoria in self.listas_widgets])
+            self.timeline.set_resaltados([])
+            self.actualizar_timeline_segmentos()
+            
+            # Cargar formaciones
+            if 'metadata' in proyecto and 'formaciones_guardadas' in proyecto['metadata']:
+                self.gestor_formaciones.formaciones_guardadas = proyecto['metadata']['formaciones_guardadas']
+            
+            # Seguir registrando en el diario del proyecto; si se rehicieron
+            # ediciones, el .mca aún no las tiene
+            self.journal.abrir(self.nombre_proyecto_actual, seq=proyecto.get("journal_seq", 0))
+            
+            # Actualizar interfaz
+            self.lbl_proyecto.setText(f"📁 {self.nombre_proyecto_actual}")
+            self.proyecto_modificado = bool(proyecto.get("ediciones_recuperadas"))
+            self.actualizar_estado_proyecto()
+            self.timeline.invalidar()
+        finally:
+            self.setUpdatesEnabled(True)
+        return video_encontrado
+
+    def recuperar_ediciones(self):
+        """Tras un cierre inesperado, ofrece reabrir el proyecto con las ediciones que no llegaron a guardarse"""
+        pendientes = ProyectoJournal.pendientes()
+        if not pendientes:
+            return False
+        nombre, archivo = pendientes[0]
+        
+        reply = QMessageBox.question(
+            self, "Recuperar ediciones",
+            f"El proyecto '{nombre}' tiene ediciones sin guardar de una sesión que no se cerró bien.\n"
+            "¿Deseas abrirlo y recuperarlas?",
+            QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No
+        )
+        if reply != QMessageBox.StandardButton.Yes:
+            self.journal.compactar(nombre, float('inf'))
+            return False
+        
+        try:
+            proyecto = ProyectoManager.cargar_proyecto(archivo)
+            clips = ProyectoJournal.rehacer(proyecto, clips_de_proyecto(proyecto))
+            video_encontrado = self.aplicar_proyecto(proyecto, clips)
+        except Exception as e:
+            QMessageBox.critical(self, "Error", 
+                               f"No se pudo recuperar el proyecto:\n{str(e)}")
+            return False
+        
+        if not video_encontrado:
+            QMessageBox.warning(self, "Video no encontrado",
+                              f"El video original no se encuentra en:\n{self.video_path}")
+        QMessageBox.information(self, "Ediciones recuperadas",
+                              f"Se recuperaron {proyecto['ediciones_recuperadas']} ediciones del proyecto '{nombre}'.")
+        return True
+
     def abrir_proyecto(self):
         """Abre un proyecto existente"""
         if self.proyecto_modificado:
@@ -4044,6 +8580,8 @@ class MatchClipAnalyzer(QMainWindow):
             )
             if reply == QMessageBox.StandardButton.Yes:
                 self.guardar_proyecto()
+            elif reply == QMessageBox.StandardButton.No:
+                self.journal.descartar()
             elif reply == QMessageBox.StandardButton.Cancel:
                 return
         
@@ -4093,6 +8631,27 @@ class MatchClipAnalyzer(QMainWindow):
         btn_eliminar = QPushButton("Eliminar")
         btn_cancelar = QPushButton("Cancelar")
         
+        def proyecto_cargado(proyecto, clips):
+            try:
+                video_encontrado = self.aplicar_proyecto(proyecto, clips)
+            except Exception as e:
+                error_carga(str(e))
+                return
+            
+            dialog.accept()
+            
+            if not video_encontrado:
+                QMessageBox.warning(self, "Video no encontrado",
+                                  f"El video original no se encuentra en:\n{self.video_path}")
+            mensaje = f"Proyecto '{self.nombre_proyecto_actual}' cargado exitosamente."
+            if proyecto.get("ediciones_recuperadas"):
+                mensaje += f"\nSe recuperaron {proyecto['ediciones_recuperadas']} ediciones sin guardar."
+            QMessageBox.information(self, "Proyecto Cargado", mensaje)
+        
+        def error_carga(mensaje):
+            QMessageBox.critical(dialog, "Error", 
+                               f"No se pudo cargar el proyecto:\n{mensaje}")
+        
         def cargar_proyecto():
             current_item = list_widget.currentItem()
             if not current_item:
@@ -4100,86 +8659,46 @@ class MatchClipAnalyzer(QMainWindow):
                                   "Por favor selecciona un proyecto.")
                 return
             
-            proyecto_data = current_item.data(Qt.ItemDataRole.UserRole)
-            
+            archivo = current_item.data(Qt.ItemDataRole.UserRole)['archivo']
             try:
-                # Cargar proyecto
-                proyecto = ProyectoManager.cargar_proyecto(proyecto_data['archivo'])
-                
-                # Actualizar estado de la aplicación
-                self.nombre_proyecto_actual = proyecto['nombre']
-                self.video_path = proyecto['video_path']
-                self.config = proyecto['botonera_config']
-                
-                # Cargar equipos si existen
-                if 'metadata' in proyecto and 'equipos' in proyecto['metadata']:
-                    self.equipos = proyecto['metadata']['equipos']
-                
-                # Cargar video si existe
-                if os.path.exists(self.video_path):
-                    self.player.setSource(QUrl.fromLocalFile(self.video_path))
-                else:
-                    QMessageBox.warning(self, "Video no encontrado",
-                                      f"El video original no se encuentra en:\n{self.video_path}")
-                
-                # Reconstruir interfaz
-                self.reconstruir_interfaz()
-                
-                # Cargar clips
-                for corte in proyecto.get('cortes', []):
-                    nom = corte['nom']
-                    if nom in self.listas_widgets:
-                        lw = self.listas_widgets[nom]
-                        
-                        # Crear item
-                        it = QListWidgetItem(f"[{corte['tiempo']}] {corte.get('nombre', 'Clip')}")
-                        it.setData(Qt.ItemDataRole.UserRole, corte)
-                        it.setForeground(QColor(corte.get('color', '#3498db')))
-                        
-                        # Tooltip
-                        tooltip_text = f"{corte.get('nombre', 'Clip')}\n"
-                        tooltip_text += f"Tiempo: {corte['tiempo']}\n"
-                        tooltip_text += f"Duración: {(corte['fin']-corte['ini'])/1000:.1f}s"
-                        
-                        if 'tags' in corte and corte['tags']:
-                            tag_names = [TAG_MANAGER.get_tag_by_id(tag_id)["name"] 
-                                       for tag_id in corte['tags'] 
-                                       if TAG_MANAGER.get_tag_by_id(tag_id)]
-                            if tag_names:
-                                tooltip_text += f"\nEtiquetas: {', '.join(tag_names)}"
-                        
-                        it.setToolTip(tooltip_text)
-                        
-                        lw.addItem(it)
-                        
-                        # Actualizar contador
-                        self.labels_contadores[nom].setText(str(lw.count()))
-                        
-                        # Agregar a timeline
-                        self.timeline.segmentos.append((
-                            corte['ini'], corte['fin'], 
-                            corte.get('color', '#3498db'), 
-                            corte.get('nombre', 'Clip')
-                        ))
-                
-                # Cargar formaciones
-                if 'metadata' in proyecto and 'formaciones_guardadas' in proyecto['metadata']:
-                    self.gestor_formaciones.formaciones_guardadas = proyecto['metadata']['formaciones_guardadas']
-                
-                # Actualizar interfaz
-                self.lbl_proyecto.setText(f"📁 {self.nombre_proyecto_actual}")
-                self.proyecto_modificado = False
-                self.actualizar_estado_proyecto()
-                self.timeline.update()
-                
-                dialog.accept()
-                
-                QMessageBox.information(self, "Proyecto Cargado", 
-                                      f"Proyecto '{self.nombre_proyecto_actual}' cargado exitosamente.")
-                
-            except Exception as e:
-                QMessageBox.critical(dialog, "Error", 
-                                   f"No se pudo cargar el proyecto:\n{str(e)}")
+                grande = os.path.getsize(archivo) >= PROYECTO_GRANDE_BYTES
+            except OSError:
+                grande = False
+            
+            if not grande:
+                try:
+                    proyecto = ProyectoManager.cargar_proyecto(archivo)
+                    clips = ProyectoJournal.rehacer(proyecto, clips_de_proyecto(proyecto))
+                except Exception as e:
+                    error_carga(str(e))
+                    return
+                proyecto_cargado(proyecto, clips)
+                return
+            
+            # Proyecto grande: se lee y decodifica en segundo plano con progreso
+            progreso = QProgressDialog("Cargando proyecto...", "Cancelar", 0, 100, dialog)
+            progreso.setWindowTitle("Abrir Proyecto")
+            progreso.setWindowModality(Qt.WindowModality.WindowModal)
+            progreso.setMinimumDuration(0)
+            progreso.setAutoClose(False)
+            progreso.setAutoReset(False)
+            
+            def terminado(proyecto, clips):
+                progreso.close()
+                proyecto_cargado(proyecto, clips)
+            
+            def fallo(mensaje):
+                progreso.close()
+                error_carga(mensaje)
+            
+            self.cargador_proyecto = ProyectoLoader(archivo)
+            self.cargador_proyecto.progreso.connect(progreso.setValue)
+            self.cargador_proyecto.terminado.connect(terminado)
+            self.cargador_proyecto.error.connect(fallo)
+            self.cargador_proyecto.cancelada.connect(progreso.close)
+            progreso.canceled.connect(self.cargador_proyecto.cancelar)
+            progreso.show()
+            self.cargador_proyecto.start()
         
         def eliminar_proyecto():
             current_item = list_widget.currentItem()
@@ -4221,13 +8740,8 @@ class MatchClipAnalyzer(QMainWindow):
             QMessageBox.warning(self, "Sin video", "Primero carga un video para exportar.")
             return
         
-        # Recolectar todos los clips
-        todos_clips = []
-        for lw in self.listas_widgets.values():
-            for i in range(lw.count()):
-                data = lw.item(i).data(Qt.ItemDataRole.UserRole)
-                if data:
-                    todos_clips.append(data)
+        # Todos los clips, por orden cronológico
+        todos_clips = [clip.to_dict() for clip in self.clips.cronologico()]
         
         if not todos_clips:
             QMessageBox.warning(self, "Sin clips", "No hay clips para exportar.")
@@ -4257,17 +8771,17 @@ class MatchClipAnalyzer(QMainWindow):
 
     def mostrar_estadisticas(self):
         """Muestra estadísticas del proyecto"""
-        total_clips = 0
-        for lw in self.listas_widgets.values():
-            total_clips += lw.count()
+        total_clips = len(self.clips)
         
-        # Calcular tiempo total de clips
+        # Tiempo total de clips y tiempo de partido cubierto (los solapes cuentan una vez)
         tiempo_total = 0
-        for nom, lw in self.listas_widgets.items():
-            for i in range(lw.count()):
-                data = lw.item(i).data(Qt.ItemDataRole.UserRole)
-                if data:
-                    tiempo_total += (data['fin'] - data['ini'])
+        cubierto = 0
+        hasta = 0
+        for clip in self.clips.cronologico():
+            tiempo_total += clip.duracion()
+            if clip.fin > hasta:
+                cubierto += clip.fin - max(clip.ini, hasta)
+                hasta = clip.fin
         
         tiempo_total_seg = tiempo_total / 1000
         
@@ -4279,13 +8793,14 @@ class MatchClipAnalyzer(QMainWindow):
         
         Total de clips: {total_clips}
         Tiempo total de clips: {tiempo_total_seg:.1f} segundos
+        Tiempo de partido cubierto: {cubierto / 1000:.1f} segundos
         Formaciones guardadas: {len(self.gestor_formaciones.formaciones_guardadas)}
         
         Distribución por categoría:
         """
         
-        for nom, lw in self.listas_widgets.items():
-            stats += f"\n{nom}: {lw.count()} clips"
+        for nom in self.listas_widgets:
+            stats += f"\n{nom}: {self.clips.conteo(nom)} clips"
         
         QMessageBox.information(self, "Estadísticas", stats)
 
@@ -4306,14 +8821,8 @@ class MatchClipAnalyzer(QMainWindow):
     def autoguardar_proyecto(self):
         """Auto-guarda el proyecto cada cierto tiempo"""
         if self.proyecto_modificado and self.nombre_proyecto_actual:
-            # Auto-guardar solo si hay cambios significativos
-            if hasattr(self, 'last_autosave_hash'):
-                current_hash = hash(str(self.config) + str(self.video_path))
-                if current_hash == self.last_autosave_hash:
-                    return
-            
-            self.guardar_proyecto()
-            self.last_autosave_hash = hash(str(self.config) + str(self.video_path))
+            # En segundo plano y sin mensajes: solo compacta el diario en el .mca
+            self.guardar_proyecto(silencioso=True)
 
     def actualizar_estado_proyecto(self):
         """Actualiza el estado del proyecto en la interfaz"""
@@ -4331,7 +8840,7 @@ class MatchClipAnalyzer(QMainWindow):
 
     def limpiar_todos_clips(self):
         """Limpia todos los clips del proyecto"""
-        if not any(lw.count() > 0 for lw in self.listas_widgets.values()):
+        if not len(self.clips):
             return
         
         reply = QMessageBox.question(
@@ -4342,15 +8851,13 @@ class MatchClipAnalyzer(QMainWindow):
         )
         
         if reply == QMessageBox.StandardButton.Yes:
-            for lw in self.listas_widgets.values():
-                lw.clear()
-            
-            for lbl in self.labels_contadores.values():
-                lbl.setText("0")
+            self.clips.limpiar()
+            self.journal.registrar("limpiar")
+            self.timeline.set_resaltados([])
             
             self.timeline.marks = []
             self.timeline.segmentos = []
-            self.timeline.update()
+            self.timeline.invalidar()
             
             self.proyecto_modificado = True
             self.actualizar_estado_proyecto()
@@ -4454,6 +8961,17 @@ class MatchClipAnalyzer(QMainWindow):
                 return
     # ================ FIN DEL NUEVO CÓDIGO ================
         
+        # Revisión de picos de audio: AvPág/RePág navegan, Enter acepta, Supr descarta
+        elif self.timeline.picos and key in (Qt.Key.Key_PageDown, Qt.Key.Key_PageUp):
+            self.ir_a_pico(1 if key == Qt.Key.Key_PageDown else -1)
+            event.accept()
+            return
+        
+        elif self.timeline.picos and key in (Qt.Key.Key_Return, Qt.Key.Key_Enter, Qt.Key.Key_Delete):
+            self.resolver_pico(key != Qt.Key.Key_Delete)
+            event.accept()
+            return
+        
         # Tecla V - Cambiar velocidad cíclica
         elif key == Qt.Key.Key_V:
             self.vel_idx = (self.vel_idx + 1) % len(self.velocidades)
@@ -4542,7 +9060,8 @@ class MatchClipAnalyzer(QMainWindow):
         self.player.setPosition(new_pos)
         
         # Si estaba pausado, reproducir brevemente para actualizar frame
-        if self.player.playbackState() == QMediaPlayer.PlaybackState.PausedState:
+        # (con el proxy intra la búsqueda en pausa ya muestra el frame)
+        if self.player.playbackState() == QMediaPlayer.PlaybackState.PausedState and not self.proxy_activo:
             self.player.play()
             QTimer.singleShot(100, lambda: self.player.pause() if self.player.playbackState() == QMediaPlayer.PlaybackState.PlayingState else None)
 
@@ -4550,27 +9069,41 @@ class MatchClipAnalyzer(QMainWindow):
         """Retrocede un frame"""
         if not self.video_path:
             return
-            
-        # Obtener FPS del video si es posible (estimado)
-        fps = 30  # FPS por defecto
-        frame_time = 1000 / fps  # ms por frame
         
-        new_pos = self.player.position() - frame_time
+        if self.decodificador:
+            actual = self.frame_mostrado
+            if actual is None:
+                actual = self.media_index.indice_frame(self.player.position())
+            self.mostrar_frame_exacto(actual - 1)
+            return
+        
+        pos = self.player.position()
+        if self.media_index:
+            new_pos = self.media_index.frame_anterior(pos)
+        else:
+            new_pos = pos - 1000 / 30  # Sin índice: 30 fps estimados
         new_pos = max(0, min(new_pos, self.player.duration()))
-        self.player.setPosition(int(new_pos))
+        self.player.setPosition(int(math.ceil(new_pos)))
 
     def frame_adelante(self):
         """Avanza un frame"""
         if not self.video_path:
             return
-            
-        # Obtener FPS del video si es posible (estimado)
-        fps = 30  # FPS por defecto
-        frame_time = 1000 / fps  # ms por frame
         
-        new_pos = self.player.position() + frame_time
+        if self.decodificador:
+            actual = self.frame_mostrado
+            if actual is None:
+                actual = self.media_index.indice_frame(self.player.position())
+            self.mostrar_frame_exacto(actual + 1)
+            return
+        
+        pos = self.player.position()
+        if self.media_index:
+            new_pos = self.media_index.frame_siguiente(pos)
+        else:
+            new_pos = pos + 1000 / 30  # Sin índice: 30 fps estimados
         new_pos = max(0, min(new_pos, self.player.duration()))
-        self.player.setPosition(int(new_pos))
+        self.player.setPosition(int(math.ceil(new_pos)))
 
     def cambiar_velocidad_combo(self, texto):
         """Cambia la velocidad desde el combo box"""
@@ -4668,8 +9201,8 @@ class MatchClipAnalyzer(QMainWindow):
 
     def menu_contextual(self, pos, list_widget, categoria):
         """Muestra menú contextual para clips"""
-        item = list_widget.itemAt(pos)
-        if not item:
+        clip = list_widget.indexAt(pos).data(ClipStore.ROL_CLIP)
+        if not clip:
             return
         
         menu = QMenu(self)
@@ -4686,66 +9219,24 @@ class MatchClipAnalyzer(QMainWindow):
         action = menu.exec(list_widget.mapToGlobal(pos))
         
         if action == action_saltar:
-            self.saltar_a_evento(item)
+            self.saltar_a_evento(clip)
         elif action == action_editar:
-            self.editar_clip(item, categoria)
+            self.editar_clip(clip, categoria)
         elif action == action_eliminar:
-            self.eliminar_clip(item, categoria)
+            self.eliminar_clip(clip, categoria)
         elif action == action_renderizar:
-            self.renderizar_clip_desde_menu(item)
+            self.renderizar_clip_desde_menu(clip)
         elif action == action_propiedades:
-            self.mostrar_propiedades_clip(item)
+            self.mostrar_propiedades_clip(clip)
 
-    def renderizar_clip_desde_menu(self, item):
+    def renderizar_clip_desde_menu(self, clip):
         """Renderiza un clip desde el menú contextual"""
-        data = item.data(Qt.ItemDataRole.UserRole)
-        if not data:
-            return
+        data = clip.to_dict()
         
         try:
-            # Crear carpeta si no existe
-            categoria = data['categoria']
-            for boton in self.config:
-                if boton[0] == categoria and len(boton) > 4:
-                    carpeta_nombre = boton[4]
-                    break
-            else:
-                carpeta_nombre = categoria
-            
-            path = os.path.join(CARPETA_CORTES, carpeta_nombre)
-            if not os.path.exists(path): 
-                os.makedirs(path, exist_ok=True)
-            
-            # Nombre del archivo de salida
-            nombre_seguro = data['nombre'].replace(' ', '_').replace('/', '_')
-            out = os.path.join(path, f"{nombre_seguro}_{int(data['ini'])}.mp4")
-            
-            # Convertir tiempos a segundos
-            inicio_seg = data['ini'] / 1000.0
-            duracion_seg = (data['fin'] - data['ini']) / 1000.0
-            
-            # Comando FFmpeg
-            ffmpeg_path = get_ffmpeg_path()
-            cmd = [
-                ffmpeg_path, "-ss", str(inicio_seg), 
-                "-i", self.video_path, 
-                "-t", str(duracion_seg), 
-                "-c:v", "copy", 
-                "-c:a", "copy", 
-                "-y", out
-            ]
-            
-            # Ejecutar en segundo plano
-            if SYS_CONFIG["system"] == "Windows":
-                subprocess.Popen(cmd, creationflags=subprocess.CREATE_NO_WINDOW)
-            else:
-                subprocess.Popen(cmd)
-                
-            QMessageBox.information(
-                self, "Clip Renderizado", 
-                f"Clip '{data['nombre']}' renderizado exitosamente.\n"
-                f"Archivo: {out}"
-            )
+            out = self.ruta_salida_clip(data)
+            self.encolar_corte(data['nombre'], data['ini'], data['fin'], out)
+            self.statusBar().showMessage(f"🎬 Clip '{data['nombre']}' enviado a la cola de renderizado", 3000)
             
         except Exception as e:
             QMessageBox.critical(
@@ -4753,11 +9244,9 @@ class MatchClipAnalyzer(QMainWindow):
                 f"No se pudo renderizar el clip:\n{str(e)}"
             )
 
-    def editar_clip(self, item, categoria):
+    def editar_clip(self, clip, categoria):
         """Edita un clip existente"""
-        data = item.data(Qt.ItemDataRole.UserRole)
-        if not data:
-            return
+        data = clip.to_dict()
         
         dialog = QDialog(self)
         dialog.setWindowTitle("Editar Clip")
@@ -4792,6 +9281,23 @@ class MatchClipAnalyzer(QMainWindow):
         duracion = (data['fin'] - data['ini']) / 1000
         info_layout.addWidget(QLabel(f"Duración: {duracion:.2f} segundos"))
         
+        # Ajuste a los cambios de plano cercanos
+        ini_escena, fin_escena = data['ini'], data['fin']
+        if self.media_index:
+            corte_ini = self.media_index.corte_cercano(data['ini'], self.tolerancia_escena_ms)
+            corte_fin = self.media_index.corte_cercano(data['fin'], self.tolerancia_escena_ms)
+            ini_escena = data['ini'] if corte_ini is None else corte_ini
+            fin_escena = data['fin'] if corte_fin is None else corte_fin
+        escena_check = QCheckBox("Ajustar al cambio de plano más cercano")
+        if fin_escena > ini_escena and (ini_escena, fin_escena) != (data['ini'], data['fin']):
+            escena_check.setText(f"Ajustar al cambio de plano: {self.format_time(ini_escena)} - "
+                                 f"{self.format_time(fin_escena)}")
+            escena_check.setChecked(self.ajuste_escena)
+        else:
+            escena_check.setEnabled(False)
+            escena_check.setToolTip("No hay cambios de plano dentro de la tolerancia")
+        info_layout.addWidget(escena_check)
+        
         info_group.setLayout(info_layout)
         layout.addWidget(info_group)
         
@@ -4836,38 +9342,34 @@ class MatchClipAnalyzer(QMainWindow):
         
         def guardar_cambios():
             # Actualizar datos del clip
-            data['nombre'] = nombre_input.text().strip() or data.get('nombre', 'Clip')
+            clip.nombre = nombre_input.text().strip() or clip.nombre
             
             # Actualizar etiquetas
             etiquetas = []
             for i in range(tags_list.count()):
                 if tags_list.item(i).isSelected():
                     etiquetas.append(tags_list.item(i).data(Qt.ItemDataRole.UserRole))
-            data['tags'] = etiquetas
+            clip.tags = etiquetas
             
             # Actualizar notas
-            data['notas'] = notas_input.toPlainText()
+            clip.notas = notas_input.toPlainText()
             
-            # Actualizar item en la lista
-            item.setText(f"[{data['tiempo']}] {data['nombre']}")
-            item.setData(Qt.ItemDataRole.UserRole, data)
-            
-            # Actualizar tooltip
-            tooltip_text = f"{data['nombre']}\n"
-            tooltip_text += f"Tiempo: {data['tiempo']}\n"
-            tooltip_text += f"Duración: {duracion:.2f}s"
-            
-            if etiquetas:
-                tag_names = [TAG_MANAGER.get_tag_by_id(tag_id)["name"] 
-                           for tag_id in etiquetas 
-                           if TAG_MANAGER.get_tag_by_id(tag_id)]
-                if tag_names:
-                    tooltip_text += f"\nEtiquetas: {', '.join(tag_names)}"
+            # Nuevos límites ajustados a los cambios de plano
+            ajustado = escena_check.isChecked()
+            if ajustado:
+                clip.ini, clip.fin = ini_escena, fin_escena
             
-            if data['notas']:
-                tooltip_text += f"\nNotas: {data['notas'][:50]}..."
+            # La lista (texto y tooltip) y el índice temporal se actualizan desde el almacén
+            self.clips.actualizar(clip)
+            self.journal.registrar("cambio", clip=clip.to_dict())
             
-            item.setToolTip(tooltip_text)
+            self.actualizar_timeline_segmentos()
+            if ajustado:
+                solapados = [c for c in self.clips.solapados(clip.ini, clip.fin)
+                             if c is not clip and c.categoria == categoria]
+                if solapados:
+                    self.avisar_solapamiento(clip.nombre, solapados)
+                self.renderizar_clip_individual(clip.to_dict())
             
             self.proyecto_modificado = True
             self.actualizar_estado_proyecto()
@@ -4883,27 +9385,20 @@ class MatchClipAnalyzer(QMainWindow):
         
         dialog.exec()
 
-    def eliminar_clip(self, item, categoria):
+    def eliminar_clip(self, clip, categoria):
         """Elimina un clip"""
-        row = self.listas_widgets[categoria].row(item)
-        if row < 0:
-            return
-        
         reply = QMessageBox.question(
             self, "Confirmar Eliminación",
-            f"¿Estás seguro de eliminar este clip?\n{item.text()}",
+            f"¿Estás seguro de eliminar este clip?\n{clip.texto()}",
             QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No
         )
         
         if reply == QMessageBox.StandardButton.Yes:
-            # Eliminar de la lista
-            self.listas_widgets[categoria].takeItem(row)
-            
-            # Actualizar contador
-            self.labels_contadores[categoria].setText(str(self.listas_widgets[categoria].count()))
+            # Eliminar del almacén (lista, contador e índice temporal)
+            self.clips.eliminar(clip)
+            self.journal.registrar("baja", id=clip.id)
             
-            # Actualizar timeline (necesitaríamos más información para esto)
-            # Por ahora, simplemente recargamos toda la timeline
+            # Actualizar timeline
             self.actualizar_timeline_segmentos()
             
             self.proyecto_modificado = True
@@ -4911,19 +9406,15 @@ class MatchClipAnalyzer(QMainWindow):
             
             QMessageBox.information(self, "Clip Eliminado", "Clip eliminado exitosamente.")
 
-    def mostrar_propiedades_clip(self, item):
+    def mostrar_propiedades_clip(self, clip):
         """Muestra propiedades detalladas del clip"""
-        data = item.data(Qt.ItemDataRole.UserRole)
-        if not data:
-            return
+        data = clip.to_dict()
         
         duracion = (data['fin'] - data['ini']) / 1000
         etiquetas_texto = "Ninguna"
         
         if 'tags' in data and data['tags']:
-            tag_names = [TAG_MANAGER.get_tag_by_id(tag_id)["name"] 
-                       for tag_id in data['tags'] 
-                       if TAG_MANAGER.get_tag_by_id(tag_id)]
+            tag_names = [tag["name"] for tag in map(TAG_MANAGER.get_tag_by_id, data['tags']) if tag]
             if tag_names:
                 etiquetas_texto = ", ".join(tag_names)
         
@@ -4958,9 +9449,10 @@ class MatchClipAnalyzer(QMainWindow):
             )
             
             if reply == QMessageBox.StandardButton.Yes:
-                self.guardar_proyecto()
+                self.guardar_proyecto(silencioso=True)
                 event.accept()
             elif reply == QMessageBox.StandardButton.No:
+                self.journal.descartar()
                 event.accept()
             else:
                 event.ignore()
@@ -4970,9 +9462,33 @@ class MatchClipAnalyzer(QMainWindow):
         self.blink_timer.stop()
         self.autosave_timer.stop()
         
+        # Terminar de escribir el .mca y cerrar el diario de ediciones
+        self.esperar_guardado()
+        self.journal.cerrar()
+        
         # Detener reproductor
         self.player.stop()
         
+        # Matar y recoger los FFmpeg que sigan en marcha
+        self.render_queue.cerrar()
+        self.capturas.cerrar()
+        self.detener_decodificador()
+        if self.hoja_worker and self.hoja_worker.isRunning():
+            self.hoja_worker.cancelar()
+            self.hoja_worker.wait()
+        self.detener_filmstrip()
+        self.detener_envolvente()
+        if self.escenas_worker and self.escenas_worker.isRunning():
+            self.escenas_worker.cancelar()
+            self.escenas_worker.wait()
+        for dialogo in list(self.dialogos_playlist):
+            if dialogo.generando():
+                dialogo.worker.cancelar()
+                dialogo.worker.wait()
+        
+        # Accesos a la caché de renders anotados solo en memoria
+        RENDER_CACHE.persistir()
+        
         # Guardar configuración de idioma
         LANG.save_settings()
         
@@ -4980,6 +9496,10 @@ class MatchClipAnalyzer(QMainWindow):
 
 # ========== PUNTO DE ENTRADA ==========
 if __name__ == "__main__":
+    if "--bench-memoria" in sys.argv:
+        medir_memoria_clips()
+        sys.exit(0)
+    
     app = QApplication(sys.argv)
     app.setStyle("Fusion")
     
@@ -5014,11 +9534,13 @@ if __name__ == "__main__":
         window = MatchClipAnalyzer()
         window.show()
         
-        # Configurar acciones según selección
-        if action == "new":
-            window.nuevo_proyecto()
-        elif action == "open":
-            window.abrir_proyecto()
+        # Configurar acciones según selección (salvo que se recupere un
+        # proyecto con ediciones sin guardar de un cierre inesperado)
+        if not window.recuperar_ediciones():
+            if action == "new":
+                window.nuevo_proyecto()
+            elif action == "open":
+                window.abrir_proyecto()
         
         sys.exit(app.exec())
     else: